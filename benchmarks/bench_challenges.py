@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+""" Micro-benchmark for the challenges.
+
+    Compares, for all Challenge classes in challenge.py, generating a
+    challenge when a member joins with taking it from the ChallengePool,
+    and checking answers with re.match() on the answer pattern string
+    with the precompiled matchers.
+
+    Usage: python3 benchmarks/bench_challenges.py [number of challenges]
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import asyncio
+import re
+import sys
+import time
+
+from telegram_antispam_bot import challenge
+from telegram_antispam_bot.challenge_pool import ChallengePool
+from telegram_antispam_bot.scheduler import Scheduler
+
+### Helpers
+
+def challenge_classes():
+
+    """ Return the list of Challenge classes defined in challenge.py.
+    """
+    return [
+        obj
+        for obj in vars(challenge).values()
+        if (isinstance(obj, type) and
+            issubclass(obj, challenge.Challenge) and
+            obj.__module__ == challenge.__name__)]
+
+def answer_text(answer):
+
+    """ Return the correct answer text for the answer pattern.
+    """
+    return re.sub(r'^(\(\?i\))?\^|\$$', '', answer).lower()
+
+def per_call(function, args_list):
+
+    """ Return the time in seconds per call of function with the
+        arguments in args_list.
+    """
+    start = time.perf_counter()
+    for args in args_list:
+        function(*args)
+    return (time.perf_counter() - start) / len(args_list)
+
+### Benchmark
+
+def measure(cls, n):
+
+    """ Return (generate, pool, re_match, matcher) times per call in
+        seconds for n challenges of cls.
+    """
+    generator = cls(None, None)
+    generate = per_call(generator.create_challenge, [(None,)] * n)
+
+    pool = ChallengePool(None, [cls], Scheduler(), size=n)
+    pool.fill()
+    pop = per_call(pool.pop, [(cls,)] * n)
+
+    entries = [generator.generate(None) for i in range(n)]
+    answers = [
+        (answer, answer_text(answer))
+        for text, answer, matcher in entries]
+    re_match = per_call(
+        lambda answer, value: re.match(answer, value) is not None,
+        answers)
+    matchers = [
+        (matcher, answer_text(answer))
+        for text, answer, matcher in entries]
+    matcher = per_call(lambda matcher, value: matcher(value), matchers)
+    return generate, pop, re_match, matcher
+
+async def run(n):
+    print(f'Time per challenge in microseconds ({n} challenges):')
+    print(f'  {"class":<24} {"generate":>9} {"pool":>9} '
+          f'{"re.match":>9} {"matcher":>9}')
+    for cls in challenge_classes():
+        times = measure(cls, n)
+        print(f'  {cls.__name__:<24} ' +
+              ' '.join(f'{t * 1e6:9.2f}' for t in times))
+
+def main(n=100000):
+    asyncio.run(run(n))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+""" Micro-benchmark for the duplicate spam detection.
+
+    Fingerprints random messages and looks them up in a full
+    FingerprintIndex, with every tenth message being a slightly changed
+    copy of an earlier one, and reports the time per message, the
+    number of duplicates found and the memory used by the index.
+
+    Usage: python3 benchmarks/bench_duplicates.py [index size] [number of messages]
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+from telegram_antispam_bot.duplicates import FingerprintIndex, fingerprint
+
+### Helpers
+
+def create_messages(n, vocabulary=5000):
+
+    """ Return a list of n random messages. Every tenth message is a
+        copy of an earlier message with one word replaced.
+    """
+    words = [
+        ''.join(random.choices(
+            string.ascii_lowercase, k=random.randint(2, 9)))
+        for i in range(vocabulary)]
+    messages = []
+    for i in range(n):
+        if i % 10 == 9:
+            message = random.choice(messages).split()
+            message[random.randrange(len(message))] = random.choice(words)
+            messages.append(' '.join(message))
+        else:
+            messages.append(
+                ' '.join(random.choices(words, k=random.randint(8, 40))))
+    return messages
+
+### Benchmark
+
+def main(size=10000, n=20000):
+    random.seed(42)
+    messages = create_messages(size + n)
+
+    tracemalloc.start()
+    index = FingerprintIndex(max_size=size, ttl=3600)
+    for message in messages[:size]:
+        index.add(fingerprint(message))
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    messages = messages[size:]
+    start = time.perf_counter()
+    signatures = [fingerprint(message) for message in messages]
+    fingerprinting = time.perf_counter() - start
+    start = time.perf_counter()
+    found = 0
+    for signature in signatures:
+        if index.find(signature):
+            found += 1
+        index.add(signature)
+    lookup = time.perf_counter() - start
+
+    print(f'Duplicate detection with {len(index)} indexed messages '
+          f'({n} messages, {found} duplicates found, '
+          f'index memory {memory / 1e6:.1f} MB):')
+    print(f'  {"fingerprint":<16} {fingerprinting / n * 1e6:9.2f} us/message')
+    print(f'  {"find + add":<16} {lookup / n * 1e6:9.2f} us/message')
+    print(f'  {"total":<16} {n / (fingerprinting + lookup):9.0f} messages/s')
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
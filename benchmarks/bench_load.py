@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+
+""" Load test for the bot, using a fake pyrogram Client.
+
+    Runs synthetic join raids against the bot handlers without a
+    Telegram connection. Each joiner is either a human, who answers the
+    challenge correctly, or a spammer, who keeps sending wrong answers
+    until getting banned. With --join-requests, the joiners send join
+    requests and answer the challenges in their private chats.
+
+    Reports throughput, latency percentiles for approvals and bans, the
+    number of API calls and the peak memory use.
+
+    Usage: python3 benchmarks/bench_load.py [options] [raid size ...]
+
+    The default raid sizes are 10, 1000 and 100000 joiners. Use --help
+    for the list of options.
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import argparse
+import asyncio
+import logging
+import random
+import re
+import resource
+import time
+import tracemalloc
+
+from telegram_antispam_bot.antispam_bot import AntispamBot
+from telegram_antispam_bot.outgoing import OutgoingQueue
+from benchmarks.fakeclient import (
+    FakeClient,
+    UpdateDispatcher,
+    create_user,
+    format_percentiles,
+    )
+
+### Globals
+
+# Group IDs used for the load test
+CHAT_ID = -1001000000001
+MANAGEMENT_GROUP_ID = -1001000000002
+
+# First user ID to use for joiners
+FIRST_USER_ID = 100000000
+
+# First user ID to use for established members chatting in the group
+FIRST_MEMBER_ID = 200000000
+
+# Number of established members chatting in the group
+MEMBERS = 100
+
+### Helpers
+
+def answer_text(challenge):
+
+    """ Return the correct answer text for challenge.
+    """
+    return re.sub(r'^(\(\?i\))?\^|\$$', '', challenge.answer)
+
+### Benchmark bot
+
+class BenchmarkBot(AntispamBot, FakeClient):
+
+    """ AntispamBot talking to the FakeClient, which reports the
+        progress of the applications to the load test.
+    """
+    # LoadTest instance to report to
+    load_test = None
+
+    # Number of welcome_new_member() and reject_applications() calls in
+    # progress. Applications are removed from .new_members before these
+    # are done.
+    resolving = 0
+
+    async def send_challenge(self, application):
+        await super().send_challenge(application)
+        self.load_test.challenge_sent(application)
+
+    async def send_raid_challenges(self, batch):
+        await super().send_raid_challenges(batch)
+        for application in batch:
+            self.load_test.challenge_sent(application)
+
+    async def welcome_new_member(self, application):
+        # Only report applications closed by this call
+        pending = application.pending
+        self.resolving += 1
+        try:
+            await super().welcome_new_member(application)
+        finally:
+            self.resolving -= 1
+        if pending:
+            self.load_test.resolved(application, approved=True)
+
+    async def reject_applications(self, applications, reason=None):
+        pending = [
+            application
+            for application in applications
+            if application.pending]
+        self.resolving += 1
+        try:
+            if reason is None:
+                await super().reject_applications(applications)
+            else:
+                await super().reject_applications(
+                    applications, reason=reason)
+        finally:
+            self.resolving -= 1
+        for application in pending:
+            self.load_test.resolved(application, approved=False)
+
+### Load test
+
+class LoadTest:
+
+    """ Run one synthetic join raid against a BenchmarkBot.
+    """
+    def __init__(self, joiners, options):
+        self.joiners = joiners
+        self.options = options
+        self.random = random.Random(options.seed)
+        self.spammers = set()
+        self.users = {}
+        self.join_times = {}
+        self.challenge_times = {}
+        self.answer_times = {}
+        self.challenge_latencies = []
+        self.approval_latencies = []
+        self.ban_latencies = []
+        self.pending = joiners
+        self.done = None
+
+    def create_bot(self):
+        options = self.options
+        bot = BenchmarkBot(
+            session_name='benchmark',
+            management_group_id=MANAGEMENT_GROUP_ID,
+            join_requests=options.join_requests)
+        bot.setup_fake_client(
+            latency=options.latency,
+            jitter=options.jitter,
+            floodwait_rate=options.floodwait,
+            floodwait_time=options.floodwait_time,
+            seed=options.seed)
+        bot.outgoing = OutgoingQueue(
+            rate=options.rate,
+            chat_rate=options.chat_rate,
+            concurrency=options.concurrency)
+        bot.max_pending_per_chat = options.max_pending
+        bot.load_test = self
+        return bot
+
+    ### Bot callbacks
+
+    def challenge_sent(self, application):
+        member_id = application.member_id
+        if (application.challenge is None or
+            member_id in self.challenge_times or
+            member_id not in self.users):
+            return
+        now = time.perf_counter()
+        self.challenge_times[member_id] = now
+        self.challenge_latencies.append(now - self.join_times[member_id])
+        delay = self.random.random() * self.options.think_time
+        asyncio.get_running_loop().call_later(
+            delay, self.answer, application)
+
+    def resolved(self, application, approved):
+        member_id = application.member_id
+        if member_id not in self.users:
+            return
+        now = time.perf_counter()
+        answer_time = self.answer_times.get(member_id)
+        if answer_time is not None:
+            if approved:
+                self.approval_latencies.append(now - answer_time)
+            else:
+                self.ban_latencies.append(now - answer_time)
+        del self.users[member_id]
+        self.pending -= 1
+        if not self.pending:
+            self.done.set()
+
+    ### Scripted members
+
+    def answer(self, application):
+        member_id = application.member_id
+        user = self.users.get(member_id)
+        if user is None:
+            return
+        feed = self.dispatcher.feed
+        chat_id = application.conversation_chat_id
+        if member_id in self.spammers:
+            # Keep sending wrong answers until getting banned
+            for i in range(self.bot.max_failed_challenges):
+                feed(self.bot.text_message(chat_id, user, 'buy cheap stuff'))
+        else:
+            feed(self.bot.text_message(
+                chat_id, user, answer_text(application.challenge)))
+        self.answer_times[member_id] = time.perf_counter()
+
+    async def feed_joins(self):
+        join_rate = self.options.join_rate
+        start = time.perf_counter()
+        for i in range(self.joiners):
+            member_id = FIRST_USER_ID + i
+            user = create_user(member_id)
+            self.users[member_id] = user
+            if self.random.random() < self.options.spammers:
+                self.spammers.add(member_id)
+            self.join_times[member_id] = time.perf_counter()
+            if self.options.join_requests:
+                self.dispatcher.feed(self.bot.join_request(CHAT_ID, user))
+            else:
+                self.dispatcher.feed(self.bot.join_message(CHAT_ID, user))
+            for j in range(self.options.chatter):
+                # Messages from established members, which the bot
+                # should ignore
+                member = create_user(
+                    FIRST_MEMBER_ID + (i + j) % MEMBERS)
+                self.dispatcher.feed(
+                    self.bot.text_message(CHAT_ID, member, 'Hello'))
+            if join_rate:
+                delay = start + (i + 1) / join_rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif i % 100 == 99:
+                await asyncio.sleep(0)
+
+    ### Run
+
+    async def run(self):
+        options = self.options
+        self.done = asyncio.Event()
+        if options.memory:
+            tracemalloc.start()
+        bot = self.bot = self.create_bot()
+        await bot.start()
+        bot.keep_running = True
+        idle_task = asyncio.create_task(bot.idle_loop())
+        self.dispatcher = UpdateDispatcher(bot, workers=options.workers)
+        self.dispatcher.start()
+
+        start = time.perf_counter()
+        await self.feed_joins()
+        try:
+            await asyncio.wait_for(self.done.wait(), options.timeout)
+        except asyncio.TimeoutError:
+            print(f'  Timeout: {self.pending} applications still pending')
+        elapsed = time.perf_counter() - start
+
+        bot.keep_running = False
+        idle_task.cancel()
+        await asyncio.gather(idle_task, return_exceptions=True)
+        await self.dispatcher.stop()
+        shutdown_start = time.perf_counter()
+        await bot.stop()
+        shutdown = time.perf_counter() - shutdown_start
+        if options.memory:
+            current, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        else:
+            # ru_maxrss is given in kB on Linux
+            peak_memory = resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss * 1024
+        self.report(elapsed, shutdown, peak_memory)
+
+    def report(self, elapsed, shutdown, peak_memory):
+        bot = self.bot
+        resolved = self.joiners - self.pending
+        print(f'Raid with {self.joiners} joiners '
+              f'({len(self.spammers)} spammers):')
+        print(f'  time:       {elapsed:.2f}s '
+              f'(+ {shutdown:.2f}s for shutting down)')
+        print(f'  throughput: {resolved / elapsed:.0f} applications/s')
+        print(f'  handler:    {format_percentiles(self.dispatcher.latencies)}')
+        print(f'  challenge:  {format_percentiles(self.challenge_latencies)}')
+        print(f'  approval:   {format_percentiles(self.approval_latencies)}')
+        print(f'  ban:        {format_percentiles(self.ban_latencies)}')
+        print(f'  API calls:  ' + ', '.join(
+            f'{method}={count}'
+            for method, count in sorted(bot.api_calls.items())))
+        memory_type = 'traced' if self.options.memory else 'process RSS'
+        print(f'  peak memory: {peak_memory / 2**20:.1f} MB ({memory_type})')
+        if self.dispatcher.errors:
+            print(f'  handler errors: {self.dispatcher.errors}')
+
+### Command line interface
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description='Load test for the antispam bot using a fake client.')
+    parser.add_argument(
+        'sizes', metavar='SIZE', type=int, nargs='*',
+        default=[10, 1000, 100000],
+        help='number of joiners per raid (default: 10 1000 100000)')
+    parser.add_argument(
+        '--spammers', type=float, default=0.5,
+        help='fraction of joiners which are spammers (default: 0.5)')
+    parser.add_argument(
+        '--join-rate', type=float, default=0,
+        help='joins per second; 0 means all at once (default: 0)')
+    parser.add_argument(
+        '--chatter', type=int, default=0,
+        help='number of messages from established members per joiner '
+             '(default: 0)')
+    parser.add_argument(
+        '--join-requests', action='store_true',
+        help='moderate join requests instead of new members')
+    parser.add_argument(
+        '--think-time', type=float, default=1.0,
+        help='max. time in seconds before a joiner answers (default: 1.0)')
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help='API call latency in seconds (default: 0)')
+    parser.add_argument(
+        '--jitter', type=float, default=0.0,
+        help='max. random extra API call latency in seconds (default: 0)')
+    parser.add_argument(
+        '--floodwait', type=float, default=0.0,
+        help='probability of FloodWait errors per API call (default: 0)')
+    parser.add_argument(
+        '--floodwait-time', type=int, default=1,
+        help='wait time of FloodWait errors in seconds (default: 1)')
+    parser.add_argument(
+        '--rate', type=float, default=0,
+        help='global outgoing request rate limit; 0 disables it (default: 0)')
+    parser.add_argument(
+        '--chat-rate', type=float, default=0,
+        help='per chat outgoing request rate limit; 0 disables it '
+             '(default: 0)')
+    parser.add_argument(
+        '--concurrency', type=int, default=8,
+        help='max. number of concurrent API calls (default: 8)')
+    parser.add_argument(
+        '--max-pending', type=int, default=0,
+        help='max. number of pending applications; joiners beyond this '
+             'are rejected right away; 0 disables the limit (default: 0)')
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help='number of update handler workers (default: pyrogram default)')
+    parser.add_argument(
+        '--timeout', type=float, default=600,
+        help='max. time in seconds to wait for a raid to finish '
+             '(default: 600)')
+    parser.add_argument(
+        '--memory', action='store_true',
+        help='trace memory allocations (slower, but gives the peak memory '
+             'per raid instead of the process RSS)')
+    parser.add_argument(
+        '--seed', type=int, default=42,
+        help='random seed (default: 42)')
+    parser.add_argument(
+        '--log', action='store_true',
+        help='show the bot log')
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(args)
+    if not options.log:
+        logging.getLogger('antispambot').setLevel(logging.WARNING)
+    for size in options.sizes:
+        asyncio.run(LoadTest(size, options).run())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+""" Memory benchmark for pending applications.
+
+    Compares the per-applicant memory footprint of the old approach
+    (copies of the pyrogram new chat members Message with the full
+    conversation Message objects attached) with the Application record
+    used by the bot.
+
+    Usage: python3 benchmarks/bench_memory.py [number of applicants]
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import sys
+import copy
+import datetime
+import tracemalloc
+from pyrogram import enums
+from pyrogram.types import Message, Chat, User
+
+from telegram_antispam_bot.application import Application
+
+### Helpers
+
+def create_chat():
+    return Chat(
+        id=-1001234567890,
+        type=enums.ChatType.SUPERGROUP,
+        title='Python Meeting Düsseldorf',
+        username='pyddf',
+        is_verified=False,
+        is_restricted=False,
+        is_scam=False,
+        is_fake=False,
+        has_protected_content=False,
+        )
+
+def create_user(id, is_bot=False):
+    return User(
+        id=id,
+        is_self=False,
+        is_contact=False,
+        is_mutual_contact=False,
+        is_deleted=False,
+        is_bot=is_bot,
+        is_verified=False,
+        is_restricted=False,
+        is_scam=False,
+        is_fake=False,
+        is_support=False,
+        is_premium=False,
+        first_name=f'First{id}',
+        last_name=f'Last{id}',
+        status=enums.UserStatus.RECENTLY,
+        username=f'user{id}',
+        language_code='en',
+        )
+
+def create_message(id, chat, from_user, text=None, new_chat_members=None):
+    return Message(
+        id=id,
+        chat=chat,
+        from_user=from_user,
+        date=datetime.datetime.now(),
+        text=text,
+        new_chat_members=new_chat_members,
+        outgoing=False,
+        )
+
+def conversation_messages(id, chat, bot, member):
+
+    """ Return the typical conversation with a member: challenge, answer,
+        reminder.
+    """
+    return [
+        create_message(id + 1, chat, bot,
+                       text=f'Welcome to the chat, {member.first_name} ! '
+                            f'Please enter `ABCDEFGH` into this chat to get '
+                            f'approved as a member (within the next few '
+                            f'seconds).'),
+        create_message(id + 2, chat, member, text='abcdefgg'),
+        create_message(id + 3, chat, bot,
+                       text=f'Reminder: We are still waiting for an answer '
+                            f'from user "{member.first_name}".'),
+        ]
+
+### Old approach: copied pyrogram messages
+
+def old_application(id, bot):
+    chat = create_chat()
+    member = create_user(id)
+    message = create_message(id, chat, member, new_chat_members=[member])
+    signup_message = copy.copy(message)
+    signup_message.new_chat_members = [member]
+    signup_message.new_member = member
+    signup_message.conversation = conversation_messages(id, chat, bot, member)
+    signup_message.member_banned = False
+    signup_message.reminder_sent = False
+    signup_message.timer = 0
+    signup_message.failed_challenges = 0
+    return signup_message
+
+### New approach: Application records
+
+def new_application(id, bot):
+    chat = create_chat()
+    member = create_user(id)
+    message = create_message(id, chat, member, new_chat_members=[member])
+    application = Application.from_message(message, member)
+    for conversation_message in conversation_messages(id, chat, bot, member):
+        application.add_message(conversation_message)
+    return application
+
+### Benchmark
+
+def measure(factory, n):
+
+    """ Return the memory in bytes per applicant when creating n
+        applications using factory.
+    """
+    bot = create_user(1, is_bot=True)
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    applications = {}
+    for i in range(n):
+        id = 1000 + i * 10
+        applications[id] = factory(id, bot)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (current - start) / n
+
+def main(n=10000):
+    old = measure(old_application, n)
+    new = measure(new_application, n)
+    print(f'Memory per pending applicant ({n} applicants):')
+    print(f'  copied pyrogram messages: {old:10.0f} bytes')
+    print(f'  Application records:      {new:10.0f} bytes')
+    print(f'  ratio:                    {old / new:10.1f}x')
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+""" Micro-benchmark for the name screening.
+
+    Compares, for a name blocklist of the given size, checking names
+    with a plain loop over the normalized blocklist entries with the
+    combined pattern used by the NameScreener, uncached and cached.
+    The emoji count on the full info markdown, which was the only name
+    check before, is included as reference.
+
+    Usage: python3 benchmarks/bench_names.py [number of entries] [number of names]
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import random
+import string
+import sys
+import time
+
+import emoji
+
+from telegram_antispam_bot.names import NameScreener, normalize_name
+
+### Helpers
+
+def random_word(length):
+    return ''.join(random.choices(string.ascii_lowercase, k=length))
+
+def create_names(n, entries):
+
+    """ Return n (first name, last name, username) tuples, with every
+        tenth name using a blocklist entry written with lookalike
+        characters.
+    """
+    names = []
+    for i in range(n):
+        first_name = random_word(6).title()
+        last_name = random_word(8).title()
+        if i % 10 == 0:
+            last_name = random.choice(entries).replace('a', 'а')
+        names.append((first_name, last_name, f'user{i}'))
+    return names
+
+def per_call(function, args_list):
+
+    """ Return the time in seconds per call of function with the
+        arguments in args_list.
+    """
+    start = time.perf_counter()
+    for args in args_list:
+        function(*args)
+    return (time.perf_counter() - start) / len(args_list)
+
+### Benchmark
+
+def main(entries=5000, n=20000):
+    random.seed(42)
+    blocklist = [random_word(random.randint(5, 12)) for i in range(entries)]
+    names = create_names(n, blocklist)
+
+    start = time.perf_counter()
+    screener = NameScreener(blocklist, cache_size=n)
+    setup = time.perf_counter() - start
+
+    normalized = [normalize_name(entry) for entry in blocklist]
+    def loop_check(first_name, last_name, username):
+        text = normalize_name(f'{first_name} {last_name}\n{username}')
+        return any(entry in text for entry in normalized)
+
+    infos = [
+        (f'["{first_name} {last_name}" (username={username}, id=1)]'
+         f'(tg://user?id=1)',)
+        for first_name, last_name, username in names]
+    rejected = sum(1 for args in names if screener.screen(*args))
+
+    print(f'Name screening with {entries} blocklist entries '
+          f'({n} names, {rejected} rejected, setup {setup * 1e3:.1f}ms):')
+    print(f'  {"emoji count (old check)":<28} '
+          f'{per_call(emoji.emoji_count, infos) * 1e6:9.2f} us/name')
+    print(f'  {"loop over entries":<28} '
+          f'{per_call(loop_check, names[:n // 10]) * 1e6:9.2f} us/name')
+    print(f'  {"combined pattern":<28} '
+          f'{per_call(screener.screen, names) * 1e6:9.2f} us/name')
+    per_call(screener.check, names)
+    print(f'  {"combined pattern (cached)":<28} '
+          f'{per_call(screener.check, names) * 1e6:9.2f} us/name')
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
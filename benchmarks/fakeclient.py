@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+
+""" In-process stand-in for the pyrogram Client used by the benchmarks.
+
+    FakeClient implements the Client methods used by the bot without
+    talking to Telegram, with configurable latency and FloodWait error
+    injection. Use it as second base class of an AntispamBot subclass:
+
+        class BenchmarkBot(AntispamBot, FakeClient):
+            pass
+
+    Updates are fed to the bot handlers via an UpdateDispatcher, which
+    works like the pyrogram dispatcher: a queue processed by a number of
+    worker tasks.
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import asyncio
+import collections
+import datetime
+import itertools
+import random
+import time
+from pyrogram import Client, enums, errors
+from pyrogram.handlers import MessageHandler, ChatJoinRequestHandler
+from pyrogram.types import Message, Chat, User, ChatJoinRequest
+
+### Globals
+
+# User ID of the fake bot
+BOT_ID = 1
+
+### Helpers
+
+def create_chat(chat_id, title='Benchmark Group'):
+    if chat_id > 0:
+        # Private chats use the user ID as chat ID
+        return Chat(
+            id=chat_id,
+            type=enums.ChatType.PRIVATE,
+            )
+    return Chat(
+        id=chat_id,
+        type=enums.ChatType.SUPERGROUP,
+        title=title,
+        )
+
+def create_user(user_id, first_name=None, last_name=None, username=None,
+                is_bot=False):
+    return User(
+        id=user_id,
+        is_bot=is_bot,
+        first_name=first_name or f'User{user_id}',
+        last_name=last_name,
+        username=username,
+        )
+
+### Fake client
+
+class FakeClient(Client):
+
+    """ Stand-in for the pyrogram Client.
+
+        API calls take .latency seconds (plus a random .jitter) and fail
+        with a FloodWait error with probability .floodwait_rate.
+
+    """
+    # Latency of API calls in seconds and max. random extra latency
+    latency = 0.0
+    jitter = 0.0
+
+    # Probability of a FloodWait error per API call and the wait time
+    # requested in the error
+    floodwait_rate = 0.0
+    floodwait_time = 1
+
+    # Counter of API calls per method name; FloodWait errors are counted
+    # as 'FloodWait'
+    api_calls = None
+
+    # Message ID counter
+    message_ids = None
+
+    # Fake bot user
+    me = None
+
+    def setup_fake_client(self, latency=None, jitter=None,
+                          floodwait_rate=None, floodwait_time=None,
+                          seed=None):
+
+        """ Configure the fake client.
+
+            This has to be called before using the client.
+
+        """
+        if latency is not None:
+            self.latency = latency
+        if jitter is not None:
+            self.jitter = jitter
+        if floodwait_rate is not None:
+            self.floodwait_rate = floodwait_rate
+        if floodwait_time is not None:
+            self.floodwait_time = floodwait_time
+        self.random = random.Random(seed)
+        self.api_calls = collections.Counter()
+        self.message_ids = itertools.count(1)
+        self.me = create_user(BOT_ID, first_name='Antispam Bot',
+                              username='antispam_benchmark_bot', is_bot=True)
+        self.chats = {}
+
+    def chat(self, chat_id):
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            chat = self.chats[chat_id] = create_chat(chat_id)
+        return chat
+
+    def next_message_id(self):
+        return next(self.message_ids)
+
+    async def api_call(self, method):
+
+        """ Simulate the network round trip of an API call to method.
+        """
+        self.api_calls[method] += 1
+        latency = self.latency
+        if self.jitter:
+            latency += self.random.random() * self.jitter
+        if latency:
+            await asyncio.sleep(latency)
+        else:
+            # Give other tasks a chance to run, like a real request
+            await asyncio.sleep(0)
+        if self.floodwait_rate and self.random.random() < self.floodwait_rate:
+            self.api_calls['FloodWait'] += 1
+            raise errors.FloodWait(value=self.floodwait_time)
+
+    ### Client API
+
+    async def start(self):
+        return self
+
+    async def stop(self, block=True):
+        return self
+
+    async def get_me(self):
+        return self.me
+
+    async def send_message(self, chat_id, text, reply_to_message_id=None,
+                           disable_notification=None, **kws):
+        await self.api_call('send_message')
+        return Message(
+            id=self.next_message_id(),
+            chat=self.chat(chat_id),
+            from_user=self.me,
+            date=datetime.datetime.now(),
+            text=text,
+            reply_to_message_id=reply_to_message_id,
+            outgoing=True,
+            )
+
+    async def delete_messages(self, chat_id, message_ids, revoke=True):
+        await self.api_call('delete_messages')
+        if isinstance(message_ids, int):
+            return 1
+        return len(message_ids)
+
+    async def ban_chat_member(self, chat_id, user_id, until_date=None):
+        await self.api_call('ban_chat_member')
+        return True
+
+    async def approve_chat_join_request(self, chat_id, user_id):
+        await self.api_call('approve_chat_join_request')
+        return True
+
+    async def decline_chat_join_request(self, chat_id, user_id):
+        await self.api_call('decline_chat_join_request')
+        return True
+
+    ### Incoming updates
+
+    def join_message(self, chat_id, user):
+
+        """ Return a new chat members message for user joining chat_id.
+        """
+        return Message(
+            id=self.next_message_id(),
+            chat=self.chat(chat_id),
+            from_user=user,
+            date=datetime.datetime.now(),
+            new_chat_members=[user],
+            service=enums.MessageServiceType.NEW_CHAT_MEMBERS,
+            )
+
+    def join_request(self, chat_id, user):
+
+        """ Return a join request of user for chat_id.
+        """
+        return ChatJoinRequest(
+            chat=self.chat(chat_id),
+            from_user=user,
+            date=datetime.datetime.now(),
+            )
+
+    def text_message(self, chat_id, user, text):
+
+        """ Return a text message sent by user to chat_id.
+        """
+        return Message(
+            id=self.next_message_id(),
+            chat=self.chat(chat_id),
+            from_user=user,
+            date=datetime.datetime.now(),
+            text=text,
+            )
+
+### Update dispatcher
+
+# Handler classes for the update types
+HANDLER_CLASSES = {
+    Message: MessageHandler,
+    ChatJoinRequest: ChatJoinRequestHandler,
+    }
+
+async def dispatch(client, update):
+
+    """ Dispatch update to the first handler of each handler group of
+        client whose filters match, like the pyrogram dispatcher does.
+    """
+    handler_class = HANDLER_CLASSES[type(update)]
+    for group in client.dispatcher.groups.values():
+        for handler in group:
+            if (isinstance(handler, handler_class) and
+                await handler.check(client, update)):
+                await handler.callback(client, update)
+                break
+
+class UpdateDispatcher:
+
+    """ Feed updates to a handler using a queue and a number of worker
+        tasks, like the pyrogram dispatcher does.
+
+        The handler defaults to dispatch(), which passes the updates to
+        the handlers registered with the client.
+
+        The time from feeding an update to the handler finishing is
+        recorded in .latencies.
+
+    """
+    # Number of worker tasks
+    workers = Client.WORKERS
+
+    def __init__(self, client, handler=dispatch, workers=None):
+        self.client = client
+        self.handler = handler
+        if workers is not None:
+            self.workers = workers
+        self.queue = asyncio.Queue()
+        self.tasks = []
+        self.latencies = []
+        self.errors = 0
+
+    def start(self):
+        self.tasks = [
+            asyncio.create_task(self.worker())
+            for i in range(self.workers)]
+
+    async def stop(self):
+        await self.queue.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def feed(self, update):
+        self.queue.put_nowait((update, time.perf_counter()))
+
+    async def worker(self):
+        while True:
+            update, fed = await self.queue.get()
+            try:
+                await self.handler(self.client, update)
+            except Exception as error:
+                self.errors += 1
+                print(f'Error in handler: {error!r}')
+            finally:
+                self.latencies.append(time.perf_counter() - fed)
+                self.queue.task_done()
+
+### Stats
+
+def percentiles(values, points=(50, 90, 99, 100)):
+
+    """ Return a dict mapping the percentile points to the values.
+    """
+    if not values:
+        return {point: 0.0 for point in points}
+    values = sorted(values)
+    n = len(values)
+    return {
+        point: values[min(n - 1, max(0, int(round(point / 100 * n)) - 1))]
+        for point in points}
+
+def format_percentiles(values, unit=1000, suffix='ms'):
+    p = percentiles(values)
+    return (
+        f'p50={p[50] * unit:.1f}{suffix} '
+        f'p90={p[90] * unit:.1f}{suffix} '
+        f'p99={p[99] * unit:.1f}{suffix} '
+        f'max={p[100] * unit:.1f}{suffix} '
+        f'(n={len(values)})')
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+
+""" Replay a recording of updates against the bot, using a fake
+    pyrogram Client.
+
+    Recordings are written by the bot when setting RECORD_UPDATES_FILE.
+    The updates are fed to the bot handlers either at the original
+    timing (--speed 1), faster or slower (e.g. --speed 10) or as fast as
+    possible (--speed 0, the default).
+
+    Since the challenges differ between runs, answers which were
+    correct in the recording are replaced with the correct answer for
+    the replayed challenge. All answers to challenges are held back
+    until the replayed challenge has been sent to the member, to keep
+    the causal order.
+
+    Usage: python3 benchmarks/replay.py [options] <recording>
+
+    Reports the same figures as benchmarks/bench_load.py, so that
+    replays of the same recording can be compared across versions.
+    The replay fails (exit code 1), if the number of approved or banned
+    members differs from the recording.
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import logging
+import sys
+import time
+
+from pyrogram.types import Message
+
+from telegram_antispam_bot.outgoing import OutgoingQueue
+from telegram_antispam_bot.recorder import read_recording
+from benchmarks.fakeclient import (
+    UpdateDispatcher,
+    create_user,
+    format_percentiles,
+    )
+from benchmarks.bench_load import (
+    BenchmarkBot,
+    answer_text,
+    )
+
+### Globals
+
+# Max. time in seconds to hold back an answer, waiting for the replayed
+# challenge
+MAX_CHALLENGE_WAIT = 30
+
+### Helpers
+
+def record_user(data):
+    id, first_name, last_name, username, is_bot = data
+    return create_user(id, first_name=first_name, last_name=last_name,
+                       username=username, is_bot=is_bot)
+
+def recorded_outcomes(records):
+
+    """ Return the number of members approved and banned in the
+        recording records as tuple (approved, banned).
+
+        Members who answered a challenge correctly count as approved,
+        all other members who joined as banned.
+
+    """
+    users = {
+        (record['chat'], record['id']): record['user'][0]
+        for record in records
+        if 'id' in record and record['user'] is not None}
+    joined = set(
+        member[0]
+        for record in records
+        for member in record.get('join') or ()
+        if not member[4])
+    approved = set(
+        users.get((record['chat'], record['check']))
+        for record in records
+        if 'check' in record and record['ok'])
+    approved &= joined
+    return len(approved), len(joined - approved)
+
+### Replay
+
+class Replay:
+
+    """ Replay a recording against a BenchmarkBot.
+    """
+    def __init__(self, records, options):
+        self.options = options
+        self.updates = [record for record in records if 'id' in record]
+        # Dict mapping (chat, message id) of the answers checked in the
+        # recording to the check results
+        self.answers = {
+            (record['chat'], record['check']): record['ok']
+            for record in records
+            if 'check' in record}
+        self.expected = recorded_outcomes(records)
+        self.challenges = {}
+        # Dict mapping member IDs to the task feeding their last held
+        # back answer
+        self.held_back = {}
+        self.answer_times = {}
+        self.approval_latencies = []
+        self.ban_latencies = []
+        self.approved = 0
+        self.banned = 0
+
+    def create_bot(self):
+        options = self.options
+        bot = BenchmarkBot(session_name='replay')
+        bot.setup_fake_client(
+            latency=options.latency,
+            jitter=options.jitter,
+            floodwait_rate=options.floodwait,
+            floodwait_time=options.floodwait_time,
+            seed=options.seed)
+        # Keep the IDs of the bot messages clear of the recorded ones
+        max_id = max((record['id'] for record in self.updates), default=0)
+        bot.message_ids = itertools.count(max_id + 1)
+        bot.outgoing = OutgoingQueue(
+            rate=options.rate,
+            chat_rate=options.chat_rate,
+            concurrency=options.concurrency)
+        if options.response_timeout:
+            bot.response_timeout = options.response_timeout
+            bot.reminder_time = options.response_timeout / 2
+        bot.load_test = self
+        return bot
+
+    def create_message(self, record):
+        chat = self.bot.chat(record['chat'])
+        chat.title = record.get('title')
+        user = record['user']
+        new_chat_members = record.get('join')
+        return Message(
+            id=record['id'],
+            chat=chat,
+            from_user=record_user(user) if user is not None else None,
+            date=datetime.datetime.fromtimestamp(record['t']),
+            text=record.get('text'),
+            new_chat_members=(
+                [record_user(member) for member in new_chat_members]
+                if new_chat_members else None),
+            )
+
+    ### Bot callbacks
+
+    def challenge_event(self, member_id):
+        event = self.challenges.get(member_id)
+        if event is None:
+            event = self.challenges[member_id] = asyncio.Event()
+        return event
+
+    def challenge_sent(self, application):
+        if application.challenge is not None:
+            self.challenge_event(application.member_id).set()
+
+    def resolved(self, application, approved):
+        member_id = application.member_id
+        self.challenges.pop(member_id, None)
+        answer_time = self.answer_times.pop(member_id, None)
+        now = time.perf_counter()
+        if approved:
+            self.approved += 1
+            if answer_time is not None:
+                self.approval_latencies.append(now - answer_time)
+        else:
+            self.banned += 1
+            if answer_time is not None:
+                self.ban_latencies.append(now - answer_time)
+
+    ### Feeding updates
+
+    def feed(self, message):
+        if message.from_user is not None and message.text:
+            self.answer_times[message.from_user.id] = time.perf_counter()
+        self.dispatcher.feed(message)
+
+    def hold_back(self, message, correct):
+
+        """ Feed the answer message after the replayed challenge has been
+            sent to the member and after the member's earlier answers.
+
+            If correct is true, the text is replaced with the correct
+            answer to the replayed challenge.
+
+        """
+        member_id = message.from_user.id
+        self.held_back[member_id] = asyncio.create_task(
+            self.feed_answer(message, correct, self.held_back.get(member_id)))
+
+    async def feed_answer(self, message, correct, previous):
+        if previous is not None:
+            await previous
+        member_id = message.from_user.id
+        try:
+            await asyncio.wait_for(
+                self.challenge_event(member_id).wait(), MAX_CHALLENGE_WAIT)
+        except asyncio.TimeoutError:
+            print(f'  No challenge sent to member {member_id} within '
+                  f'{MAX_CHALLENGE_WAIT}s, feeding the answer anyway')
+        application = self.bot.new_members.get(member_id)
+        if (correct and
+            application is not None and
+            application.challenge is not None):
+            message.text = answer_text(application.challenge)
+        self.feed(message)
+
+    async def feed_updates(self):
+        speed = self.options.speed
+        start = time.perf_counter()
+        first = self.updates[0]['t'] if self.updates else 0
+        for i, record in enumerate(self.updates):
+            if speed:
+                delay = (start + (record['t'] - first) / speed -
+                         time.perf_counter())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif i % 100 == 99:
+                await asyncio.sleep(0)
+            message = self.create_message(record)
+            correct = self.answers.get((record['chat'], record['id']))
+            if correct is not None and message.from_user is not None:
+                self.hold_back(message, correct)
+            else:
+                self.feed(message)
+        await asyncio.gather(*self.held_back.values())
+
+    ### Run
+
+    async def wait_for_applications(self):
+
+        """ Wait for the pending applications to be processed.
+        """
+        deadline = time.perf_counter() + self.options.timeout
+        while ((self.bot.new_members or self.bot.resolving) and
+               time.perf_counter() < deadline):
+            await asyncio.sleep(0.1)
+
+    async def run(self):
+        options = self.options
+        bot = self.bot = self.create_bot()
+        await bot.start()
+        bot.keep_running = True
+        idle_task = asyncio.create_task(bot.idle_loop())
+        self.dispatcher = UpdateDispatcher(bot, workers=options.workers)
+        self.dispatcher.start()
+
+        start = time.perf_counter()
+        await self.feed_updates()
+        await self.dispatcher.queue.join()
+        feed_time = time.perf_counter() - start
+        await self.wait_for_applications()
+        elapsed = time.perf_counter() - start
+
+        bot.keep_running = False
+        idle_task.cancel()
+        await asyncio.gather(idle_task, return_exceptions=True)
+        await self.dispatcher.stop()
+        pending = len(bot.new_members)
+        await bot.stop()
+        self.report(feed_time, elapsed, pending)
+        return self.check_outcomes()
+
+    def report(self, feed_time, elapsed, pending):
+        bot = self.bot
+        updates = len(self.updates)
+        print(f'Replay of {updates} updates:')
+        print(f'  time:       {elapsed:.2f}s '
+              f'({feed_time:.2f}s for feeding the updates)')
+        print(f'  throughput: {updates / feed_time:.0f} updates/s')
+        print(f'  results:    {self.approved} approved, {self.banned} banned, '
+              f'{pending} pending')
+        print(f'  handler:    {format_percentiles(self.dispatcher.latencies)}')
+        print(f'  approval:   {format_percentiles(self.approval_latencies)}')
+        print(f'  ban:        {format_percentiles(self.ban_latencies)}')
+        print(f'  API calls:  ' + ', '.join(
+            f'{method}={count}'
+            for method, count in sorted(bot.api_calls.items())))
+        if self.dispatcher.errors:
+            print(f'  handler errors: {self.dispatcher.errors}')
+
+    def check_outcomes(self):
+
+        """ Return True, if the replay approved and banned as many
+            members as the recording. Differences are reported.
+        """
+        approved, banned = self.expected
+        if (self.approved, self.banned) == (approved, banned):
+            return True
+        print(f'  MISMATCH:   the recording has {approved} approved, '
+              f'{banned} banned')
+        return False
+
+### Command line interface
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description='Replay a recording of updates against the antispam '
+                    'bot using a fake client.')
+    parser.add_argument(
+        'recording',
+        help='recording file written by the bot (RECORD_UPDATES_FILE)')
+    parser.add_argument(
+        '--speed', type=float, default=0,
+        help='replay speed factor; 1 replays at the original timing, '
+             '0 as fast as possible (default: 0)')
+    parser.add_argument(
+        '--response-timeout', type=float, default=0,
+        help='response timeout to use for the bot in seconds; 0 uses the '
+             'configured timeout (default: 0)')
+    parser.add_argument(
+        '--timeout', type=float, default=600,
+        help='max. time in seconds to wait for pending applications after '
+             'the last update (default: 600)')
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help='API call latency in seconds (default: 0)')
+    parser.add_argument(
+        '--jitter', type=float, default=0.0,
+        help='max. random extra API call latency in seconds (default: 0)')
+    parser.add_argument(
+        '--floodwait', type=float, default=0.0,
+        help='probability of FloodWait errors per API call (default: 0)')
+    parser.add_argument(
+        '--floodwait-time', type=int, default=1,
+        help='wait time of FloodWait errors in seconds (default: 1)')
+    parser.add_argument(
+        '--rate', type=float, default=0,
+        help='global outgoing request rate limit; 0 disables it (default: 0)')
+    parser.add_argument(
+        '--chat-rate', type=float, default=0,
+        help='per chat outgoing request rate limit; 0 disables it '
+             '(default: 0)')
+    parser.add_argument(
+        '--concurrency', type=int, default=8,
+        help='max. number of concurrent API calls (default: 8)')
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help='number of update handler workers (default: pyrogram default)')
+    parser.add_argument(
+        '--seed', type=int, default=42,
+        help='random seed (default: 42)')
+    parser.add_argument(
+        '--log', action='store_true',
+        help='show the bot log')
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(args)
+    if not options.log:
+        logging.getLogger('antispambot').setLevel(logging.WARNING)
+    records = list(read_recording(options.recording))
+    if not asyncio.run(Replay(records, options).run()):
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,7 +6,9 @@
 
     > python3 -m telegram_antispam_bot
 
-    Simply configure everything via env variables.
+    Simply configure everything via env variables. Set TG_BOTS_CONFIG
+    to run several bots in one process (see runner.py) or TG_SHARDS to
+    run the bot in several processes (see supervisor.py).
 
     Written by Marc-Andre Lemburg.
     Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
@@ -19,7 +21,17 @@ import os
 sys.argv[0] = os.path.join(os.getcwd(), 'dummy')
 #print (f'Module start: sys.argv={sys.argv!r}, CWD={os.getcwd()!r}')
 
-# Run a single bot
-from telegram_antispam_bot.antispam_bot import AntispamBot
-app = AntispamBot()
-app.run_bot()
+from telegram_antispam_bot.config import BOTS_CONFIG, SHARDS
+if SHARDS:
+    # Run the bot in several worker processes
+    from telegram_antispam_bot.supervisor import main
+    main()
+elif BOTS_CONFIG:
+    # Run several bots in one process
+    from telegram_antispam_bot.runner import main
+    main()
+else:
+    # Run a single bot
+    from telegram_antispam_bot.antispam_bot import AntispamBot
+    app = AntispamBot()
+    app.run_bot()
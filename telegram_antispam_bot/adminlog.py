@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Admin Log
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import logging
+import time
+
+### Globals
+
+# Log object
+LOG = logging.getLogger('antispambot')
+
+# Max. length of a Telegram message
+MAX_MESSAGE_LENGTH = 4096
+
+### Admin log
+
+class AdminLog:
+
+    """ Aggregator for admin log messages.
+
+        Log entries are buffered and sent as one digest message, after
+        .flush_interval seconds or when .max_events entries have been
+        collected, whichever comes first. Urgent entries are sent right
+        away, together with the entries buffered so far.
+
+    """
+    # Coroutine function to call for sending a digest text
+    send = None
+
+    # Scheduler to use for the delayed flushes
+    scheduler = None
+
+    # Max. time in seconds to buffer log entries. 0 disables buffering.
+    flush_interval = 10
+
+    # Max. number of log entries to buffer
+    max_events = 20
+
+    # List of buffered log entries
+    buffer = None
+
+    # Scheduled flush action or None
+    scheduled_flush = None
+
+    def __init__(self, send, scheduler, flush_interval=None, max_events=None):
+        self.send = send
+        self.scheduler = scheduler
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        if max_events is not None:
+            self.max_events = max_events
+        self.buffer = []
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def add(self, text, urgent=False):
+
+        """ Add the log entry text to the buffer.
+
+            If urgent is true, the buffer is flushed right away.
+
+        """
+        self.buffer.append(f'{time.strftime("%H:%M:%S")} {text}')
+        if (urgent or
+            not self.flush_interval or
+            len(self.buffer) >= self.max_events):
+            # Flush now
+            delay = 0
+        elif self.scheduled_flush is None:
+            # Flush later
+            delay = self.flush_interval
+        else:
+            # Flush already scheduled
+            return
+        if self.scheduled_flush is not None:
+            self.scheduler.cancel(self.scheduled_flush)
+        self.scheduled_flush = self.scheduler.schedule(delay, self.flush)
+
+    def digests(self, entries):
+
+        """ Return a list of digest texts for the list of log entries,
+            each fitting into a Telegram message.
+        """
+        digests = []
+        lines = []
+        length = 0
+        for entry in entries:
+            entry = entry[:MAX_MESSAGE_LENGTH]
+            if lines and length + len(entry) + 2 > MAX_MESSAGE_LENGTH:
+                digests.append('\n\n'.join(lines))
+                lines = []
+                length = 0
+            lines.append(entry)
+            length += len(entry) + 2
+        if lines:
+            digests.append('\n\n'.join(lines))
+        return digests
+
+    async def flush(self):
+
+        """ Send all buffered log entries.
+        """
+        if self.scheduled_flush is not None:
+            self.scheduler.cancel(self.scheduled_flush)
+            self.scheduled_flush = None
+        entries = self.buffer
+        if not entries:
+            return
+        self.buffer = []
+        for digest in self.digests(entries):
+            try:
+                await self.send(digest)
+            except Exception as error:
+                LOG.error('Failed to send admin log message: %r', error)
@@ -8,25 +8,65 @@
 """
 import os
 import asyncio
-import random
 import time
-import copy
-import pprint
 import logging
 import datetime
 import enum
-from pyrogram import Client, handlers, errors
-from pyrogram.types import Message
-import emoji
+import collections
+from pyrogram import Client, handlers
 
 from telegram_antispam_bot import challenge
+from telegram_antispam_bot.challenge_pool import ChallengePool
+from telegram_antispam_bot.challenge_registry import REGISTRY
+from telegram_antispam_bot.scheduler import Scheduler
+from telegram_antispam_bot.deadlines import DeadlineIndex
+from telegram_antispam_bot.store import ApplicationStore
+from telegram_antispam_bot.outgoing import OutgoingQueue, Priority
+from telegram_antispam_bot.adminlog import AdminLog
+from telegram_antispam_bot.raid import RaidDetector
+from telegram_antispam_bot.deletion import DeletionCoalescer
+from telegram_antispam_bot.blocklist import Blocklist
+from telegram_antispam_bot.verified import VerifiedUserCache
+from telegram_antispam_bot.names import NameScreener, read_name_blocklist
+from telegram_antispam_bot.duplicates import FingerprintIndex, fingerprint
+from telegram_antispam_bot.recorder import UpdateRecorder
+from telegram_antispam_bot.metrics import BotMetrics, MetricsServer, timed
+from telegram_antispam_bot.watchdog import Watchdog
+from telegram_antispam_bot.filters import (
+    moderated_chats,
+    not_from_bot,
+    pending_applicant,
+    new_members,
+    private_chats,
+    leaving_applicant,
+    departed_applicant,
+    member_on_probation,
+    )
+from telegram_antispam_bot.logsetup import (
+    setup_logging,
+    PrettyFormat,
+    EVENTS_LOGGER,
+    )
+from telegram_antispam_bot.locks import KeyedLocks
+from telegram_antispam_bot.application import (
+    Application,
+    ApplicationState,
+    Probation,
+    SharedMessage,
+    full_name,
+    )
 
 # Load configuration
 from telegram_antispam_bot import __version__
 from telegram_antispam_bot.config import (
     DEBUG,
     LOG_FILE,
+    LOG_EVENTS_FILE,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_ROTATE_WHEN,
     IDLE_INTERVAL,
+    WORKERS,
     SESSION_NAME,
     SESSION_DATABASE_MODE,
     MANAGEMENT_GROUP_ID,
@@ -35,14 +75,63 @@ from telegram_antispam_bot.config import (
     REMINDER_TIME,
     BAN_TIME,
     REJECT_NOTICE_TIME,
+    MAX_PENDING_PER_CHAT,
+    SWEEP_INTERVAL,
+    SWEEP_BATCH_SIZE,
     APPROVAL_NOTICE_TIME,
     MUTE_BOT_MESSAGES,
+    JOIN_REQUESTS,
     API_ID,
     API_HASH,
     BOT_TOKEN,
     CHALLENGES,
+    CHALLENGE_POOL_SIZE,
+    GROUP_CHALLENGES,
     MAX_FAILED_CHALLENGES,
     MAX_EMOJIS_IN_USER_NAME,
+    NAME_BLOCKLIST,
+    NAME_BLOCKLIST_FILE,
+    NAME_SCREENING_CACHE_SIZE,
+    PROBATION_MESSAGES,
+    PROBATION_TIME,
+    DUPLICATE_MIN_LENGTH,
+    DUPLICATE_SIMILARITY,
+    DUPLICATE_WINDOW,
+    DUPLICATE_INDEX_SIZE,
+    SPAM_FINGERPRINT_TTL,
+    PERSIST_APPLICATIONS,
+    APPLICATION_STORE_FLUSH_DELAY,
+    OUTGOING_RATE,
+    OUTGOING_BURST,
+    OUTGOING_CHAT_RATE,
+    OUTGOING_CHAT_BURST,
+    OUTGOING_CONCURRENCY,
+    OUTGOING_MAX_RETRIES,
+    ADMIN_LOG_INTERVAL,
+    ADMIN_LOG_MAX_EVENTS,
+    RAID_THRESHOLD,
+    RAID_WINDOW,
+    RAID_BATCH_DELAY,
+    RAID_BATCH_SIZE,
+    DELETION_WINDOW,
+    BLOCKLIST_FILE,
+    BLOCKLIST_REJECTED,
+    VERIFIED_CACHE_SIZE,
+    VERIFIED_CACHE_TTL,
+    PERSIST_VERIFIED_USERS,
+    VERIFIED_USERS_FILE,
+    SHARED_STATE_REFRESH,
+    RECORD_UPDATES_FILE,
+    RECORD_HASH_PII,
+    RECORD_HASH_SALT,
+    METRICS_PORT,
+    METRICS_HOST,
+    MAX_LOOP_LAG,
+    WATCHDOG_THRESHOLD,
+    PROFILE_MODE,
+    PROFILE_WINDOW,
+    PROFILE_FILE,
+    SLOW_CALLBACK_DURATION,
     )
 
 ### Globals
@@ -57,66 +146,91 @@ NotGiven = object()
 class Rejection(enum.IntEnum):
     FAILED_CHALLENGE = 1
     IMMMEDIATE_BAN = 2
+    KNOWN_SPAMMER = 3
+    OVERLOAD = 4
+    DUPLICATE_SPAM = 5
+
+# Rejection reasons for which members are added to the blocklist
+BLOCKLIST_REJECTIONS = frozenset((
+    Rejection.FAILED_CHALLENGE,
+    Rejection.IMMMEDIATE_BAN,
+    Rejection.DUPLICATE_SPAM,
+    ))
+
+# Time in seconds members removed because of an overload are banned
+# for. They are unbanned right away; this only limits the ban in case
+# unbanning fails. Telegram treats bans shorter than 30 seconds as
+# permanent.
+KICK_BAN_TIME = 60
+
+### Watchdog
+
+def create_watchdog():
+
+    """ Return a Watchdog configured using the config settings.
+    """
+    return Watchdog(
+        threshold=WATCHDOG_THRESHOLD,
+        slow_callback_duration=SLOW_CALLBACK_DURATION,
+        profile_window=PROFILE_WINDOW,
+        profile_file=PROFILE_FILE)
+
+def create_name_screener():
+
+    """ Return a NameScreener configured using the config settings.
+
+        This reads the NAME_BLOCKLIST_FILE, if set.
+
+    """
+    entries = sorted(NAME_BLOCKLIST)
+    if NAME_BLOCKLIST_FILE:
+        entries.extend(read_name_blocklist(NAME_BLOCKLIST_FILE))
+    return NameScreener(
+        entries,
+        max_emojis=MAX_EMOJIS_IN_USER_NAME,
+        cache_size=NAME_SCREENING_CACHE_SIZE)
+
+def start_watchdog(watchdog):
+
+    """ Start the watchdog and the profiling, if enabled by the
+        PROFILE_MODE setting.
+
+        This has to be called from the event loop thread.
+
+    """
+    watchdog.start()
+    if PROFILE_MODE == 'cprofile':
+        watchdog.start_profiling()
+    elif PROFILE_MODE == 'debug':
+        watchdog.start_debug()
 
 ### Logging
 
-# Configure logging
-if LOG_FILE != 'stdout':
-    # File logging
-    logging.basicConfig(
-        filename=LOG_FILE,
-        encoding='utf-8',
-        format='%(asctime)s.%(msecs)03d: %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S',
-        #level=logging.INFO, # useful for pyrogram debugging
-    )
-else:
-    # stdout logging
-    logging.basicConfig(
-        format='%(asctime)s.%(msecs)03d: %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S',
-        #level=logging.INFO, # useful for pyrogram debugging
-    )
+# Configure logging; records are written by a background thread
+setup_logging(
+    log_file=LOG_FILE,
+    events_file=LOG_EVENTS_FILE,
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUP_COUNT,
+    rotate_when=LOG_ROTATE_WHEN)
 
 # Log object
 LOG = logging.getLogger('antispambot')
 LOG.setLevel(logging.INFO)
 
-### Helpers
-
-def full_name(member, full_info=False):
-
-    """ Return the full name of the member.
+# Log object for application events
+LOG_EVENTS = logging.getLogger(EVENTS_LOGGER)
 
-        If full_info is true (default is False), a markdown version is
-        returned, which includes a link to the user account, the
-        username and the ID.
+### Helpers
 
-    """
-    # Deal with None entries gracefully
-    first_name = member.first_name or ''
-    last_name = member.last_name or ''
-    if first_name and last_name:
-        name = first_name + ' ' + last_name
-    elif first_name:
-        name = first_name
-    elif last_name:
-        name = last_name
-    else:
-        name = '(missing name)'
-    if not full_info:
-        return name
-    return (
-        f'["{name}" '
-        f'(username={member.username}, id={member.id})]'
-        f'(tg://user?id={member.id})')
-
-def message_timestamp(message):
-
-    """ Return the message timestamp in local time.
+def name_list(names):
 
+    """ Return a text listing the quoted names, e.g. '"A", "B" and "C"'.
     """
-    return message.date.strftime('%Y-%m-%d %H:%M:%S')
+    names = [f'"{name}"' for name in names]
+    if len(names) == 1:
+        return names[0]
+    return ', '.join(names[:-1]) + ' and ' + names[-1]
 
 ### Bot class
 
@@ -124,20 +238,177 @@ class AntispamBot(Client):
 
     # Dictionary of new members signing up to the group.
     #
-    # The dict maps member IDs to the initial new member message.
+    # The dict maps member IDs to their Application record.
     new_members = None
 
+    # Deadline index for the reminders and timeouts of the new members.
+    #
+    # Maps member IDs to the time of the next check of their
+    # application.
+    deadlines = None
+
+    # collections.Counter with the number of pending applications per
+    # chat ID. Set in .start()
+    pending_counts = None
+
+    # Max. number of pending applications per chat. 0 disables the
+    # limit.
+    max_pending_per_chat = MAX_PENDING_PER_CHAT
+
+    # Interval in seconds and max. number of applications to check per
+    # run of the sweeper (see .sweep_applications()). An interval of 0
+    # disables the sweeper.
+    sweep_interval = SWEEP_INTERVAL
+    sweep_batch_size = SWEEP_BATCH_SIZE
+
+    # List of member IDs still to be checked by the sweeper and time of
+    # the next sweep. Set in .start()
+    sweep_queue = None
+    next_sweep = 0
+
+    # Scheduler for deferred actions, e.g. removing conversations after
+    # the notice times. Set in .__init__()
+    scheduler = None
+
+    # Does the bot own the .scheduler and .watchdog or are these shared
+    # with other bots (see runner.py) ? Shared ones are started, drained
+    # and stopped by their owner. Set in .__init__()
+    owns_scheduler = True
+    owns_watchdog = True
+
+    # KeyedLocks for serializing the processing of updates per member,
+    # while updates of different members are processed in parallel by
+    # the pyrogram workers. Set in .__init__()
+    member_locks = None
+
+    # OutgoingQueue used for all outgoing API requests. Set in .__init__()
+    outgoing = None
+
+    # AdminLog collecting the messages for the management group. Set in
+    # .__init__()
+    admin_log = None
+
+    # DeletionCoalescer for deleting messages in bulk. Set in .__init__()
+    deletions = None
+
+    # RaidDetector for detecting join raids. Set in .__init__()
+    raid_detector = None
+
+    # Dict mapping chat IDs to lists of applications waiting for a
+    # combined challenge in raid mode. Set in .start()
+    raid_batches = None
+
+    # Dict mapping chat IDs to the scheduled sending of the combined
+    # challenges. Set in .start()
+    raid_batch_actions = None
+
+    # Time in seconds to collect new members for a combined challenge in
+    # raid mode and max. number of members per combined challenge
+    raid_batch_delay = RAID_BATCH_DELAY
+    raid_batch_size = RAID_BATCH_SIZE
+
+    # Blocklist of known spammers or None, if disabled. Set in .start()
+    blocklist = None
+
+    # Add members banned by the bot to the .blocklist ?
+    blocklist_rejected = BLOCKLIST_REJECTED
+
+    # NameScreener for checking the names of new members. Set in
+    # .start(), unless shared with other bots
+    name_screener = None
+
+    # Dict mapping (chat ID, member ID) to the Probation records of
+    # recently approved members, in the order the probations end. Set
+    # in .start()
+    probation = None
+
+    # Number of messages to check per member on probation (0 disables
+    # the probation) and duration of the probation in seconds
+    probation_messages = PROBATION_MESSAGES
+    probation_time = PROBATION_TIME
+
+    # Min. length of the messages to check for duplicate spam
+    duplicate_min_length = DUPLICATE_MIN_LENGTH
+
+    # FingerprintIndex with the messages of members on probation and
+    # with the messages found to be spam. Set in .__init__()
+    recent_fingerprints = None
+    spam_fingerprints = None
+
+    # VerifiedUserCache with the members who recently passed a challenge.
+    # Set in .__init__()
+    verified_users = None
+
+    # Persist the .verified_users ?
+    persist_verified_users = PERSIST_VERIFIED_USERS
+
+    # Interval in seconds for refreshing the .blocklist and
+    # .verified_users with changes made by other processes. 0 disables
+    # this.
+    shared_state_refresh = SHARED_STATE_REFRESH
+
+    # Task running .refresh_shared_state(). Set in .start()
+    refresh_task = None
+
+    # UpdateRecorder for recording the incoming updates or None, if
+    # disabled. Set in .start()
+    recorder = None
+
+    # File to record the incoming updates to. Empty to disable recording.
+    record_updates_file = RECORD_UPDATES_FILE
+
+    # BotMetrics for monitoring the bot. Set in .__init__()
+    metrics = None
+
+    # MetricsServer serving the .metrics or None, if disabled. Set in
+    # .start()
+    metrics_server = None
+
+    # Host and port for the .metrics_server. A port of 0 disables the
+    # server.
+    metrics_host = METRICS_HOST
+    metrics_port = METRICS_PORT
+
+    # Watchdog measuring the event loop lag and reporting blocking code.
+    # Set in .__init__()
+    watchdog = None
+
+    # Persist pending applications ?
+    persist_applications = PERSIST_APPLICATIONS
+
+    # ApplicationStore used for persisting the .new_members, if enabled.
+    # Set in .start()
+    store = None
+
     # Flag to keep the .idle_loop() alive
     keep_running = False
 
+    # Prefix to use for log messages, e.g. to tell several bots running
+    # in the same process apart
+    log_prefix = ''
+
     # Bot user id. Set in .start()
     bot_id = 0
 
-    # Set of Challenge class names to use
+    # Set of Challenge names to use, see challenge_registry.py
     challenges = CHALLENGES
 
-    # Challenge classes to use. Set in .__init__(), based on .challenges
-    challenge_classes = None
+    # Dict mapping group IDs to sets of Challenge names to use for these
+    # groups instead of .challenges
+    group_challenges = GROUP_CHALLENGES
+
+    # ChallengeRegistry to load the Challenge classes from
+    challenge_registry = REGISTRY
+
+    # ChallengeSet for the .challenges and dict mapping group IDs to the
+    # ChallengeSets for the .group_challenges. Set in .__init__(); the
+    # classes are loaded on first use.
+    challenge_set = None
+    group_challenge_sets = None
+
+    # ChallengePool with challenges for the .challenge_set, generated
+    # ahead of time. Set in .__init__() and filled in .start()
+    challenge_pool = None
 
     # Max. number of failed challenge responses to allow
     max_failed_challenges = MAX_FAILED_CHALLENGES
@@ -149,8 +420,8 @@ class AntispamBot(Client):
     # restrictions are applied.
     moderation_group_ids = MODERATION_GROUP_IDS
 
-    # Idle loop interval in seconds. Idle processing will happen at these
-    # intervals.
+    # Idle loop interval in seconds. Idle processing will happen at least
+    # at these intervals. Reminders and timeouts are processed when due.
     idle_interval = IDLE_INTERVAL
 
     # Response timeout in seconds. The timer starts when the user enters the
@@ -173,6 +444,10 @@ class AntispamBot(Client):
     # Mute bot messages ?
     mute_bot_messages = MUTE_BOT_MESSAGES
 
+    # Moderate join requests instead of new members ? The challenges are
+    # then sent to the applicants in private chats.
+    join_requests = JOIN_REQUESTS
+
     ### Event loop
 
     def __init__(
@@ -184,26 +459,135 @@ class AntispamBot(Client):
         management_group_id=None,
         moderation_group_ids=None,
         challenges=None,
+        group_challenges=None,
+        join_requests=None,
+        scheduler=None,
+        watchdog=None,
         ):
         super().__init__(
             session_name,
             api_id=api_id,
             api_hash=api_hash,
-            bot_token=bot_token)
+            bot_token=bot_token,
+            workers=WORKERS or Client.WORKERS)
         if management_group_id is not None:
             self.management_group_id = management_group_id
         if moderation_group_ids is not None:
             self.moderation_group_ids = moderation_group_ids
+        if join_requests is not None:
+            self.join_requests = join_requests
+        if scheduler is None:
+            scheduler = Scheduler()
+        else:
+            self.owns_scheduler = False
+        self.scheduler = scheduler
+        self.member_locks = KeyedLocks()
+        self.outgoing = OutgoingQueue(
+            rate=OUTGOING_RATE,
+            burst=OUTGOING_BURST,
+            chat_rate=OUTGOING_CHAT_RATE,
+            chat_burst=OUTGOING_CHAT_BURST,
+            concurrency=OUTGOING_CONCURRENCY,
+            max_retries=OUTGOING_MAX_RETRIES)
+        self.admin_log = AdminLog(
+            self.send_admin_message,
+            self.scheduler,
+            flush_interval=ADMIN_LOG_INTERVAL,
+            max_events=ADMIN_LOG_MAX_EVENTS)
+        self.deletions = DeletionCoalescer(
+            self.delete_chat_messages,
+            self.report_deletion_failure,
+            self.scheduler,
+            window=DELETION_WINDOW)
+        self.raid_detector = RaidDetector(
+            threshold=RAID_THRESHOLD,
+            window=RAID_WINDOW)
+        self.recent_fingerprints = FingerprintIndex(
+            min_similarity=DUPLICATE_SIMILARITY,
+            max_size=DUPLICATE_INDEX_SIZE,
+            ttl=DUPLICATE_WINDOW)
+        self.spam_fingerprints = FingerprintIndex(
+            min_similarity=DUPLICATE_SIMILARITY,
+            max_size=DUPLICATE_INDEX_SIZE,
+            ttl=SPAM_FINGERPRINT_TTL)
+        self.verified_users = VerifiedUserCache(
+            self.scheduler,
+            max_size=VERIFIED_CACHE_SIZE,
+            ttl=VERIFIED_CACHE_TTL,
+            flush_delay=APPLICATION_STORE_FLUSH_DELAY)
+        if watchdog is None:
+            watchdog = create_watchdog()
+        else:
+            self.owns_watchdog = False
+        self.watchdog = watchdog
+        self.setup_metrics()
 
-        # Configure available Challenge classes
+        # Configure Challenge sets; the classes are loaded lazily
         if challenges is not None:
             self.challenges = challenges
-        l = []
-        for class_name in self.challenges:
-            cls = getattr(challenge, class_name, None)
-            if cls is not None and issubclass(cls, challenge.Challenge):
-                l.append(cls)
-        self.challenge_classes = l
+        if group_challenges is not None:
+            self.group_challenges = group_challenges
+        registry = self.challenge_registry
+        self.challenge_set = registry.challenge_set(self.challenges)
+        self.group_challenge_sets = {
+            group_id: registry.challenge_set(challenges)
+            for group_id, challenges in self.group_challenges.items()}
+        self.challenge_pool = ChallengePool(
+            self,
+            (),
+            self.scheduler,
+            size=CHALLENGE_POOL_SIZE)
+
+    def setup_metrics(self):
+
+        """ Set up the .metrics and add the gauges.
+        """
+        metrics = self.metrics = BotMetrics()
+        metrics.gauge(
+            'antispambot_pending_applications',
+            'Number of pending applications',
+            lambda: len(self.new_members or ()))
+        metrics.gauge(
+            'antispambot_scheduled_actions',
+            'Number of scheduled and running deferred actions',
+            lambda: len(self.scheduler))
+        metrics.gauge(
+            'antispambot_outgoing_queue_depth',
+            'Number of outgoing API requests waiting to be sent',
+            lambda: len(self.outgoing))
+        metrics.gauge(
+            'antispambot_pending_deletions',
+            'Number of messages waiting to be deleted',
+            lambda: len(self.deletions))
+        metrics.gauge(
+            'antispambot_challenge_pool_size',
+            'Number of challenges generated ahead of time',
+            lambda: len(self.challenge_pool or ()))
+        metrics.gauge(
+            'antispambot_members_on_probation',
+            'Number of approved members whose messages are checked',
+            lambda: len(self.probation or ()))
+        metrics.gauge(
+            'antispambot_message_fingerprints',
+            'Number of message fingerprints kept for finding duplicates',
+            lambda: (len(self.recent_fingerprints) +
+                     len(self.spam_fingerprints)))
+        metrics.gauge(
+            'antispambot_event_loop_lag_seconds',
+            'Event loop scheduling lag',
+            lambda: self.watchdog.lag)
+        self.outgoing.latency = metrics.api_latency
+
+    def health(self):
+
+        """ Return (healthy, text) for the health check.
+        """
+        if not self.keep_running:
+            return False, 'not running'
+        lag = self.watchdog.lag
+        if lag > MAX_LOOP_LAG:
+            return False, f'event loop lag too high: {lag:.3f}s'
+        return True, 'ok'
 
     def run_bot(self):
         self.run(self.main_loop())
@@ -233,77 +617,293 @@ class AntispamBot(Client):
                 f'{self.api_hash!r}')
 
         # Setup vars
+        self.outgoing.start()
         self.new_members = {}
+        self.deadlines = DeadlineIndex()
+        self.pending_counts = collections.Counter()
+        self.probation = {}
+        self.sweep_queue = []
+        self.next_sweep = time.time() + self.sweep_interval
+        # Load the default challenges, so that configuration errors show
+        # up right away, and prepare their challenges
+        for cls in self.challenge_set.load():
+            self.challenge_pool.add(cls)
+        self.challenge_pool.fill()
+        self.raid_batches = {}
+        self.raid_batch_actions = {}
+
+        # Load the blocklist, unless shared with other bots and already
+        # loaded
+        if BLOCKLIST_FILE and self.blocklist is None:
+            self.blocklist = Blocklist(BLOCKLIST_FILE)
+            self.blocklist.apply(
+                await asyncio.to_thread(self.blocklist.read, True))
+            self.log(
+                f'Loaded blocklist with {len(self.blocklist)} entries')
 
-        # Add catch all handler
-        self.add_handler(
-            handlers.MessageHandler(self.all_messages))
+        # Set up the name screening, unless shared with other bots
+        if self.name_screener is None:
+            self.name_screener = await asyncio.to_thread(
+                create_name_screener)
+            if self.name_screener.entries:
+                self.log(
+                    f'Loaded name blocklist with '
+                    f'{self.name_screener.entries} entries')
+
+        # Start recording updates
+        if self.record_updates_file:
+            self.recorder = UpdateRecorder(
+                self.record_updates_file,
+                self.scheduler,
+                hash_pii=RECORD_HASH_PII,
+                salt=RECORD_HASH_SALT)
+            self.recorder.open()
+
+        # Restore the verified members cache
+        if self.persist_verified_users and VERIFIED_CACHE_SIZE:
+            self.open_verified_users()
+
+        # Restore pending applications
+        if self.persist_applications:
+            await self.open_store()
+
+        # Pick up changes made to the shared state by other processes
+        if self.shared_state_refresh:
+            self.refresh_task = asyncio.create_task(
+                self.refresh_shared_state())
+
+        # Start the watchdog and profiling, if enabled
+        if self.owns_watchdog:
+            start_watchdog(self.watchdog)
+
+        # Start the metrics server
+        if self.metrics_port:
+            self.metrics_server = MetricsServer(
+                self.metrics,
+                self.health,
+                host=self.metrics_host,
+                port=self.metrics_port)
+            await self.metrics_server.start()
+            self.log(
+                f'Serving metrics on '
+                f'http://{self.metrics_host}:{self.metrics_port}/')
+
+        # Add the handlers. The filters make sure that only updates
+        # relevant to the bot get dispatched to them: joins (or join
+        # requests) in the moderated chats and messages from members
+        # with pending applications in the chats used for the
+        # challenges.
+        moderated = moderated_chats(
+            self.management_group_id, self.moderation_group_ids)
+        if self.join_requests:
+            self.add_handler(
+                handlers.ChatJoinRequestHandler(
+                    self.chat_join_request,
+                    moderated))
+            self.add_handler(
+                handlers.MessageHandler(
+                    self.applicant_message,
+                    pending_applicant & not_from_bot & private_chats))
+            self.log(f'Moderating join requests.')
+        else:
+            self.add_handler(
+                handlers.MessageHandler(
+                    self.new_chat_members,
+                    new_members & moderated))
+            # This has to come before the applicant message handler,
+            # since the left chat member message is sent by the member
+            self.add_handler(
+                handlers.MessageHandler(
+                    self.left_chat_member,
+                    leaving_applicant & moderated))
+            self.add_handler(
+                handlers.MessageHandler(
+                    self.applicant_message,
+                    pending_applicant & not_from_bot & moderated))
+            # Chat member updates are only sent to bots with admin
+            # rights, but unlike the above messages, they are also sent
+            # for large groups
+            self.add_handler(
+                handlers.ChatMemberUpdatedHandler(
+                    self.chat_member_updated,
+                    departed_applicant & moderated))
+        if self.probation_messages:
+            self.add_handler(
+                handlers.MessageHandler(
+                    self.probation_message,
+                    member_on_probation & not_from_bot & moderated))
+        if _debug:
+            # Log all messages, in a separate group, so that this does
+            # not interfere with the above handlers
+            self.add_handler(
+                handlers.MessageHandler(self.debug_message), group=-1)
 
         await self.log_admin(
             f'Started Antispam Bot "<b>{me.username}</b>"'
-            f' version {__version__}')
+            f' version {__version__}',
+            urgent=True)
         if self.mute_bot_messages:
             self.log(f'Bot messages will be muted.')
 
     async def idle_loop(self):
         while self.keep_running:
-            await asyncio.sleep(self.idle_interval)
+            # Wait for the next deadline to become due
+            await self.deadlines.wait(self.idle_interval)
             if _debug > 1:
                 self.log(f'Running idle checks')
-            # Check new members every now and then
-            if self.new_members:
+            # Check new members with due deadlines
+            if self.deadlines:
                 await self.check_new_members()
+            # Reclaim applications which are no longer tracked and
+            # end the probations which are over
+            if self.sweep_interval and time.time() >= self.next_sweep:
+                self.next_sweep = time.time() + self.sweep_interval
+                self.sweep_applications()
+                self.expire_probations()
 
     async def stop(self):
         me = await self.get_me()
         await self.log_admin(f'Stopping Antispam Bot "<b>{me.username}</b>"')
+        # Run all pending deferred actions and send all queued requests,
+        # while we're still connected
+        if self.owns_scheduler:
+            await self.scheduler.drain()
+        await self.deletions.flush()
+        await self.admin_log.flush()
+        await self.outgoing.stop()
+        if self.refresh_task is not None:
+            self.refresh_task.cancel()
+            await asyncio.gather(self.refresh_task, return_exceptions=True)
+            self.refresh_task = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+        self.verified_users.close()
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+            self.metrics_server = None
+        if self.owns_watchdog:
+            await self.watchdog.stop()
         await super().stop()
 
     # Handlers
 
     async def all_messages(self, client, message):
 
-        """ Handler which receives all messages sent to the chat.
+        """ Handler for all messages sent to the chat.
+
+            This applies the same checks as the filters of the handlers
+            registered in .start() and delegates the handling to these
+            handlers. It is not registered with the dispatcher, but can
+            be used to feed messages to the bot directly, e.g. in tests
+            and benchmarks.
 
-            This delegates the handling to other methods.
         """
         if _debug:
             self.log('New message:', message)
-        if not self.check_access(message):
-            return
 
         # Ignore messages without a .from_user attribute
         if not message.from_user:
             return
         member_id = message.from_user.id
 
+        if self.join_requests:
+            # Only answers sent in the private chats and messages of
+            # members on probation are relevant
+            if (message.chat.id == member_id and
+                member_id in self.new_members):
+                await self.applicant_message(client, message)
+            elif ((message.chat.id, member_id) in self.probation and
+                  member_id != self.bot_id and
+                  self.check_access(message)):
+                await self.probation_message(client, message)
+            return
+
+        if not self.check_access(message):
+            return
+
         # Ignore messages sent by the bot itself
         if member_id == self.bot_id:
             return
 
-        # Delegate some messages to other handlers:
+        # Delegate the messages to the handlers
         if message.new_chat_members:
             # Process new chat members message
-            return await self.new_chat_members(client, message)
-
-        # Check for answers to welcome questions
-        if member_id in self.new_members:
-            signup_message = self.new_members[member_id]
-            signup_message.conversation.append(message)
-
-            if message.text:
-                # Process text answer from new member
-                signup_message.timer = time.time()
-                if signup_message.challenge.check(message):
-                    # Correct answer
-                    await self.welcome_new_member(signup_message)
-                else:
-                    # Failure
-                    await self.failed_challenge(signup_message, message)
+            await self.new_chat_members(client, message)
+        elif message.left_chat_member:
+            # Process left chat member message
+            if message.left_chat_member.id in self.new_members:
+                await self.left_chat_member(client, message)
+        elif member_id in self.new_members:
+            # Check for answers to welcome questions
+            await self.applicant_message(client, message)
+        elif (message.chat.id, member_id) in self.probation:
+            # Check the first messages of new members for spam
+            await self.probation_message(client, message)
+
+    async def debug_message(self, client, message):
+
+        """ Handler for logging all messages in debug mode.
+        """
+        self.log('New message:', message)
+
+    @timed('applicant_message')
+    async def applicant_message(self, client, message):
+
+        """ Handler for messages sent by members with a pending
+            application.
+
+            Checks the answers to the welcome questions.
+        """
+        member_id = message.from_user.id
+        async with self.member_locks.hold(member_id):
+            application = self.new_members.get(member_id)
+            if application is None:
+                # Application was closed in the meantime
+                return
+            if message.chat.id != application.conversation_chat_id:
+                # Message sent to some other chat
+                return
+            await self.process_answer(application, message)
+
+    async def process_answer(self, application, message):
+
+        """ Process the message sent by the member of application.
+
+            The caller has to hold the member lock.
+        """
+        # Record the update for replays, if enabled
+        if self.recorder is not None:
+            self.recorder.record(message)
+
+        application.add_message(message)
+
+        if application.challenge is None:
+            # Challenge not yet sent
+            self.save_application(application)
+        elif message.text:
+            # Process text answer from new member
+            application.timer = time.time()
+            self.update_deadline(application)
+            correct = application.challenge.check(message)
+            if self.recorder is not None:
+                self.recorder.record_check(message, correct)
+            if correct:
+                # Correct answer
+                await self.welcome_new_member(application)
             else:
-                # Ignore other types of messages, e.g. stickers, photos, etc.
-                pass
+                # Failure
+                await self.failed_challenge(application, message)
+                self.save_application(application)
+        else:
+            # Ignore other types of messages, e.g. stickers, photos,
+            # etc., but remember them for removing the conversation
+            self.save_application(application)
 
+    @timed('new_chat_members')
     async def new_chat_members(self, client, message):
 
         """ Handler for new chat members messages.
@@ -312,33 +912,205 @@ class AntispamBot(Client):
         """
         if _debug:
             self.log('New chat members:', message)
-        if not self.check_access(message):
-            return
+
+        # Record the update for replays, if enabled
+        if self.recorder is not None:
+            self.recorder.record(message)
+
+        self.metrics.joins.inc(
+            message.chat.id, amount=len(message.new_chat_members))
+
+        # Check for join raids
+        under_attack = self.raid_detector.add_joins(
+            message.chat.id, len(message.new_chat_members))
 
         # Set up everything for the welcome question processing, with
-        # one message copy per new chat member
+        # one application record per new chat member
         for new_member in message.new_chat_members:
-            signup_message = copy.copy(message)
-            signup_message.new_chat_members = [new_member]
-            signup_message.new_member = new_member
-            signup_message.conversation = []
-            signup_message.member_banned = False
-            signup_message.reminder_sent = False
-            signup_message.timer = 0
-            signup_message.failed_challenges = 0
-            self.new_members[new_member.id] = signup_message
-            await self.send_challenge(signup_message)
+            if self.is_verified(new_member.id):
+                # Member already passed a challenge recently
+                await self.log_admin(
+                    f'Approved '
+                    f'{full_name(new_member, full_info=True)} '
+                    f'in group "<b>{message.chat.title}</b>" '
+                    f'without challenge: verified recently'
+                    )
+                self.metrics.approvals.inc(message.chat.id)
+                self.log_event(
+                    'approved',
+                    chat=message.chat.id,
+                    chat_title=message.chat.title,
+                    member=new_member.id,
+                    member_name=full_name(new_member),
+                    verified=True)
+                if self.probation_messages:
+                    application = Application.from_message(
+                        message, new_member)
+                    application.close(ApplicationState.APPROVED)
+                    self.start_probation(application)
+                continue
+            # Answers of the member are processed after the challenge
+            # has been sent
+            async with self.member_locks.hold(new_member.id):
+                application = Application.from_message(message, new_member)
+                self.log_event('join', application)
+                if not await self.register_application(application):
+                    continue
+                if under_attack:
+                    # Send a combined challenge to all members joining
+                    # around the same time
+                    await self.queue_raid_challenge(application)
+                else:
+                    await self.send_challenge(application)
+
+    @timed('chat_join_request')
+    async def chat_join_request(self, client, request):
+
+        """ Handler for join requests.
+
+            Initiates the challenge/response conversation with the user
+            in the private chat. The request is approved or declined
+            depending on the outcome.
+        """
+        if _debug:
+            self.log('Join request:', request)
+
+        self.metrics.joins.inc(request.chat.id)
+        member_id = request.from_user.id
+        async with self.member_locks.hold(member_id):
+            application = Application.from_join_request(request)
+            if self.is_verified(member_id):
+                # Member already passed a challenge recently
+                application.close(ApplicationState.APPROVED)
+                if await self.approve_join_request(application):
+                    await self.log_admin(
+                        f'Approved join request by '
+                        f'{application.member_info} '
+                        f'to group "<b>{application.chat_title}</b>" '
+                        f'without challenge: verified recently'
+                        )
+                    self.metrics.approvals.inc(application.chat_id)
+                    self.log_event('approved', application, verified=True)
+                    self.start_probation(application)
+                return
+            self.log_event('join', application, join_request=True)
+            if not await self.register_application(application):
+                return
+            try:
+                await self.send_challenge(application)
+            except Exception as error:
+                # Leave the join request to the admins
+                if self.close_application(
+                        application, ApplicationState.REJECTED):
+                    await self.log_admin(
+                        f'Could not send challenge for the join request by '
+                        f'{application.member_info} '
+                        f'to group "<b>{application.chat_title}</b>". '
+                        f'Please check the request by hand. Reason given '
+                        f'by Telegram: <i>{error}</i>',
+                        urgent=True)
+
+    @timed('left_chat_member')
+    async def left_chat_member(self, client, message):
+
+        """ Handler for left chat member messages of members with a
+            pending application.
+        """
+        await self.member_left(message.chat.id, message.left_chat_member.id)
+
+    @timed('chat_member_updated')
+    async def chat_member_updated(self, client, update):
+
+        """ Handler for chat member updates of members with a pending
+            application, who left the chat or were banned.
+        """
+        await self.member_left(update.chat.id, update.new_chat_member.user.id)
+
+    async def member_left(self, chat_id, member_id):
+
+        """ Withdraw the pending application of member_id, who left
+            chat_id or was removed from it by someone else.
+
+            Nothing is done, if the application is for another chat or
+            was already closed, e.g. since the bot banned the member.
+
+        """
+        async with self.member_locks.hold(member_id):
+            application = self.new_members.get(member_id)
+            if application is None or application.chat_id != chat_id:
+                return
+            if await self.drop_application(
+                    application, ApplicationState.WITHDRAWN, 'left'):
+                await self.log_admin(
+                    f'Application by '
+                    f'{application.member_info} '
+                    f'to group "<b>{application.chat_title}</b>" '
+                    f'withdrawn: member left the group'
+                    )
+
+    @timed('probation_message')
+    async def probation_message(self, client, message):
+
+        """ Handler for messages sent by members on probation.
+
+            Checks the message for duplicate spam.
+        """
+        key = (message.chat.id, message.from_user.id)
+        probation = self.probation.get(key)
+        if probation is None:
+            return
+        now = time.time()
+        if probation.until <= now:
+            del self.probation[key]
+            return
+        probation.messages -= 1
+        if probation.messages <= 0:
+            del self.probation[key]
+        text = message.text or message.caption
+        if not text or len(text) < self.duplicate_min_length:
+            return
+        signature = fingerprint(text)
+        if signature is None:
+            return
+        await self.check_duplicates(
+            probation.application, message.id, signature, now)
 
     # Helpers
 
-    async def log_admin(self, text):
+    async def api_request(self, priority, chat_id, method, *args, **kws):
+
+        """ Call the API coroutine method with args and kws via the
+            outgoing request queue and return the result.
+
+            priority has to be one of the Priority enums. chat_id is
+            used for rate limiting requests per chat.
+
+        """
+        return await self.outgoing.request(
+            priority, chat_id, method, *args, **kws)
+
+    async def log_admin(self, text, urgent=False):
 
         """ Log an admin text message to the management group.
+
+            The messages are collected by the .admin_log and sent as
+            digest messages. If urgent is true, the collected messages
+            are sent right away. This method does not wait for the
+            messages to be sent.
         """
         self.log(text)
         if not self.management_group_id:
             return
-        await self.send_message(
+        self.admin_log.add(text, urgent=urgent)
+
+    async def send_admin_message(self, text):
+
+        """ Send a text message to the management group.
+        """
+        await self.api_request(
+            Priority.ADMIN_LOG,
+            self.management_group_id,
+            self.send_message,
             self.management_group_id,
             text)
 
@@ -346,12 +1118,35 @@ class AntispamBot(Client):
 
         """ Log a text and/or an object at the given level.
 
-            The object is pretty-printed, if given.
+            The object is pretty-printed, if given. This is done by the
+            logging thread, so the object should not be changed after
+            logging it.
         """
         if text is not NotGiven:
+            if self.log_prefix:
+                text = f'{self.log_prefix}{text}'
             LOG.log(level, text)
         if object is not NotGiven:
-            LOG.log(level, pprint.pformat(object))
+            LOG.log(level, '%s', PrettyFormat(object))
+
+    def log_event(self, event, application=None, **fields):
+
+        """ Log the application event for the events log, if enabled.
+
+            The application's chat and member details are added to the
+            event, if given, as well as the fields.
+        """
+        if not LOG_EVENTS.handlers:
+            return
+        data = {'event': event}
+        if application is not None:
+            data.update(
+                chat=application.chat_id,
+                chat_title=application.chat_title,
+                member=application.member_id,
+                member_name=application.member_name)
+        data.update(fields)
+        LOG_EVENTS.info(data)
 
     def check_access(self, message):
 
@@ -367,202 +1162,1130 @@ class AntispamBot(Client):
                 return False
         return True
 
-    def create_challenge(self, message):
+    def create_challenge(self, application):
 
         """ Return a Challenge instance to use for the challenge.
         """
-        cls = random.choice(self.challenge_classes)
-        return cls(self, message)
+        challenge_set = self.group_challenge_sets.get(
+            application.chat_id, self.challenge_set)
+        cls = challenge_set.choose()
+        return cls(self, application)
 
-    async def send_challenge(self, message):
+    async def screen_application(self, application):
 
-        """ Send a challenge message to the user.
+        """ Check the application for obvious spam signups and reject
+            these right away.
+
+            Returns True, if the application was rejected.
 
-            message needs to point to the user's signup message.
+            application needs to point to the user's Application record.
         """
-        new_member = message.new_member
-        new_member_name = full_name(new_member, full_info=True)
-        if emoji.emoji_count(new_member_name) > MAX_EMOJIS_IN_USER_NAME:
-            # Ban member right away
+        if (self.blocklist is not None and
+            application.member_id in self.blocklist):
+            # Known spammer: ban member right away
             await self.log_admin(
                 f'Application by '
-                f'{new_member_name} '
-                f'to group "<b>{message.chat.title}</b>" '
-                f'rejected: too many emojis in the name'
+                f'{application.member_info} '
+                f'to group "<b>{application.chat_title}</b>" '
+                f'rejected: user is on the blocklist'
                 )
-            await self.reject_application(message,
+            await self.reject_application(application,
+                                          reason=Rejection.KNOWN_SPAMMER)
+            return True
+        reason = self.name_screener.check(
+            application.member_first_name,
+            application.member_last_name,
+            application.member_username)
+        if reason is not None:
+            # Obvious spam name: ban member right away
+            await self.log_admin(
+                f'Application by '
+                f'{application.member_info} '
+                f'to group "<b>{application.chat_title}</b>" '
+                f'rejected: {reason}'
+                )
+            await self.reject_application(application,
                                             reason=Rejection.IMMMEDIATE_BAN)
+            return True
+        return False
+
+    @timed('send_challenge')
+    async def send_challenge(self, application):
+
+        """ Send a challenge message to the user.
+
+            application needs to point to the user's Application record.
+        """
+        if await self.screen_application(application):
             return
-        challenge = self.create_challenge(message)
-        message.challenge = challenge
-        await challenge.send(message)
-        message.timer = time.time()
+        challenge = self.create_challenge(application)
+        application.challenge = challenge
+        await challenge.send(application)
+        application.timer = time.time()
+        self.update_deadline(application)
+        self.save_application(application)
+        self.log_event(
+            'challenge', application, challenge=challenge.__class__.__name__)
         await self.log_admin(
             f'Processing application by '
-            f'{new_member_name} '
-            f'to group "<b>{message.chat.title}</b>"'
+            f'{application.member_info} '
+            f'to group "<b>{application.chat_title}</b>"'
+            )
+
+    async def queue_raid_challenge(self, application):
+
+        """ Queue the application for a combined challenge message.
+
+            The combined challenge is sent after .raid_batch_delay
+            seconds or when .raid_batch_size applications have been
+            queued for the chat.
+
+            application needs to point to the user's Application record.
+        """
+        if await self.screen_application(application):
+            return
+        chat_id = application.chat_id
+        batch = self.raid_batches.setdefault(chat_id, [])
+        batch.append(application)
+        if len(batch) >= self.raid_batch_size:
+            # Send right away and start a new batch
+            action = self.raid_batch_actions.pop(chat_id, None)
+            if action is not None:
+                self.scheduler.cancel(action)
+            del self.raid_batches[chat_id]
+            self.scheduler.schedule(0, self.send_raid_challenges, batch)
+        elif chat_id not in self.raid_batch_actions:
+            self.raid_batch_actions[chat_id] = self.scheduler.schedule(
+                self.raid_batch_delay, self.flush_raid_batch, chat_id)
+
+    async def flush_raid_batch(self, chat_id):
+
+        """ Send the combined challenge for all members queued for
+            chat_id.
+        """
+        self.raid_batch_actions.pop(chat_id, None)
+        batch = self.raid_batches.pop(chat_id, None)
+        if batch:
+            await self.send_raid_challenges(batch)
+
+    async def send_raid_challenges(self, batch):
+
+        """ Send one combined challenge message to all members in the
+            list of applications batch.
+
+            All applications need to be for the same chat.
+        """
+        chat_id = batch[0].chat_id
+        # Skip applications which were processed in the meantime
+        batch = [
+            application
+            for application in batch
+            if self.new_members.get(application.member_id) is application]
+        if not batch:
+            return
+        lines = []
+        for application in batch:
+            challenge = self.create_challenge(application)
+            application.challenge = challenge
+            lines.append(
+                f'{application.member_name}: please enter '
+                f'{challenge.prepare(application)}')
+        message = await self.api_request(
+            Priority.CHALLENGE,
+            chat_id,
+            self.send_message,
+            chat_id,
+            f'Welcome to the chat ! To get approved as a member, '
+            f'please answer the following into this chat '
+            f'(within the next few seconds):\n\n' +
+            '\n'.join(lines))
+        shared_message = SharedMessage(
+            message.id,
+            [application.member_id for application in batch])
+        timer = time.time()
+        for application, line in zip(batch, lines):
+            application.add_shared_message(shared_message, line)
+            application.timer = timer
+            self.update_deadline(application)
+            self.save_application(application)
+            self.log_event(
+                'challenge', application,
+                challenge=application.challenge.__class__.__name__,
+                raid=True)
+        await self.log_admin(
+            f'Processing applications by '
+            f'{", ".join(application.member_info for application in batch)} '
+            f'to group "<b>{batch[0].chat_title}</b>" (raid mode)'
             )
 
-    async def send_reminder(self, message):
+    async def send_reminder(self, application):
 
         """ Send a reminder in case the member is not responding to the
             challenge.
 
-            message needs to point to the member's signup message.
+            application needs to point to the member's Application record.
         """
-        chat_id = message.chat.id
-        new_member = message.new_member
-        message.conversation.append(
-            await self.send_message(
-                chat_id,
-                f'Reminder: We are still waiting for an answer from user '
-                f'"{full_name(new_member)}".',
-                disable_notification=self.mute_bot_messages))
-        message.reminder_sent = True
+        await self.send_reminders([application])
+
+    async def send_reminders(self, applications):
 
-    async def failed_challenge(self, message, reply_to_message):
+        """ Send a reminder to all members in the list of applications,
+            which are not responding to the challenge.
+
+            All applications need to be for the same conversation chat
+            (see Application.conversation_chat_id). Reminders for
+            multiple members are combined into one message.
+
+        """
+        chat_id = applications[0].conversation_chat_id
+        if applications[0].join_request:
+            text = (
+                f'Reminder: We are still waiting for your answer to '
+                f'the welcome question.')
+        elif len(applications) == 1:
+            text = (
+                f'Reminder: We are still waiting for an answer from user '
+                f'"{applications[0].member_name}".')
+        else:
+            text = (
+                f'Reminder: We are still waiting for answers from users '
+                f'{name_list(application.member_name for application in applications)}.')
+        message = await self.api_request(
+            Priority.NOTICE,
+            chat_id,
+            self.send_message,
+            chat_id,
+            text,
+            disable_notification=self.mute_bot_messages)
+        if len(applications) == 1:
+            applications[0].add_message(message)
+        else:
+            shared_message = SharedMessage(
+                message.id,
+                [application.member_id for application in applications])
+            for application in applications:
+                application.add_shared_message(shared_message, text)
+        for application in applications:
+            application.reminder_sent = True
+            self.update_deadline(application)
+            self.save_application(application)
+            self.log_event('reminder', application)
+
+    async def failed_challenge(self, application, reply_to_message):
 
         """ Deal with a failed challenge response.
 
             The user can try again within the response timeout.
 
-            message needs to point to the user's signup message.
+            application needs to point to the user's Application record.
             reply_to_message needs to be the message with the user's
             answer.
 
         """
-        message.failed_challenges += 1
-        message.conversation.append(
-            await self.send_message(
-                message.chat.id,
+        application.failed_challenges += 1
+        self.metrics.failed_answers.inc(application.chat_id)
+        self.log_event(
+            'failed_answer', application,
+            attempts=application.failed_challenges)
+        self.update_deadline(application)
+        chat_id = application.conversation_chat_id
+        application.add_message(
+            await self.api_request(
+                Priority.NOTICE,
+                chat_id,
+                self.send_message,
+                chat_id,
                 f'I am sorry, but this answer is not correct. '
                 f'Please try again.',
                 reply_to_message_id=reply_to_message.id,
                 disable_notification=self.mute_bot_messages))
 
-    def log_conversation(self, message, title='', indent=2):
+    def log_conversation(self, application, title='', indent=2):
 
-        self.log(title)
-        for message in message.conversation:
-            # Note: some entries in the .conversation may be simple
-            # booleans in case messages could not be sent and messages
-            # may not always have a text, so we skip those
-            if not isinstance(message, Message) or not message.text:
-                continue
-            self.log(f'{" " * indent}{message_timestamp(message)} '
-                     f'"{full_name(message.from_user)}": "{message.text}"')
+        # Log as one record, to keep the lines together
+        self.log('\n'.join(
+            [title] +
+            [f'{" " * indent}{line}' for line in application.transcript]))
 
-    async def remove_conversation(self, message):
+    async def remove_conversation(self, application):
 
         """ Remove the welcome conversation with the user from the chat.
 
-            message needs to point to the user's signup message.
+            The messages are queued for deletion with the .deletions
+            coalescer, so this does not wait for the deletion.
+
+            application needs to point to the user's Application record.
+            Conversations in private chats (for join requests) are only
+            logged, not removed.
         """
-        self.log_conversation(message, 'Removing the following conversation:', indent=2)
-        # Note: some entries in the .conversation may be simple booleans
-        # in case messages could not be sent, so we skip those
-        message_ids = [
-            message.id
-            for message in message.conversation
-            if isinstance(message, Message)]
+        if application.join_request:
+            self.log_conversation(application, 'Conversation in private chat:', indent=2)
+            return
+        self.log_conversation(application, 'Removing the following conversation:', indent=2)
+        message_ids = application.release_messages()
         # Remove the new user message as well, if the user was banned
-        if message.member_banned:
-            message_ids.insert(0, message.id)
-        try:
-            await self.delete_messages(message.chat.id, message_ids)
-        except errors.MessageDeleteForbidden as reason:
-            await self.log_admin(
-                f'Failed to delete the conversation with user '
-                f'{full_name(message.new_member, full_info=True)} '
-                f'in group "<b>{message.chat.title}</b>" '
-                f'Please remove by hand. Reason given by Telegram: <i>{reason}</i>'
-                )
+        if application.member_banned:
+            message_ids.insert(0, application.message_id)
+        self.deletions.add(application.chat_id, message_ids)
 
-    async def welcome_new_member(self, message):
+    async def delete_chat_messages(self, chat_id, message_ids):
+
+        """ Delete the list of message_ids in chat_id.
+        """
+        await self.api_request(
+            Priority.CLEANUP,
+            chat_id,
+            self.delete_messages,
+            chat_id,
+            message_ids)
+
+    async def report_deletion_failure(self, chat_id, message_ids, error):
+
+        """ Report a failed deletion of message_ids in chat_id to the
+            admins.
+        """
+        self.metrics.deletion_failures.inc(chat_id, amount=len(message_ids))
+        self.log_event(
+            'deletion_failed', chat=chat_id, messages=len(message_ids),
+            error=str(error))
+        await self.log_admin(
+            f'Failed to delete {len(message_ids)} messages of welcome '
+            f'conversations in group {chat_id} '
+            f'(message IDs {", ".join(str(id) for id in message_ids)}). '
+            f'Please remove by hand. Reason given by Telegram: <i>{error}</i>',
+            urgent=True)
+
+    async def welcome_new_member(self, application):
 
         """ Accept and welcome the user as a new member to the group.
 
             This concludes the conversation and removes the member from
             the .new_members dict.
 
-            message needs to point to the user's signup message.
+            application needs to point to the user's Application record.
+            Nothing is done, if the application was already closed.
         """
-        chat_id = message.chat.id
-        new_member = message.new_member
-        approval_message = await self.send_message(
-            chat_id,
-            f'Thank you for answering the welcome question, '
-            f'{full_name(new_member)}. '
-            f'You are now a member of the chat.\n\n'
-            f'<i>Please introduce yourself to the group in a line or two.</i>',
-            disable_notification=self.mute_bot_messages)
-        if self.approval_notice_time:
-            # Wait and then remove the approval message as well
-            message.conversation.append(approval_message)
-            await asyncio.sleep(self.approval_notice_time)
+        if not self.close_application(
+                application, ApplicationState.APPROVED):
+            return
+        if application.join_request:
+            # Approving the request adds the member to the group, there
+            # is no need for a notice
+            if not await self.approve_join_request(application):
+                # The admins were asked to approve the request by hand;
+                # the member is not in the group (yet), so there's
+                # nothing to count or watch
+                await self.remove_conversation(application)
+                return
+        else:
+            approval_message = await self.api_request(
+                Priority.NOTICE,
+                application.chat_id,
+                self.send_message,
+                application.chat_id,
+                f'Thank you for answering the welcome question, '
+                f'{application.member_name}. '
+                f'You are now a member of the chat.\n\n'
+                f'<i>Please introduce yourself to the group in a line or two.</i>',
+                disable_notification=self.mute_bot_messages)
+        self.verified_users.add(application.member_id)
+        self.start_probation(application)
+        self.metrics.approvals.inc(application.chat_id)
+        self.log_event(
+            'approved', application, attempts=application.failed_challenges)
+        if application.join_request:
+            await self.remove_conversation(application)
+        elif self.approval_notice_time:
+            # Remove the approval message as well, after a while
+            application.add_message(approval_message)
+            self.scheduler.schedule(
+                self.approval_notice_time,
+                self.remove_conversation, application)
         else:
             # Keep the approval message in the chat
-            pass
-        await self.remove_conversation(message)
-        self.new_members.pop(new_member.id)
+            await self.remove_conversation(application)
         await self.log_admin(
             f'Accepted application by '
-            f'{full_name(new_member, full_info=True)}'
+            f'{application.member_info}'
             )
 
-    async def reject_application(self, message,
+    async def approve_join_request(self, application):
+
+        """ Approve the join request of the application.
+
+            Returns True, if successful. Failures are reported to the
+            admins.
+        """
+        try:
+            await self.api_request(
+                Priority.NOTICE,
+                application.chat_id,
+                self.approve_chat_join_request,
+                application.chat_id,
+                application.member_id)
+        except Exception as error:
+            self.log_event('approval_failed', application, error=str(error))
+            await self.log_admin(
+                f'Failed to approve join request by '
+                f'{application.member_info} '
+                f'to group "<b>{application.chat_title}</b>". '
+                f'Please approve by hand. Reason given by Telegram: '
+                f'<i>{error}</i>',
+                urgent=True)
+            return False
+        return True
+
+    async def decline_join_requests(self, applications, reason):
+
+        """ Decline the join requests of the list of (closed)
+            applications.
+
+            Declined members are not banned, but added to the
+            .blocklist, if enabled, so that their next requests are
+            declined right away. Members who failed to answer the
+            challenge are told so in the private chat.
+
+            reason has to be one of the Rejection enums.
+
+        """
+        reason_name = reason.name.lower()
+        results = await asyncio.gather(
+            *[self.api_request(
+                Priority.BAN,
+                application.chat_id,
+                self.decline_chat_join_request,
+                application.chat_id, application.member_id)
+              for application in applications],
+            return_exceptions=True)
+        for application, result in zip(applications, results):
+            if isinstance(result, Exception):
+                self.log_event(
+                    'decline_failed', application, reason=reason_name,
+                    error=str(result))
+                await self.log_admin(
+                    f'Failed to decline join request by '
+                    f'{application.member_info} '
+                    f'to group "<b>{application.chat_title}</b>". '
+                    f'Please decline by hand. Reason given by Telegram: '
+                    f'<i>{result}</i>',
+                    urgent=True)
+                continue
+            self.metrics.declines.inc(application.chat_id, reason_name)
+            self.log_event('declined', application, reason=reason_name)
+            await self.log_admin(
+                f'Declined join request by '
+                f'{application.member_info} '
+                f'to group "<b>{application.chat_title}</b>" '
+                f'(reason: {reason!r})'
+                )
+            if (self.blocklist is not None and
+                self.blocklist_rejected and
+                reason in BLOCKLIST_REJECTIONS):
+                self.add_to_blocklist(application.member_id)
+            if reason == Rejection.FAILED_CHALLENGE:
+                try:
+                    application.add_message(
+                        await self.api_request(
+                            Priority.NOTICE,
+                            application.conversation_chat_id,
+                            self.send_message,
+                            application.conversation_chat_id,
+                            f'I am sorry, but you did not answer the '
+                            f'welcome question correctly in time. Your '
+                            f'request to '
+                            f'join the group "{application.chat_title}" '
+                            f'was declined.',
+                            disable_notification=self.mute_bot_messages))
+                except Exception as error:
+                    # The member may have blocked the bot
+                    self.log(
+                        f'Could not send rejection notice to '
+                        f'{application.member_name}: {error!r}')
+            await self.remove_conversation(application)
+
+    async def reject_application(self, application,
                                  reason=Rejection.FAILED_CHALLENGE):
 
         """ Reject an application after a failed conversation.
 
-            message needs to point to the member's signup message.
+            application needs to point to the member's Application record.
 
             reason can be set to one of the Rejection enums. It defaults
             to FAILED_CHALLENGE.
 
         """
-        chat_id = message.chat.id
-        new_member = message.new_member
+        await self.reject_applications([application], reason=reason)
+
+    @timed('reject_applications')
+    async def reject_applications(self, applications,
+                                  reason=Rejection.FAILED_CHALLENGE):
+
+        """ Reject the list of applications after failed conversations.
+
+            All applications need to be for the same chat. The rejection
+            notices for multiple members are combined into one message.
+            Known spammers don't get a rejection notice.
+
+            reason can be set to one of the Rejection enums. It defaults
+            to FAILED_CHALLENGE.
+
+            Applications which were already closed are skipped. Join
+            requests are declined instead (see .decline_join_requests()).
+            Members rejected because of an OVERLOAD are not banned, but
+            only removed from the chat (see .kick_members()).
+
+        """
+        applications = [
+            application
+            for application in applications
+            if self.close_application(
+                application, ApplicationState.REJECTED)]
+        join_requests = [
+            application
+            for application in applications
+            if application.join_request]
+        if join_requests:
+            await self.decline_join_requests(join_requests, reason)
+            applications = [
+                application
+                for application in applications
+                if not application.join_request]
+        if not applications:
+            return
+        chat_id = applications[0].chat_id
+        if len(applications) == 1:
+            users = f'User "{applications[0].member_name}"'
+            verb = 'does'
+        else:
+            users = (
+                f'Users '
+                f'{name_list(application.member_name for application in applications)}')
+            verb = 'do'
         if reason == Rejection.FAILED_CHALLENGE:
             text = (
-                f'User "{full_name(new_member)}" failed to answer '
+                f'{users} failed to answer '
                 f'in time. Bye !'
             )
         elif reason == Rejection.IMMMEDIATE_BAN:
             text = (
-                f'User "{full_name(new_member)}" does not meet our '
+                f'{users} {verb} not meet our '
                 f'group standards. Bye !'
             )
+        elif reason == Rejection.OVERLOAD:
+            text = (
+                f'{users} cannot be admitted right now. '
+                f'Please try again later.'
+            )
+        elif reason == Rejection.KNOWN_SPAMMER:
+            text = None
         else:
-            raise ValueError('Unknown rejection reason: {reason!r}')
-        message.conversation.append(
-            await self.send_message(
+            raise ValueError(f'Unknown rejection reason: {reason!r}')
+        message = None
+        notice_time = 0
+        if text is not None:
+            try:
+                message = await self.api_request(
+                    Priority.NOTICE,
+                    chat_id,
+                    self.send_message,
+                    chat_id,
+                    text,
+                    disable_notification=self.mute_bot_messages)
+            except Exception as error:
+                # The members still have to be removed from the group
+                await self.log_admin(
+                    f'Failed to send the rejection notice for {users} '
+                    f'to group "<b>{applications[0].chat_title}</b>". '
+                    f'Reason given by Telegram: <i>{error}</i>')
+        if message is not None:
+            if len(applications) == 1:
+                applications[0].add_message(message)
+            else:
+                shared_message = SharedMessage(
+                    message.id,
+                    [application.member_id for application in applications])
+                for application in applications:
+                    application.add_shared_message(shared_message, text)
+            notice_time = self.reject_notice_time
+        if reason == Rejection.OVERLOAD:
+            # The members did nothing wrong, so they are only removed
+            # from the group and can try again later
+            await self.kick_members(applications)
+        else:
+            await self.ban_members(applications, reason)
+        for application in applications:
+            # Leave the rejection notice in the chat for a while
+            self.scheduler.schedule(
+                notice_time,
+                self.remove_conversation, application)
+
+    async def ban_members(self, applications, reason):
+
+        """ Ban the members of the list of applications for .ban_time
+            seconds.
+
+            All applications need to be for the same chat. reason has to
+            be one of the Rejection enums.
+
+        """
+        chat_id = applications[0].chat_id
+        ban_until = (
+            datetime.datetime.now() +
+            datetime.timedelta(seconds=self.ban_time))
+        results = await asyncio.gather(
+            *[self.api_request(
+                Priority.BAN,
                 chat_id,
-                text,
-                disable_notification=self.mute_bot_messages))
+                self.ban_chat_member,
+                chat_id, application.member_id, until_date=ban_until)
+              for application in applications],
+            return_exceptions=True)
+        for application, result in zip(applications, results):
+            if isinstance(result, Exception):
+                self.log_event(
+                    'ban_failed', application, reason=reason.name.lower(),
+                    error=str(result))
+                await self.log_admin(
+                    f'Failed to ban '
+                    f'"{application.member_info}" '
+                    f'from group "<b>{application.chat_title}</b>". '
+                    f'Please remove by hand. Reason given by Telegram: '
+                    f'<i>{result}</i>',
+                    urgent=True)
+            else:
+                application.add_message(result)
+                application.member_banned = True
+                self.metrics.bans.inc(chat_id, reason.name.lower())
+                self.log_event(
+                    'banned', application, reason=reason.name.lower(),
+                    ban_time=self.ban_time)
+                await self.log_admin(
+                    f'Banned '
+                    f'"{application.member_info}" '
+                    f'from group "<b>{application.chat_title}</b>" '
+                    f'for {self.ban_time} seconds (until {ban_until}, '
+                    f'reason: {reason!r})'
+                    )
+                if (self.blocklist is not None and
+                    self.blocklist_rejected and
+                    reason in BLOCKLIST_REJECTIONS):
+                    self.add_to_blocklist(application.member_id)
+
+    async def kick_members(self, applications):
+
+        """ Remove the members of the list of applications from the chat
+            without banning them, so that they can join again later.
+
+            All applications need to be for the same chat. Members are
+            banned and unbanned right away. The ban expires after
+            KICK_BAN_TIME seconds, in case unbanning fails.
+
+        """
+        chat_id = applications[0].chat_id
+        ban_until = (
+            datetime.datetime.now() +
+            datetime.timedelta(seconds=KICK_BAN_TIME))
+        results = await asyncio.gather(
+            *[self.api_request(
+                Priority.BAN,
+                chat_id,
+                self.ban_chat_member,
+                chat_id, application.member_id, until_date=ban_until)
+              for application in applications],
+            return_exceptions=True)
+        for application, result in zip(applications, results):
+            if isinstance(result, Exception):
+                self.log_event(
+                    'kick_failed', application, reason='overload',
+                    error=str(result))
+                await self.log_admin(
+                    f'Failed to remove '
+                    f'"{application.member_info}" '
+                    f'from group "<b>{application.chat_title}</b>". '
+                    f'Please remove by hand. Reason given by Telegram: '
+                    f'<i>{result}</i>',
+                    urgent=True)
+                continue
+            application.add_message(result)
+            try:
+                await self.api_request(
+                    Priority.BAN,
+                    chat_id,
+                    self.unban_chat_member,
+                    chat_id, application.member_id)
+            except Exception as error:
+                await self.log_admin(
+                    f'Failed to unban '
+                    f'"{application.member_info}" '
+                    f'in group "<b>{application.chat_title}</b>" '
+                    f'after removing them; the ban expires in '
+                    f'{KICK_BAN_TIME} seconds. Reason given by Telegram: '
+                    f'<i>{error}</i>')
+            # Remove the join message as well
+            self.deletions.add(chat_id, [application.message_id])
+            self.metrics.dropped.inc(chat_id, 'overload')
+            self.log_event('kicked', application, reason='overload')
+            await self.log_admin(
+                f'Removed '
+                f'"{application.member_info}" '
+                f'from group "<b>{application.chat_title}</b>" '
+                f'without banning (reason: {Rejection.OVERLOAD!r})'
+                )
+
+    # Probation
+
+    def start_probation(self, application):
+
+        """ Put the member of the approved application on probation in
+            the application's chat.
+        """
+        if not self.probation_messages:
+            return
+        key = (application.chat_id, application.member_id)
+        # Keep the dict in the order the probations end
+        self.probation.pop(key, None)
+        self.probation[key] = Probation(
+            application,
+            self.probation_messages,
+            time.time() + self.probation_time)
+
+    def expire_probations(self):
+
+        """ Remove the probations which are over and the expired message
+            fingerprints.
+
+            Returns the number of removed probations.
+
+        """
+        now = time.time()
+        expired = []
+        for key, probation in self.probation.items():
+            if probation.until > now:
+                break
+            expired.append(key)
+        for key in expired:
+            del self.probation[key]
+        self.recent_fingerprints.expire(now)
+        self.spam_fingerprints.expire(now)
+        return len(expired)
+
+    async def check_duplicates(self, application, message_id, signature,
+                               now=None):
+
+        """ Check the message message_id with the fingerprint signature,
+            which the member of application posted during the
+            probation, for duplicate spam.
+
+            The message is spam, if it is a near-duplicate of a known
+            spam message or of a message another member on probation
+            posted recently (or the same member in another chat). All
+            these messages are deleted and their senders banned.
+
+            Returns True, if the message was found to be spam.
+
+        """
+        if now is None:
+            now = time.time()
+        chat_id = application.chat_id
+        member_id = application.member_id
+        known_spam = self.spam_fingerprints.find(signature, now)
+        duplicates = [
+            entry
+            for entry in self.recent_fingerprints.find(signature, now)
+            if (entry.data[0].chat_id != chat_id or
+                entry.data[0].member_id != member_id)]
+        if not known_spam and not duplicates:
+            self.recent_fingerprints.add(
+                signature, (application, message_id), now)
+            return False
+        self.spam_fingerprints.add(signature, None, now)
+        spam = [(application, message_id)]
+        for entry in duplicates:
+            self.recent_fingerprints.remove(entry)
+            spam.append(entry.data)
+        self.log_event(
+            'duplicate_spam', application, message=message_id,
+            known_spam=bool(known_spam), duplicates=len(duplicates))
+        for spammer_application, spam_message_id in spam:
+            await self.ban_spammer(spammer_application, spam_message_id)
+        return True
+
+    async def ban_spammer(self, application, message_id,
+                          reason=Rejection.DUPLICATE_SPAM):
+
+        """ Delete the spam message message_id, which the member of the
+            approved application posted, and ban the member.
+
+            The member is removed from the verified members, so that
+            the member will be challenged again when joining other
+            groups.
+
+        """
+        chat_id = application.chat_id
+        member_id = application.member_id
+        self.deletions.add(chat_id, [message_id])
+        self.probation.pop((chat_id, member_id), None)
+        self.verified_users.remove(member_id)
+        if application.member_banned:
+            # Already banned because of another message
+            return
         ban_until = (
             datetime.datetime.now() +
             datetime.timedelta(seconds=self.ban_time))
-        message.conversation.append(
-            await self.ban_chat_member(
-                chat_id, new_member.id, until_date=ban_until))
-        message.member_banned = True
-        self.new_members.pop(new_member.id)
+        try:
+            await self.api_request(
+                Priority.BAN,
+                chat_id,
+                self.ban_chat_member,
+                chat_id, member_id, until_date=ban_until)
+        except Exception as error:
+            self.log_event(
+                'ban_failed', application, reason=reason.name.lower(),
+                error=str(error))
+            await self.log_admin(
+                f'Failed to ban '
+                f'"{application.member_info}" '
+                f'from group "<b>{application.chat_title}</b>" '
+                f'after posting spam. '
+                f'Please remove by hand. Reason given by Telegram: '
+                f'<i>{error}</i>',
+                urgent=True)
+            return
+        application.member_banned = True
+        self.metrics.bans.inc(chat_id, reason.name.lower())
+        self.log_event(
+            'banned', application, reason=reason.name.lower(),
+            ban_time=self.ban_time)
         await self.log_admin(
             f'Banned '
-            f'"{full_name(new_member, full_info=True)}" '
-            f'from group "<b>{message.chat.title}</b>" '
+            f'"{application.member_info}" '
+            f'from group "<b>{application.chat_title}</b>" '
             f'for {self.ban_time} seconds (until {ban_until}, '
             f'reason: {reason!r})'
             )
-        await asyncio.sleep(self.reject_notice_time)
-        await self.remove_conversation(message)
+        if (self.blocklist is not None and
+            self.blocklist_rejected and
+            reason in BLOCKLIST_REJECTIONS):
+            self.add_to_blocklist(member_id)
+
+    # Application state
+
+    def save_application(self, application):
+
+        """ Queue the application for saving in the .store, if enabled.
+
+            Closed applications are not saved.
+        """
+        if self.store is not None and application.pending:
+            self.store.save(application)
+
+    async def register_application(self, application):
+
+        """ Register the new application as pending application.
+
+            Returns False, if the application was rejected, since its
+            chat already has .max_pending_per_chat pending
+            applications.
+
+            A previous pending application of the same member, e.g. for
+            another chat, is dropped.
+
+        """
+        if (self.max_pending_per_chat and
+            self.pending_counts[application.chat_id] >=
+            self.max_pending_per_chat):
+            await self.log_admin(
+                f'Application by '
+                f'{application.member_info} '
+                f'to group "<b>{application.chat_title}</b>" '
+                f'rejected: too many pending applications'
+                )
+            await self.reject_application(application,
+                                          reason=Rejection.OVERLOAD)
+            return False
+        previous = self.add_application(application)
+        if previous is not None:
+            await self.drop_application(
+                previous, ApplicationState.EXPIRED, 'superseded')
+        return True
+
+    def add_application(self, application):
+
+        """ Add the application to the pending applications and set its
+            deadline.
+
+            Returns the previous pending application of the member or
+            None. The caller has to close this.
+
+        """
+        member_id = application.member_id
+        previous = self.new_members.get(member_id)
+        if previous is not None:
+            self.remove_application(previous)
+        self.new_members[member_id] = application
+        self.pending_counts[application.chat_id] += 1
+        self.update_deadline(application)
+        return previous
+
+    def remove_application(self, application):
+
+        """ Remove the application from the pending applications.
+        """
+        member_id = application.member_id
+        del self.new_members[member_id]
+        self.deadlines.remove(member_id)
+        chat_id = application.chat_id
+        count = self.pending_counts[chat_id] - 1
+        if count > 0:
+            self.pending_counts[chat_id] = count
+        else:
+            del self.pending_counts[chat_id]
+
+    async def drop_application(self, application, state, reason):
+
+        """ Close the application with state (WITHDRAWN or EXPIRED),
+            without approving or rejecting the member, and remove the
+            conversation.
+
+            reason is used for the metrics and the events log.
+
+            Returns True, if the application was closed by this call.
+
+        """
+        if not self.close_application(application, state):
+            return False
+        self.metrics.dropped.inc(application.chat_id, reason)
+        self.log_event('dropped', application, reason=reason)
+        await self.remove_conversation(application)
+        return True
+
+    def close_application(self, application, state):
+
+        """ Close the application with the final state (one of the
+            ApplicationState enums) and remove it from the pending
+            applications.
+
+            Returns True, if the application was closed by this call,
+            False if it was already closed before. Since this does not
+            wait, callers can use the return value to make sure that
+            they act on an application only once.
+
+        """
+        if not application.close(state):
+            return False
+        member_id = application.member_id
+        if self.new_members.get(member_id) is application:
+            self.remove_application(application)
+            if self.store is not None:
+                self.store.delete(member_id)
+        return True
+
+    def is_verified(self, member_id):
+
+        """ Return True, if member_id recently passed a challenge and
+            can be approved without a new challenge.
+
+            Members on the .blocklist are never considered verified.
+        """
+        if member_id not in self.verified_users:
+            return False
+        if self.blocklist is not None and member_id in self.blocklist:
+            return False
+        return True
+
+    def open_verified_users(self):
+
+        """ Open the database of the .verified_users and load the
+            entries from it.
+        """
+        filename = VERIFIED_USERS_FILE or os.path.join(
+            self.workdir, f'{self.name}-verified.db')
+        self.verified_users.filename = filename
+        self.verified_users.open()
+        try:
+            os.chmod(filename, SESSION_DATABASE_MODE)
+        except FileNotFoundError as error:
+            self.log(
+                f'WARNING: Could not secure verified users database file: '
+                f'{error}')
+        if self.verified_users:
+            self.log(
+                f'Restored {len(self.verified_users)} verified members')
+
+    def add_to_blocklist(self, member_id):
+
+        """ Add member_id to the .blocklist.
+
+            If the blocklist needs compacting, this is scheduled to run
+            in a separate thread, so that the handlers don't have to
+            wait for it.
+
+        """
+        blocklist = self.blocklist
+        blocklist.add(member_id)
+        if blocklist.needs_compaction() and not blocklist.compacting:
+            blocklist.compacting = True
+            self.scheduler.schedule(0, self.compact_blocklist)
+
+    async def compact_blocklist(self):
+
+        """ Compact the .blocklist in a separate thread.
+        """
+        blocklist = self.blocklist
+        try:
+            blocklist.apply(
+                await asyncio.to_thread(
+                    blocklist.compact_files, set(blocklist.recent)))
+        except Exception as error:
+            self.log(
+                f'Could not compact the blocklist: {error!r}',
+                level=logging.ERROR)
+        else:
+            self.log(
+                f'Compacted blocklist with {len(blocklist)} entries')
+        finally:
+            blocklist.compacting = False
+
+    async def refresh_shared_state(self):
+
+        """ Task for refreshing the .blocklist and .verified_users with
+            the changes made by other processes sharing their files,
+            every .shared_state_refresh seconds.
+        """
+        while True:
+            await asyncio.sleep(self.shared_state_refresh)
+            try:
+                if self.blocklist is not None:
+                    # Read the files in a thread, but apply the changes
+                    # here, since the blocklist is in use by the handlers
+                    self.blocklist.apply(
+                        await asyncio.to_thread(self.blocklist.read))
+                await self.verified_users.refresh()
+            except Exception as error:
+                self.log(
+                    f'Could not refresh the shared state: {error!r}',
+                    level=logging.ERROR)
+
+    def challenge_class(self, class_name):
+
+        """ Return the Challenge class for class_name, as stored by
+            Application.to_dict().
+
+            Falls back to the base Challenge class, if the class is not
+            available.
+
+        """
+        try:
+            return self.challenge_registry.load(class_name)
+        except Exception as error:
+            self.log(
+                f'Could not load challenge {class_name!r}: {error}',
+                level=logging.ERROR)
+            return challenge.Challenge
+
+    async def open_store(self):
+
+        """ Open the application store and restore the pending
+            applications from it.
+
+            Reminders and timeouts are rearmed, so timeouts which
+            happened while the bot was not running are processed right
+            away.
+
+            Applications for groups the bot no longer moderates, e.g.
+            since the supervisor moved the groups to another worker, are
+            removed from the store and reported to the admins, instead
+            of letting them time out.
+
+        """
+        filename = os.path.join(
+            self.workdir, f'{self.name}-applications.db')
+        self.store = ApplicationStore(
+            filename,
+            self.scheduler,
+            flush_delay=APPLICATION_STORE_FLUSH_DELAY)
+        self.store.open()
+        try:
+            os.chmod(filename, SESSION_DATABASE_MODE)
+        except FileNotFoundError as error:
+            self.log(
+                f'WARNING: Could not secure application database file: '
+                f'{error}')
+        unsent_challenges = []
+        shared_messages = {}
+        foreign_applications = []
+        for data in self.store.load():
+            application = Application.from_dict(data)
+            if (self.moderation_group_ids and
+                application.chat_id not in self.moderation_group_ids):
+                foreign_applications.append(application)
+                self.store.delete(application.member_id)
+                continue
+            for message_id in data.get('shared_messages', ()):
+                shared_message = shared_messages.get(message_id)
+                if shared_message is None:
+                    shared_message = shared_messages[message_id] = (
+                        SharedMessage(message_id, ()))
+                shared_message.member_ids.add(application.member_id)
+                application.shared_messages.append(shared_message)
+            challenge_data = data['challenge']
+            if challenge_data is not None:
+                class_name, answer = challenge_data
+                application.challenge = self.challenge_class(class_name)(
+                    self, application)
+                application.challenge.restore(answer)
+            self.add_application(application)
+            if not application.timer:
+                unsent_challenges.append(application)
+        if self.new_members:
+            self.log(
+                f'Restored {len(self.new_members)} pending applications')
+        for application in foreign_applications:
+            self.metrics.dropped.inc(application.chat_id, 'moved')
+            self.log_event('dropped', application, reason='moved')
+            await self.log_admin(
+                f'Dropped stored application by '
+                f'{application.member_info} '
+                f'to group "<b>{application.chat_title}</b>": group is no '
+                f'longer moderated by this bot. Please check the member '
+                f'by hand.',
+                urgent=True)
+        # Send challenges which could not be sent before the restart
+        for application in unsent_challenges:
+            await self.send_challenge(application)
 
     # Loop processing
 
+    def update_deadline(self, application):
+
+        """ Update the deadline of the next check of the member's
+            application in .deadlines.
+
+            This has to be called whenever the .timer, .reminder_sent or
+            .failed_challenges of the application change.
+
+            application needs to point to the member's Application record.
+            Closed applications don't get a deadline.
+        """
+        if not application.pending:
+            return
+        if not application.timer:
+            # Challenge not sent yet; the application expires, if this
+            # does not happen within the response timeout
+            deadline = application.joined + self.response_timeout
+        elif application.failed_challenges >= self.max_failed_challenges:
+            # Reject right away
+            deadline = time.time()
+        else:
+            deadline = application.timer + self.response_timeout
+            if not application.reminder_sent:
+                deadline = min(deadline,
+                               application.timer + self.reminder_time)
+        self.deadlines.set(application.member_id, deadline)
+
     async def check_new_members(self):
 
-        """ Check new member applications.
+        """ Check new member applications with due deadlines.
 
             This sends reminders or rejects their application in case of
             timeouts.
@@ -570,24 +2293,87 @@ class AntispamBot(Client):
         current_time = time.time()
         if _debug:
             self.log(f'Checking new members')
-        for id, message in list(self.new_members.items()):
-            if not message.timer:
-                # Challenge not yet sent
+        # Collect the due rejections and reminders per chat, so that
+        # they can be combined
+        rejections = {}
+        reminders = {}
+        expired = []
+        for id in self.deadlines.pop_due(current_time):
+            application = self.new_members.get(id)
+            if application is None:
+                # Application already processed
                 continue
-            waiting_time = current_time - message.timer
-            if (waiting_time > self.response_timeout or
-                message.failed_challenges >= self.max_failed_challenges):
+            if not application.timer:
+                # The challenge could not be sent in time
+                expired.append(application)
+                continue
+            waiting_time = current_time - application.timer
+            if (waiting_time >= self.response_timeout or
+                application.failed_challenges >= self.max_failed_challenges):
                 # Ban member for a while
-                await self.reject_application(message)
-            elif (not message.reminder_sent and
-                  waiting_time > self.reminder_time):
+                rejections.setdefault(
+                    application.chat_id, []).append(application)
+            elif (not application.reminder_sent and
+                  waiting_time >= self.reminder_time):
                 # Send a reminder message
-                await self.send_reminder(message)
+                reminders.setdefault(
+                    application.conversation_chat_id, []).append(application)
             else:
                 if _debug:
                     self.log(
                         'Still waiting for answer from new member:',
-                        message)
+                        application)
+                self.update_deadline(application)
+        for applications in rejections.values():
+            await self.reject_applications(applications)
+        for applications in reminders.values():
+            await self.send_reminders(applications)
+        for application in expired:
+            if await self.drop_application(
+                    application, ApplicationState.EXPIRED, 'expired'):
+                await self.log_admin(
+                    f'Application by '
+                    f'{application.member_info} '
+                    f'to group "<b>{application.chat_title}</b>" '
+                    f'expired: the challenge could not be sent. '
+                    f'Please check the member by hand.',
+                    urgent=True)
+
+    def sweep_applications(self):
+
+        """ Check up to .sweep_batch_size pending applications and
+            reclaim the ones which are no longer tracked.
+
+            Closed applications are removed and pending applications
+            without a deadline get their deadline set again, so that
+            they are processed when due. The sweeper works through all
+            pending applications in batches, one batch per call.
+
+            Returns the number of reclaimed applications.
+
+        """
+        if not self.sweep_queue:
+            self.sweep_queue = list(self.new_members)
+        batch = self.sweep_queue[-self.sweep_batch_size:]
+        del self.sweep_queue[-self.sweep_batch_size:]
+        reclaimed = 0
+        for member_id in batch:
+            application = self.new_members.get(member_id)
+            if application is None:
+                continue
+            if not application.pending:
+                self.remove_application(application)
+                if self.store is not None:
+                    self.store.delete(member_id)
+                reclaimed += 1
+            elif member_id not in self.deadlines:
+                self.update_deadline(application)
+                reclaimed += 1
+        if reclaimed:
+            self.log(
+                f'Sweeper reclaimed {reclaimed} untracked applications',
+                level=logging.WARNING)
+        return reclaimed
 
 ###
 
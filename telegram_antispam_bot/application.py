@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Application Records
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import enum
+import time
+from pyrogram.types import Message
+
+from telegram_antispam_bot.challenge_registry import challenge_name
+
+### Helpers
+
+def full_name(member, full_info=False):
+
+    """ Return the full name of the member.
+
+        If full_info is true (default is False), a markdown version is
+        returned, which includes a link to the user account, the
+        username and the ID.
+
+    """
+    # Deal with None entries gracefully
+    first_name = member.first_name or ''
+    last_name = member.last_name or ''
+    if first_name and last_name:
+        name = first_name + ' ' + last_name
+    elif first_name:
+        name = first_name
+    elif last_name:
+        name = last_name
+    else:
+        name = '(missing name)'
+    if not full_info:
+        return name
+    return (
+        f'["{name}" '
+        f'(username={member.username}, id={member.id})]'
+        f'(tg://user?id={member.id})')
+
+def message_timestamp(message):
+
+    """ Return the message timestamp in local time.
+
+    """
+    return message.date.strftime('%Y-%m-%d %H:%M:%S')
+
+### Shared messages
+
+class SharedMessage:
+
+    """ Message sent to several new members at once, e.g. a combined
+        challenge message in raid mode.
+
+        The message can only be removed, after all members it was sent
+        to have finished their application.
+
+    """
+    __slots__ = ('message_id', 'member_ids')
+
+    def __init__(self, message_id, member_ids):
+        self.message_id = message_id
+        self.member_ids = set(member_ids)
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}('
+            f'message_id={self.message_id!r}, '
+            f'member_ids={self.member_ids!r})')
+
+    def release(self, member_id):
+
+        """ Release the message for member_id.
+
+            Returns True, if the message is no longer needed by any
+            member and can be removed.
+
+        """
+        self.member_ids.discard(member_id)
+        return not self.member_ids
+
+### Application record
+
+# Application states: pending applications are either approved,
+# rejected or withdrawn (the member left) or expired (the bot could not
+# process the application), exactly once
+class ApplicationState(enum.IntEnum):
+    PENDING = 1
+    APPROVED = 2
+    REJECTED = 3
+    WITHDRAWN = 4
+    EXPIRED = 5
+
+class Application:
+
+    """ Pending application of a new member to a group chat.
+
+        The record only stores the IDs and texts the bot needs to
+        process the application, so that no pyrogram objects are kept
+        alive while waiting for the member to answer the challenge.
+
+    """
+    __slots__ = (
+        # Chat ID and title of the group
+        'chat_id',
+        'chat_title',
+
+        # ID of the new chat members service message (0 for join
+        # requests)
+        'message_id',
+
+        # Member ID, first name, full name and full info markdown (see
+        # full_name())
+        'member_id',
+        'member_first_name',
+        'member_name',
+        'member_info',
+
+        # Member last name and username (None, if not set), used for
+        # screening the names
+        'member_last_name',
+        'member_username',
+
+        # Challenge instance used for the application
+        'challenge',
+
+        # List of message IDs of the conversation with the member
+        'conversation',
+
+        # List of SharedMessage instances sent to the member and other
+        # members
+        'shared_messages',
+
+        # List of log lines for the text messages of the conversation
+        'transcript',
+
+        # Time of the last answer from the member (or of sending the
+        # challenge). 0 means that the challenge has not been sent yet.
+        'timer',
+
+        # Time of the join (or of the join request)
+        'joined',
+
+        # Counters and flags
+        'failed_challenges',
+        'reminder_sent',
+        'member_banned',
+
+        # ApplicationState of the application
+        'state',
+
+        # Application via a join request ? The conversation then takes
+        # place in the private chat with the member.
+        'join_request',
+    )
+
+    @classmethod
+    def from_message(cls, message, new_member):
+
+        """ Create an Application for the new_member from the new chat
+            members message.
+        """
+        return cls(
+            message.chat.id,
+            message.chat.title,
+            message.id,
+            new_member.id,
+            new_member.first_name,
+            full_name(new_member),
+            full_name(new_member, full_info=True),
+            member_last_name=new_member.last_name,
+            member_username=new_member.username)
+
+    @classmethod
+    def from_join_request(cls, request):
+
+        """ Create an Application from the ChatJoinRequest request.
+        """
+        return cls(
+            request.chat.id,
+            request.chat.title,
+            0,
+            request.from_user.id,
+            request.from_user.first_name,
+            full_name(request.from_user),
+            full_name(request.from_user, full_info=True),
+            member_last_name=request.from_user.last_name,
+            member_username=request.from_user.username,
+            join_request=True)
+
+    def __init__(self, chat_id, chat_title, message_id,
+                 member_id, member_first_name, member_name, member_info,
+                 member_last_name=None, member_username=None,
+                 join_request=False):
+        self.chat_id = chat_id
+        self.chat_title = chat_title
+        self.message_id = message_id
+        self.member_id = member_id
+        self.member_first_name = member_first_name
+        self.member_name = member_name
+        self.member_info = member_info
+        self.member_last_name = member_last_name
+        self.member_username = member_username
+        self.challenge = None
+        self.conversation = []
+        self.shared_messages = []
+        self.transcript = []
+        self.timer = 0
+        self.joined = time.time()
+        self.failed_challenges = 0
+        self.reminder_sent = False
+        self.member_banned = False
+        self.state = ApplicationState.PENDING
+        self.join_request = join_request
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}('
+            f'chat_id={self.chat_id!r}, '
+            f'member_id={self.member_id!r}, '
+            f'member_name={self.member_name!r}, '
+            f'conversation={self.conversation!r}, '
+            f'timer={self.timer!r}, '
+            f'failed_challenges={self.failed_challenges!r}, '
+            f'reminder_sent={self.reminder_sent!r}, '
+            f'state={self.state!r})')
+
+    @property
+    def pending(self):
+        return self.state is ApplicationState.PENDING
+
+    @property
+    def conversation_chat_id(self):
+
+        """ ID of the chat in which the conversation with the member
+            takes place: the group chat or, for join requests, the
+            private chat with the member.
+        """
+        if self.join_request:
+            # Private chats use the user ID as chat ID
+            return self.member_id
+        return self.chat_id
+
+    def close(self, state):
+
+        """ Close the application with the final state (one of the
+            ApplicationState enums).
+
+            Returns True, if the application was pending, False if it
+            was already closed. This makes closing the application
+            idempotent: only the first of several racing approvals or
+            rejections takes effect.
+
+        """
+        if self.state is not ApplicationState.PENDING:
+            return False
+        self.state = state
+        return True
+
+    def to_dict(self):
+
+        """ Return the record as dict, suitable for JSON serialization.
+
+            The challenge is stored as [challenge name, answer] list, with
+            the name as returned by challenge_name(), the
+            shared messages as list of message IDs.
+
+        """
+        d = {
+            name: getattr(self, name)
+            for name in self.__slots__
+            if name not in ('challenge', 'shared_messages', 'state')}
+        d['shared_messages'] = [
+            shared_message.message_id
+            for shared_message in self.shared_messages]
+        challenge = self.challenge
+        if challenge is not None:
+            d['challenge'] = [challenge_name(challenge.__class__), challenge.answer]
+        else:
+            d['challenge'] = None
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+
+        """ Create an Application record from the dict d, as returned by
+            .to_dict().
+
+            The challenge and the shared messages are not restored.
+            This has to be done by the caller.
+
+        """
+        application = cls(
+            d['chat_id'],
+            d['chat_title'],
+            d['message_id'],
+            d['member_id'],
+            d['member_first_name'],
+            d['member_name'],
+            d['member_info'],
+            # Not available in records written by older versions
+            member_last_name=d.get('member_last_name'),
+            member_username=d.get('member_username'),
+            join_request=d.get('join_request', False))
+        for name in ('conversation',
+                     'transcript',
+                     'timer',
+                     'failed_challenges',
+                     'reminder_sent',
+                     'member_banned'):
+            setattr(application, name, d[name])
+        if 'joined' in d:
+            # Not available in records written by older versions
+            application.joined = d['joined']
+        return application
+
+    def add_shared_message(self, shared_message, text=None):
+
+        """ Add the SharedMessage instance shared_message to the
+            conversation with the member.
+
+            text is logged in the .transcript, if given.
+
+        """
+        self.shared_messages.append(shared_message)
+        if text:
+            self.transcript.append(f'(shared message) "{text}"')
+
+    def release_messages(self):
+
+        """ Return the list of message IDs of the conversation, which
+            can be removed from the chat.
+
+            This includes all shared messages, which are no longer
+            needed by other members.
+
+        """
+        message_ids = list(self.conversation)
+        for shared_message in self.shared_messages:
+            if shared_message.release(self.member_id):
+                message_ids.append(shared_message.message_id)
+        self.shared_messages = []
+        return message_ids
+
+    def add_message(self, message):
+
+        """ Add the message to the conversation with the member.
+
+            Note: Some API calls return simple booleans instead of
+            messages. These are ignored.
+
+        """
+        if not isinstance(message, Message):
+            return
+        self.conversation.append(message.id)
+        # Messages may not always have a text, so we only log those
+        # which do
+        if message.text:
+            self.transcript.append(
+                f'{message_timestamp(message)} '
+                f'"{full_name(message.from_user)}": "{message.text}"')
+
+### Probation record
+
+class Probation:
+
+    """ Probation of a member after the approval of the application.
+
+        The first messages of the member in the group are checked for
+        duplicate spam (see duplicates.py).
+
+    """
+    __slots__ = (
+        # Approved Application of the member
+        'application',
+
+        # Number of messages still to check
+        'messages',
+
+        # Time the probation ends
+        'until',
+    )
+
+    def __init__(self, application, messages, until):
+        self.application = application
+        self.messages = messages
+        self.until = until
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}('
+            f'member_id={self.application.member_id!r}, '
+            f'chat_id={self.application.chat_id!r}, '
+            f'messages={self.messages!r}, '
+            f'until={self.until!r})')
@@ -0,0 +1,573 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Spammer Blocklist
+
+    The blocklist is stored in a compact binary format: a sorted array
+    of 64-bit user IDs, a journal file with recent additions and a file
+    with the Bloom filter bits, so that the filter does not have to be
+    rebuilt on startup.
+
+    Lists of user IDs can be imported using:
+
+    > python3 -m telegram_antispam_bot.blocklist import <file> ...
+
+    The files may be plain text files with one user ID per line or CSV
+    files with the user ID in the first column.
+
+    Several processes can share the same blocklist files: additions
+    are appended to the journal, compactions are serialized using a
+    lock file and .refresh() picks up the changes made by other
+    processes. Programs using the blocklist in an event loop can run
+    .read() in a thread and pass its result to .apply() in the loop.
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import os
+import sys
+import re
+import math
+import array
+import bisect
+import struct
+import contextlib
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; file locking is then disabled
+    fcntl = None
+
+### Globals
+
+# Array type code for user IDs (signed 64-bit)
+ID_TYPECODE = 'q'
+
+# Bloom filter file header: magic, number of IDs, number of bits,
+# number of hash functions
+BLOOM_HEADER = struct.Struct('<8sQQQ')
+BLOOM_MAGIC = b'TGBLOOM1'
+
+# Multiplier used for hashing IDs (64-bit golden ratio)
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+HASH_MASK = 0xFFFFFFFFFFFFFFFF
+
+# Regular expression for finding the user ID in a line of an import file
+IMPORT_ID_RE = re.compile(r'^\s*"?(\d+)"?\s*(?:[,;\t]|$)')
+
+### Bloom filter
+
+class BloomFilter:
+
+    """ Bloom filter for integer IDs.
+
+        The filter may return false positives, with a probability of
+        about .error_rate for up to .capacity entries, but never false
+        negatives.
+
+    """
+    # Max. number of entries the filter was sized for
+    capacity = 0
+
+    # False positive rate the filter was sized for
+    error_rate = 0.001
+
+    # Number of bits and hash functions
+    size = 0
+    hashes = 0
+
+    # Filter bits
+    bits = None
+
+    def __init__(self, capacity, error_rate=None, size=None, hashes=None,
+                 bits=None):
+        if error_rate is not None:
+            self.error_rate = error_rate
+        capacity = max(capacity, 1000)
+        self.capacity = capacity
+        if size is None:
+            size = int(
+                -capacity * math.log(self.error_rate) / (math.log(2) ** 2))
+            size = (size + 7) // 8 * 8
+        if hashes is None:
+            hashes = max(int(round(size / capacity * math.log(2))), 1)
+        self.size = size
+        self.hashes = hashes
+        if bits is None:
+            bits = bytearray(size // 8)
+        self.bits = bits
+
+    def positions(self, id):
+
+        """ Return the bit positions for id.
+        """
+        h = (id * HASH_MULTIPLIER) & HASH_MASK
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, id):
+        bits = self.bits
+        for position in self.positions(id):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, id):
+        bits = self.bits
+        for position in self.positions(id):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+### Blocklist
+
+class Blocklist:
+
+    """ Blocklist of known spammer user IDs.
+
+        Lookups are first checked against an in-memory Bloom filter and
+        only confirmed against the exact list of IDs, if the filter
+        reports a possible match.
+
+        The IDs are stored in the file .filename as sorted array of
+        64-bit ints. New IDs are appended to a journal file
+        (.filename + '.journal'), which gets merged into the main file
+        by .compact(). The Bloom filter is stored in .filename + '.bloom'.
+
+    """
+    # Filename of the sorted ID file
+    filename = ''
+
+    # Stat info (mtime, size) of .filename at the last .load(), for
+    # detecting compactions by other processes
+    file_stamp = None
+
+    # Number of bytes of the journal file read so far
+    journal_offset = 0
+
+    # Sorted array of IDs
+    ids = None
+
+    # Set of IDs added since the last compaction
+    recent = None
+
+    # BloomFilter covering .ids and .recent
+    bloom = None
+
+    # List of IDs added, but not yet written to the journal
+    pending = None
+
+    # Is a compaction in progress ? Set by the code running
+    # .compact_files() in a separate thread.
+    compacting = False
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.journal_filename = filename + '.journal'
+        self.bloom_filename = filename + '.bloom'
+        self.lock_filename = filename + '.lock'
+        self.ids = array.array(ID_TYPECODE)
+        self.recent = set()
+        self.pending = []
+
+    def __len__(self):
+        return len(self.ids) + len(self.recent)
+
+    def __contains__(self, id):
+        if id not in self.bloom:
+            return False
+        if id in self.recent:
+            return True
+        ids = self.ids
+        i = bisect.bisect_left(ids, id)
+        return i < len(ids) and ids[i] == id
+
+    @contextlib.contextmanager
+    def file_lock(self, exclusive=False, blocking=True):
+
+        """ Context manager holding the lock file, shared for reading
+            or exclusive for compacting.
+
+            If blocking is false, a BlockingIOError is raised instead of
+            waiting for the lock.
+
+        """
+        if fcntl is None:
+            yield
+            return
+        operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        if not blocking:
+            operation |= fcntl.LOCK_NB
+        with open(self.lock_filename, 'ab') as f:
+            fcntl.flock(f, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get_file_stamp(self):
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self):
+
+        """ Load the blocklist from disk.
+
+            The Bloom filter is rebuilt, if needed. Journal entries are
+            added on top.
+
+        """
+        self.apply(self.read(full=True))
+
+    def refresh(self):
+
+        """ Pick up the changes made by other processes.
+
+            This reloads the blocklist, if another process compacted
+            it, and reads the new journal entries otherwise.
+
+        """
+        self.apply(self.read())
+
+    def read(self, full=False):
+
+        """ Read the changes made to the files since the last .apply()
+            and return them as state tuple to pass to .apply().
+
+            The main ID file is only read, if full is true or another
+            process compacted the blocklist. Otherwise, only the journal
+            entries added since the last .apply() are read.
+
+            This method only does the file I/O and does not change the
+            blocklist, so it can be run in a separate thread (e.g. using
+            asyncio.to_thread()), while the blocklist is in use.
+
+        """
+        base = (self.file_stamp, self.journal_offset)
+        file_stamp, journal_offset = base
+        ids = bloom = None
+        with self.file_lock():
+            if full or self.get_file_stamp() != file_stamp:
+                file_stamp = self.get_file_stamp()
+                ids = read_ids(self.filename)
+                bloom = self.load_bloom(len(ids))
+                journal_offset = 0
+            journal_ids, journal_offset = read_journal(
+                self.journal_filename, journal_offset)
+        if ids is not None and bloom is None:
+            bloom = build_bloom(ids)
+            with self.file_lock(exclusive=True):
+                # Only save the filter, if the IDs are still current
+                if self.get_file_stamp() == file_stamp:
+                    self.save_bloom(bloom, len(ids))
+        return (base, file_stamp, ids, bloom, journal_ids, journal_offset)
+
+    def apply(self, state):
+
+        """ Apply the state tuple returned by .read() or
+            .compact_files() to the blocklist.
+
+            This has to be called from the thread using the blocklist.
+            IDs added by .add() while the state was being read are kept.
+
+            A state which only holds new journal entries is ignored, if
+            another state was applied after it was read. The entries
+            will then be picked up by the next .read().
+
+            .pending IDs are written to the journal, if possible.
+
+        """
+        self.write_pending()
+        base, file_stamp, ids, bloom, journal_ids, journal_offset = state
+        if ids is not None:
+            recent = self.recent
+            self.file_stamp, self.ids, self.bloom = file_stamp, ids, bloom
+            self.recent = set()
+            journal_ids.extend(recent)
+        elif base != (self.file_stamp, self.journal_offset):
+            return
+        self.journal_offset = journal_offset
+        for id in journal_ids:
+            self.add_entry(id)
+
+    def add_entry(self, id):
+
+        """ Add id to the in-memory blocklist, without writing it to the
+            journal.
+        """
+        if id not in self:
+            self.recent.add(id)
+            self.bloom.add(id)
+
+    def add(self, id):
+
+        """ Add id to the blocklist.
+
+            The id is appended to the journal file right away, unless a
+            compaction is in progress (see .write_pending()).
+
+            Callers should check .needs_compaction() afterwards.
+
+        """
+        if id in self:
+            return
+        self.add_entry(id)
+        self.pending.append(id)
+        self.write_pending()
+
+    def write_pending(self):
+
+        """ Append the .pending IDs to the journal file.
+
+            The shared lock is held while writing, so that the entries
+            cannot get lost in a compaction. If the lock is not
+            available, since a compaction is running, the IDs are kept
+            for the next call, so that callers don't have to wait for
+            the compaction.
+
+        """
+        if not self.pending:
+            return
+        try:
+            with self.file_lock(blocking=False):
+                with open(self.journal_filename, 'ab') as f:
+                    array.array(ID_TYPECODE, self.pending).tofile(f)
+        except BlockingIOError:
+            return
+        self.pending = []
+
+    def needs_compaction(self):
+
+        """ Return True, if the Bloom filter is getting too full and the
+            blocklist should be compacted.
+        """
+        return len(self) > self.bloom.capacity
+
+    def update(self, ids):
+
+        """ Add all IDs from the iterable ids and write the result to disk.
+
+            This is used for bulk imports.
+
+        """
+        self.recent.update(ids)
+        self.compact()
+
+    def compact(self):
+
+        """ Merge the journal into the main file and rebuild the Bloom
+            filter.
+        """
+        self.apply(self.compact_files(set(self.recent)))
+
+    def compact_files(self, recent):
+
+        """ Merge the journal and the IDs in recent into the main file,
+            rebuild the Bloom filter and return the new state to pass to
+            .apply().
+
+            The journal is moved aside first, so that IDs added by other
+            processes in the meantime go to a new journal.
+
+            Like .read(), this does not change the blocklist, so it can
+            be run in a separate thread. recent has to be a copy of
+            .recent made in the thread using the blocklist.
+
+        """
+        base = (self.file_stamp, self.journal_offset)
+        with self.file_lock(exclusive=True):
+            if self.get_file_stamp() != self.file_stamp:
+                # Compacted by another process: start from its result
+                ids = read_ids(self.filename)
+                ids.extend(self.ids)
+            else:
+                ids = array.array(ID_TYPECODE, self.ids)
+            compacting_filename = self.journal_filename + '.compacting'
+            try:
+                os.replace(self.journal_filename, compacting_filename)
+            except FileNotFoundError:
+                compacting_filename = None
+            else:
+                ids.extend(read_ids(compacting_filename))
+            ids.extend(recent)
+            ids = sorted_unique(ids)
+            self.save(ids)
+            file_stamp = self.get_file_stamp()
+            bloom = build_bloom(ids)
+            self.save_bloom(bloom, len(ids))
+            if compacting_filename is not None:
+                os.remove(compacting_filename)
+        return (base, file_stamp, ids, bloom, array.array(ID_TYPECODE), 0)
+
+    def save(self, ids):
+
+        """ Write the sorted array of IDs ids to .filename.
+
+            The file is replaced atomically.
+
+        """
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'wb') as f:
+            ids.tofile(f)
+        os.replace(temp_filename, self.filename)
+
+    def load_bloom(self, count):
+
+        """ Load the Bloom filter for the count IDs of the main file from
+            disk.
+
+            Returns None, if the file does not exist or does not match
+            the IDs.
+
+        """
+        try:
+            with open(self.bloom_filename, 'rb') as f:
+                header = f.read(BLOOM_HEADER.size)
+                if len(header) != BLOOM_HEADER.size:
+                    return None
+                magic, ids_count, size, hashes = BLOOM_HEADER.unpack(
+                    header)
+                if magic != BLOOM_MAGIC or count != ids_count:
+                    return None
+                bits = bytearray(f.read())
+        except FileNotFoundError:
+            return None
+        if len(bits) * 8 != size:
+            return None
+        return BloomFilter(2 * count, size=size, hashes=hashes, bits=bits)
+
+    def save_bloom(self, bloom, count):
+
+        """ Write the Bloom filter bloom for the count IDs of the main
+            file to disk.
+
+            This must only be called right after building the filter
+            for these IDs, since the file is only valid for them.
+
+        """
+        temp_filename = self.bloom_filename + '.tmp'
+        with open(temp_filename, 'wb') as f:
+            f.write(BLOOM_HEADER.pack(
+                BLOOM_MAGIC, count, bloom.size, bloom.hashes))
+            f.write(bloom.bits)
+        os.replace(temp_filename, self.bloom_filename)
+
+### Helpers
+
+def build_bloom(ids):
+
+    """ Return a new BloomFilter for the IDs in ids.
+    """
+    bloom = BloomFilter(2 * len(ids))
+    add = bloom.add
+    for id in ids:
+        add(id)
+    return bloom
+
+def read_ids(filename):
+
+    """ Read an array of IDs from the binary file filename.
+
+        Returns an empty array, if the file does not exist. Incomplete
+        trailing records (e.g. from a crash while writing) are ignored.
+
+    """
+    ids = array.array(ID_TYPECODE)
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return ids
+    data = data[:len(data) - len(data) % ids.itemsize]
+    ids.frombytes(data)
+    return ids
+
+def read_journal(filename, offset=0):
+
+    """ Read the IDs appended to the journal file filename after offset.
+
+        Returns (ids, new offset). If the journal is shorter than offset,
+        it was replaced by a compaction and is read from the start.
+
+    """
+    ids = array.array(ID_TYPECODE)
+    try:
+        with open(filename, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size < offset:
+                offset = 0
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return ids, 0
+    data = data[:len(data) - len(data) % ids.itemsize]
+    ids.frombytes(data)
+    return ids, offset + len(data)
+
+def sorted_unique(ids):
+
+    """ Return a sorted array of the unique IDs in ids.
+    """
+    return array.array(ID_TYPECODE, sorted(set(ids)))
+
+def parse_id_file(filename):
+
+    """ Iterate over the user IDs found in the text or CSV file filename.
+
+        Lines which don't start with an ID (e.g. headers or comments)
+        are skipped.
+
+    """
+    with open(filename, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = IMPORT_ID_RE.match(line)
+            if match is not None:
+                yield int(match.group(1))
+
+### Command line interface
+
+def main(args):
+
+    """ Blocklist management.
+
+        Usage: python3 -m telegram_antispam_bot.blocklist <command> ...
+
+        Commands:
+          import <file> ...   import user IDs from text or CSV files
+          check <id> ...      check whether user IDs are blocklisted
+          count               print the number of blocklisted IDs
+
+        The blocklist file is taken from the BLOCKLIST_FILE config
+        setting.
+
+    """
+    from telegram_antispam_bot.config import BLOCKLIST_FILE
+    if not args or not BLOCKLIST_FILE:
+        print(main.__doc__)
+        if not BLOCKLIST_FILE:
+            print('Please set BLOCKLIST_FILE first.')
+        return 1
+    blocklist = Blocklist(BLOCKLIST_FILE)
+    blocklist.load()
+    command = args[0]
+    if command == 'import':
+        count = len(blocklist)
+        for filename in args[1:]:
+            blocklist.update(parse_id_file(filename))
+        print(f'Imported {len(blocklist) - count} new IDs; '
+              f'the blocklist now has {len(blocklist)} entries.')
+    elif command == 'check':
+        for id in args[1:]:
+            print(f'{id}: {"blocked" if int(id) in blocklist else "not blocked"}')
+    elif command == 'count':
+        print(len(blocklist))
+    else:
+        print(main.__doc__)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
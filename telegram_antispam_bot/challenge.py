@@ -9,6 +9,7 @@
 import random
 import re
 
+from telegram_antispam_bot.outgoing import Priority
 from telegram_antispam_bot.config import (
         CHALLENGE_CHARS,
         CHALLENGE_LENGTH,
@@ -20,6 +21,32 @@ from telegram_antispam_bot.config import (
 # Debug level
 _debug = DEBUG
 
+# Answer regular expressions which only match a literal string, with
+# optional case-insensitive matching, e.g. '(?i)^ABC$' or '^123$'
+LITERAL_ANSWER = re.compile(r'^(\(\?i\))?\^([^\\.^$*+?{}\[\]|()]*)\$$')
+
+### Helpers
+
+def compile_answer(answer):
+
+    """ Return a matcher function for the answer regular expression.
+
+        The matcher takes the (stripped) answer text and returns True, if
+        it matches. Answers which only match a literal string are
+        checked using a plain string comparison, all others using the
+        compiled regular expression.
+
+    """
+    m = LITERAL_ANSWER.match(answer)
+    if m is None:
+        pattern = re.compile(answer)
+        return lambda value: pattern.match(value) is not None
+    ignore_case, literal = m.groups()
+    if ignore_case:
+        key = literal.casefold()
+        return lambda value: value.casefold() == key
+    return lambda value: value == literal
+
 ### Challenge class
 
 class Challenge:
@@ -45,21 +72,29 @@ class Challenge:
     # Expected answer as regular expression
     answer = ''
 
-    def __init__(self, client, message):
+    # Matcher function for the .answer, see compile_answer()
+    matcher = None
+
+    # Can the challenges be generated ahead of time, i.e. without
+    # knowing the application ? Classes which use the application in
+    # .create_challenge() have to set this to False.
+    poolable = True
+
+    def __init__(self, client, application):
 
         """ Create a challenge instance.
 
             client has to point to the AntispamBot instance.
-            message needs to point to the member's signup message and
-            can be used for creating the challenge.
+            application needs to point to the member's Application
+            record and can be used for creating the challenge.
 
-            Note: message should not be stored in the instance to avoid
-            creating circular references.
+            Note: application should not be stored in the instance to
+            avoid creating circular references.
 
         """
         self.client = client
 
-    def create_challenge(self, message):
+    def create_challenge(self, application):
 
         """ Create a challenge text to send to the user and the expected answer.
 
@@ -75,26 +110,84 @@ class Challenge:
             f'(?i)^{answer}$' # case is not important for the answer
         )
 
-    async def send(self, message):
+    def generate(self, application):
+
+        """ Create a new challenge and return it as (challenge text,
+            answer, matcher) tuple.
+
+            application is None, when generating challenges ahead of
+            time for the client's ChallengePool.
+
+        """
+        challenge, answer = self.create_challenge(application)
+        return challenge, answer, compile_answer(answer)
+
+    def prepare(self, application):
+
+        """ Create the challenge for the application and return the
+            challenge text to send to the user.
+
+            The challenge is taken from the client's ChallengePool, if
+            available. The expected answer is stored in .answer.
+
+            This is used by .send(), but can also be used to combine
+            multiple challenges into one message.
+
+        """
+        entry = None
+        pool = getattr(self.client, 'challenge_pool', None)
+        if pool is not None:
+            entry = pool.pop(self.__class__)
+        if entry is None:
+            entry = self.generate(application)
+        challenge, self.answer, self.matcher = entry
+        return challenge
+
+    async def send(self, application):
 
         """ Send a message to the new user, asking to answer a
             challenge.
 
-            message needs to point to the member's signup message.
-            client has to point to the AntispamBot instance.
+            application needs to point to the member's Application
+            record.
 
         """
-        # Create challenge text and answer
-        challenge, self.answer = self.create_challenge(message)
-        # Send challenge string
-        message.conversation.append(
-            await self.client.send_message(
-                message.chat.id,
-                f'Welcome to the chat, {message.new_member.first_name} ! '
+        challenge = self.prepare(application)
+        chat_id = application.conversation_chat_id
+        if application.join_request:
+            # Send challenge string to the private chat
+            text = (
+                f'Welcome, {application.member_first_name} ! '
+                f'To join the group "{application.chat_title}", '
+                f'please enter {challenge} into this chat '
+                f'(within the next few seconds).')
+            reply_to_message_id = None
+        else:
+            # Send challenge string as reply to the new chat members
+            # message
+            text = (
+                f'Welcome to the chat, {application.member_first_name} ! '
                 f'Please enter {challenge} into this chat '
                 f'to get approved as a member '
-                f'(within the next few seconds).',
-                reply_to_message_id=message.id))
+                f'(within the next few seconds).')
+            reply_to_message_id = application.message_id
+        application.add_message(
+            await self.client.api_request(
+                Priority.CHALLENGE,
+                chat_id,
+                self.client.send_message,
+                chat_id,
+                text,
+                reply_to_message_id=reply_to_message_id))
+
+    def restore(self, answer):
+
+        """ Restore the challenge state from a stored answer, e.g. after
+            a restart of the bot.
+
+        """
+        self.answer = answer
+        self.matcher = compile_answer(answer)
 
     def check(self, answer):
 
@@ -109,15 +202,13 @@ class Challenge:
         # Check against snippet
         if _debug:
             self.client.log(f'Checking entered value {value!r} against {self.answer}')
-        if re.match(self.answer, value) is not None:
-            return True
-        return False
+        return self.matcher(value)
 
 class UppercaseChallenge(Challenge):
 
     """ Enter all uppercase chars as challenge.
     """
-    def create_challenge(self, message):
+    def create_challenge(self, application):
 
         lower = random.choices(
             self.challenge_chars.lower(),
@@ -137,7 +228,7 @@ class ReverseStringChallenge(Challenge):
 
     """ Reverse a string as challenge.
     """
-    def create_challenge(self, message):
+    def create_challenge(self, application):
 
         challenge = random.choices(
             self.challenge_chars.upper(),
@@ -152,7 +243,7 @@ class MathAddChallenge(Challenge):
 
     """ Solve a math addition as challenge.
     """
-    def create_challenge(self, message):
+    def create_challenge(self, application):
 
         a = random.randint(1, 100)
         b = random.randint(1, 100)
@@ -166,7 +257,7 @@ class MathMultiplyChallenge(Challenge):
 
     """ Solve a math multiplication as challenge.
     """
-    def create_challenge(self, message):
+    def create_challenge(self, application):
 
         a = random.randint(1, 100)
         b = random.randint(1, 100)
@@ -180,7 +271,7 @@ class ListItemChallenge(Challenge):
 
     """ Figure out Python list indexing as challenge.
     """
-    def create_challenge(self, message):
+    def create_challenge(self, application):
 
         l = random.sample(range(10), k=6)
         i = random.randint(0, 5)
@@ -193,7 +284,7 @@ class DictItemChallenge(Challenge):
 
     """ Figure out Python dict indexing as challenge.
     """
-    def create_challenge(self, message):
+    def create_challenge(self, application):
 
         d = {}
         for i in range(4):
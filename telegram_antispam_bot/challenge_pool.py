@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Challenge Pool
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import collections
+
+### Challenge pool
+
+class ChallengePool:
+
+    """ Pool of challenges generated ahead of time.
+
+        The pool keeps up to .size challenges per Challenge class, as
+        (challenge text, answer, matcher) tuples returned by
+        Challenge.generate(), so that sending a challenge only has to
+        take one from the pool.
+
+        Once a pool runs below half its size, it is refilled by a
+        deferred action run by the scheduler. Classes which are not
+        .poolable are not pooled. Classes which were not passed to the
+        constructor or .add() are added when they are first used.
+
+    """
+    # Number of challenges to keep per Challenge class. 0 disables the
+    # pool.
+    size = 100
+
+    # Dict mapping Challenge classes to deques of prepared challenges
+    entries = None
+
+    # Dict mapping Challenge classes to the instances used for
+    # generating the challenges
+    generators = None
+
+    # Set of Challenge classes with a scheduled refill
+    refills = None
+
+    # Client passed to the generating Challenge instances
+    client = None
+
+    def __init__(self, client, classes, scheduler, size=None):
+        self.scheduler = scheduler
+        if size is not None:
+            self.size = size
+        self.entries = {}
+        self.generators = {}
+        self.refills = set()
+        self.client = client
+        for cls in classes:
+            self.add(cls)
+
+    def add(self, cls):
+
+        """ Add the Challenge class cls to the pool, without filling it.
+
+            Returns True, if cls is pooled.
+
+        """
+        if cls in self.entries:
+            return True
+        if not self.size or not cls.poolable:
+            return False
+        self.entries[cls] = collections.deque()
+        self.generators[cls] = cls(self.client, None)
+        return True
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries.values())
+
+    def fill(self):
+
+        """ Fill the pools of all classes.
+        """
+        for cls in self.entries:
+            self.refill(cls)
+
+    def refill(self, cls):
+
+        """ Fill the pool of cls up to .size challenges.
+        """
+        entries = self.entries[cls]
+        generate = self.generators[cls].generate
+        for i in range(self.size - len(entries)):
+            entries.append(generate(None))
+
+    async def run_refill(self, cls):
+        self.refills.discard(cls)
+        self.refill(cls)
+
+    def pop(self, cls):
+
+        """ Return a prepared challenge for cls as (challenge text,
+            answer, matcher) tuple or None, if cls is not pooled or the
+            pool is empty.
+        """
+        entries = self.entries.get(cls)
+        if entries is None:
+            if not self.add(cls):
+                return None
+            entries = self.entries[cls]
+        if len(entries) <= self.size // 2 and cls not in self.refills:
+            self.refills.add(cls)
+            self.scheduler.schedule(0, self.run_refill, cls)
+        if not entries:
+            return None
+        return entries.popleft()
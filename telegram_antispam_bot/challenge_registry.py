@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Challenge Registry
+
+    Challenge classes are referenced by name in the CHALLENGES and
+    GROUP_CHALLENGES settings. Names are looked up in this order:
+
+    - classes registered with ChallengeRegistry.register()
+    - the built-in challenges in challenge.py, e.g. "MathAddChallenge"
+    - entry points of the "telegram_antispam_bot.challenges" group
+      provided by installed packages, e.g. in pyproject.toml:
+
+        [project.entry-points."telegram_antispam_bot.challenges"]
+        ImageChallenge = "mypackage.challenges:ImageChallenge"
+
+    - dotted paths, e.g. "mypackage.challenges:ImageChallenge" or
+      "mypackage.challenges.ImageChallenge"
+
+    Classes are only imported when they are first used, so challenges
+    which are not enabled cost nothing.
+
+    Names can be given a weight for the random selection by appending
+    "*<weight>", e.g. "MathAddChallenge*3" is picked three times as often
+    as a challenge with the default weight of 1.
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import importlib
+import importlib.metadata
+import logging
+import random
+
+from telegram_antispam_bot import challenge
+
+### Globals
+
+# Log object
+LOG = logging.getLogger('antispambot')
+
+# Entry point group for challenge classes provided by other packages
+ENTRY_POINT_GROUP = 'telegram_antispam_bot.challenges'
+
+### Helpers
+
+def parse_spec(spec):
+
+    """ Parse the challenge spec "<name>[*<weight>]" and return
+        (name, weight).
+
+        Raises a ValueError for invalid weights.
+
+    """
+    name, sep, weight = spec.strip().rpartition('*')
+    if not sep:
+        return weight, 1.0
+    weight = float(weight)
+    if weight <= 0:
+        raise ValueError(f'challenge weight has to be positive: {spec!r}')
+    return name.strip(), weight
+
+def challenge_name(cls):
+
+    """ Return the name to use for referencing the Challenge class cls,
+        e.g. when storing applications.
+
+        Built-in challenges are referenced by their class name, all
+        others by their dotted path.
+
+    """
+    if cls.__module__ == challenge.__name__:
+        return cls.__name__
+    return f'{cls.__module__}:{cls.__qualname__}'
+
+def import_object(path):
+
+    """ Import and return the object referenced by the dotted path
+        "module:name" or "module.name".
+    """
+    if ':' in path:
+        module_name, name = path.split(':', 1)
+    else:
+        module_name, _, name = path.rpartition('.')
+    obj = importlib.import_module(module_name)
+    for attribute in name.split('.'):
+        obj = getattr(obj, attribute)
+    return obj
+
+### Registry
+
+class ChallengeRegistry:
+
+    """ Registry of the available Challenge classes.
+    """
+    # Dict mapping names to the loaded Challenge classes
+    classes = None
+
+    # Dict mapping names to the entry points of ENTRY_POINT_GROUP.
+    # Loaded on first use.
+    entry_points = None
+
+    def __init__(self):
+        self.classes = {}
+
+    def register(self, name, cls):
+
+        """ Register the Challenge class cls under name.
+        """
+        if not (isinstance(cls, type) and
+                issubclass(cls, challenge.Challenge)):
+            raise TypeError(f'{cls!r} is not a Challenge class')
+        self.classes[name] = cls
+
+    def find_entry_point(self, name):
+
+        """ Return the entry point for name or None, if not available.
+        """
+        if self.entry_points is None:
+            self.entry_points = {
+                entry_point.name: entry_point
+                for entry_point in importlib.metadata.entry_points(
+                    group=ENTRY_POINT_GROUP)}
+        return self.entry_points.get(name)
+
+    def load(self, name):
+
+        """ Return the Challenge class for name, importing it, if needed.
+
+            Raises a LookupError, if the class cannot be found, and a
+            TypeError, if name does not refer to a Challenge class.
+            Errors raised while importing are passed through.
+
+        """
+        cls = self.classes.get(name)
+        if cls is not None:
+            return cls
+        cls = getattr(challenge, name, None)
+        if cls is None:
+            entry_point = self.find_entry_point(name)
+            if entry_point is not None:
+                cls = entry_point.load()
+            elif '.' in name or ':' in name:
+                try:
+                    cls = import_object(name)
+                except (ImportError, AttributeError) as error:
+                    raise LookupError(
+                        f'could not import challenge {name!r}: '
+                        f'{error}') from error
+            else:
+                raise LookupError(f'unknown challenge {name!r}')
+        self.register(name, cls)
+        return cls
+
+    def challenge_set(self, specs):
+
+        """ Return a ChallengeSet for specs, an iterable of challenge
+            specs or a comma separated string of these.
+        """
+        if isinstance(specs, str):
+            specs = specs.split(',')
+        return ChallengeSet(
+            self,
+            [parse_spec(spec) for spec in sorted(specs) if spec.strip()])
+
+class ChallengeSet:
+
+    """ Weighted set of Challenge classes to choose from.
+
+        The classes are loaded from the registry on first use. Names
+        which cannot be loaded are logged and skipped. If none of the
+        classes can be loaded, the base Challenge class is used.
+
+    """
+    # ChallengeRegistry to load the classes from
+    registry = None
+
+    # List of (name, weight) tuples
+    specs = None
+
+    # List of loaded classes and their cumulative weights. Set in
+    # .load()
+    classes = None
+    cum_weights = None
+
+    def __init__(self, registry, specs):
+        self.registry = registry
+        self.specs = specs
+
+    def load(self):
+
+        """ Load the classes, if not already done, and return them as
+            list.
+        """
+        if self.classes is not None:
+            return self.classes
+        classes = []
+        cum_weights = []
+        total = 0.0
+        for name, weight in self.specs:
+            try:
+                cls = self.registry.load(name)
+            except Exception as error:
+                LOG.error('Could not load challenge %r: %s', name, error)
+                continue
+            classes.append(cls)
+            total += weight
+            cum_weights.append(total)
+        if not classes:
+            LOG.error('No usable challenges in %r, using the default '
+                      'challenge', [name for name, weight in self.specs])
+            classes = [challenge.Challenge]
+            cum_weights = [1.0]
+        self.classes = classes
+        self.cum_weights = cum_weights
+        return classes
+
+    def choose(self):
+
+        """ Return a randomly chosen class, using the weights.
+        """
+        if self.classes is None:
+            self.load()
+        return random.choices(self.classes, cum_weights=self.cum_weights)[0]
+
+# Default registry, which can be used for registering custom challenges
+REGISTRY = ChallengeRegistry()
@@ -30,10 +30,15 @@ MANAGEMENT_GROUP_ID = 0
 # empty, the bot will work on any group it was added to.
 MODERATION_GROUP_IDS = _tools.IntFrozenSet()
 
-# Idle loop interval in seconds. Idle processing will happen at these
-# intervals.
+# Idle loop interval in seconds. Idle processing will happen at least at
+# these intervals. Reminders and timeouts are processed when they are due.
 IDLE_INTERVAL = 10
 
+# Number of pyrogram worker tasks processing incoming updates in
+# parallel. Updates of the same member are always processed in order.
+# 0 uses the pyrogram default.
+WORKERS = 0
+
 # Response timeout in seconds. The timer starts when the user enters the
 # chat and resets whenever the user enters something.
 RESPONSE_TIMEOUT = 120
@@ -48,6 +53,17 @@ BAN_TIME = 3600 # one hour
 # Time to show the rejection notice in seconds
 REJECT_NOTICE_TIME = 10
 
+# Max. number of pending applications per group. Members joining a group
+# with this many pending applications are removed right away, without a
+# challenge, but not banned. 0 disables the limit.
+MAX_PENDING_PER_CHAT = 1000
+
+# The sweeper checks up to SWEEP_BATCH_SIZE pending applications every
+# SWEEP_INTERVAL seconds and reclaims the ones which are no longer being
+# tracked, e.g. after errors. Set SWEEP_INTERVAL to 0 to disable this.
+SWEEP_INTERVAL = 60
+SWEEP_BATCH_SIZE = 1000
+
 # Time to show the approval notice in seconds. Set to 0 to not remove
 # the approval message
 APPROVAL_NOTICE_TIME = 0
@@ -58,16 +74,182 @@ APPROVAL_NOTICE_TIME = 0
 # for ths group.
 MUTE_BOT_MESSAGES = True
 
+# Moderate join requests instead of new members ? In this mode, the
+# groups have to be set up to require admin approval for new members and
+# the bot needs the permission to add members. The challenge is then sent
+# to the applicant in a private chat and the join request approved or
+# declined, without any messages in the group.
+JOIN_REQUESTS = False
+
 # Max. number of emojis allowed in user name; more will result in an
 # immediate ban
 MAX_EMOJIS_IN_USER_NAME = 2
 
+# Name blocklist: members whose first/last name or username contains
+# one of these substrings are banned right away, without sending a
+# challenge. Entries starting with "re:" are regular expressions. Names
+# are normalized before checking them, i.e. lookalike characters, styled
+# letters, accents and invisible characters don't get around the checks.
+NAME_BLOCKLIST = _tools.StrFrozenSet()
+
+# File with additional name blocklist entries, one per line (see
+# names.py for the format). Leave empty to not use such a file.
+NAME_BLOCKLIST_FILE = ''
+
+# Number of names to cache the name screening results for
+NAME_SCREENING_CACHE_SIZE = 10000
+
+# Persist pending applications in a SQLite database next to the session
+# database ? This allows the bot to resume the challenges after a restart.
+PERSIST_APPLICATIONS = False
+
+# Delay in seconds for batching writes to the applications database
+APPLICATION_STORE_FLUSH_DELAY = 1.0
+
+# Rate limits for outgoing Telegram API requests: requests per second and
+# max. burst size for all requests and per chat. Set the rates to 0 to
+# disable the limits.
+OUTGOING_RATE = 25.0
+OUTGOING_BURST = 30
+OUTGOING_CHAT_RATE = 0.5
+OUTGOING_CHAT_BURST = 20
+
+# Max. number of concurrently running outgoing API requests
+OUTGOING_CONCURRENCY = 8
+
+# Max. number of retries of outgoing API requests after FloodWait errors
+OUTGOING_MAX_RETRIES = 5
+
+# Admin log messages to the management group are collected and sent as
+# one digest message after ADMIN_LOG_INTERVAL seconds or when
+# ADMIN_LOG_MAX_EVENTS messages have been collected, whichever comes
+# first. Set ADMIN_LOG_INTERVAL to 0 to send each message right away.
+ADMIN_LOG_INTERVAL = 10
+ADMIN_LOG_MAX_EVENTS = 20
+
+# Raid mode: if RAID_THRESHOLD or more members join a group within
+# RAID_WINDOW seconds, the bot switches to raid mode for the group. In raid
+# mode, the challenges for the members joining within RAID_BATCH_DELAY
+# seconds are sent as one combined message (with up to RAID_BATCH_SIZE
+# members per message). Set RAID_THRESHOLD to 0 to disable raid mode.
+RAID_THRESHOLD = 10
+RAID_WINDOW = 60
+RAID_BATCH_DELAY = 3.0
+RAID_BATCH_SIZE = 20
+
+# Time window in seconds for collecting messages to delete per group.
+# The collected messages are deleted with as few API calls as possible.
+DELETION_WINDOW = 1.0
+
+# Blocklist file with the user IDs of known spammers. Members on the
+# blocklist are banned right away when joining, without sending a
+# challenge. Leave empty to disable the blocklist. ID lists can be
+# imported using "python3 -m telegram_antispam_bot.blocklist import".
+BLOCKLIST_FILE = ''
+
+# Add members banned by the bot to the blocklist ?
+BLOCKLIST_REJECTED = True
+
+# Probation of new members: the first PROBATION_MESSAGES messages
+# approved members send within PROBATION_TIME seconds are checked for
+# duplicate spam, i.e. near-duplicates of messages other new members
+# (or the same member in another group) posted within the last
+# DUPLICATE_WINDOW seconds, or of messages found to be spam within the
+# last SPAM_FINGERPRINT_TTL seconds. The messages are deleted and
+# their senders banned. Set PROBATION_MESSAGES to 0 to disable this.
+PROBATION_MESSAGES = 3
+PROBATION_TIME = 24 * 3600 # one day
+
+# Messages shorter than DUPLICATE_MIN_LENGTH characters are not checked.
+# Messages with an estimated similarity (the share of shingles they
+# have in common, between 0 and 1) of at least DUPLICATE_SIMILARITY
+# count as duplicates. The indexes of recent messages and of spam
+# messages hold up to DUPLICATE_INDEX_SIZE entries each (about 750 bytes
+# per entry).
+DUPLICATE_MIN_LENGTH = 40
+DUPLICATE_SIMILARITY = 0.6
+DUPLICATE_WINDOW = 6 * 3600 # six hours
+DUPLICATE_INDEX_SIZE = 10000
+SPAM_FINGERPRINT_TTL = 7 * 24 * 3600 # one week
+
+# Members who passed a challenge in one of the groups are remembered for
+# VERIFIED_CACHE_TTL seconds and are not challenged again when joining
+# (another) group during that time. The cache holds up to
+# VERIFIED_CACHE_SIZE members. Set VERIFIED_CACHE_SIZE to 0 to disable
+# the cache.
+VERIFIED_CACHE_SIZE = 100000
+VERIFIED_CACHE_TTL = 30 * 24 * 3600 # 30 days
+
+# Persist the verified members cache in a SQLite database next to the
+# session database ?
+PERSIST_VERIFIED_USERS = False
+
+# Database file for persisting the verified members cache. Leave empty to
+# use a file named after the session. Several bot processes can share
+# the same file (see SHARED_STATE_REFRESH).
+VERIFIED_USERS_FILE = ''
+
+# Interval in seconds for picking up the changes other bot processes
+# made to the shared blocklist and verified members database. Set to 0
+# to disable. The supervisor (SHARDS) enables this for its workers.
+SHARED_STATE_REFRESH = 0
+
+# Record all incoming updates to this JSONL file, for replaying them with
+# benchmarks/replay.py. Leave empty to disable recording.
+RECORD_UPDATES_FILE = ''
+
+# Replace user IDs, names and texts with salted hashes in the recording ?
+# RECORD_HASH_SALT can be set to a secret string to use as salt. If left
+# empty, a random salt is generated and kept in RECORD_UPDATES_FILE +
+# '.salt'.
+RECORD_HASH_PII = True
+RECORD_HASH_SALT = ''
+
+# Port for the HTTP server providing the metrics in Prometheus format
+# (/metrics) and a health check (/health). Set to 0 to disable the
+# server. The server listens on METRICS_HOST; use '0.0.0.0' to make it
+# available to other hosts or containers.
+METRICS_PORT = 0
+METRICS_HOST = '127.0.0.1'
+
+# Event loop lag in seconds above which the health check reports the bot
+# as unhealthy
+MAX_LOOP_LAG = 5.0
+
+# Event loop watchdog: log the stack of the code blocking the event loop
+# for more than WATCHDOG_THRESHOLD seconds. Set to 0 to disable.
+WATCHDOG_THRESHOLD = 1.0
+
+# Profiling: PROFILE_MODE can be set to "cprofile" to run the cProfile
+# profiler or to "debug" to run the asyncio debug mode (which reports
+# callbacks taking more than SLOW_CALLBACK_DURATION seconds) for
+# PROFILE_WINDOW seconds after startup. Both can also be switched on and
+# off at runtime by sending SIGUSR1 (cProfile) or SIGUSR2 (debug mode) to
+# the bot. cProfile stats are logged and written to PROFILE_FILE, if set.
+PROFILE_MODE = ''
+PROFILE_WINDOW = 60
+PROFILE_FILE = ''
+SLOW_CALLBACK_DURATION = 0.1
+
 # Debug level
 DEBUG = 0
 
 # Log file. Use "stdout" to have the log write to the console.
 LOG_FILE = 'stdout'
 
+# Log file rotation: rotate the log file when it reaches LOG_MAX_BYTES
+# bytes or at the times given by LOG_ROTATE_WHEN (e.g. "midnight"; see
+# the Python logging.handlers.TimedRotatingFileHandler docs for other
+# values), keeping LOG_BACKUP_COUNT old files. Set LOG_MAX_BYTES to 0 and
+# LOG_ROTATE_WHEN to '' to disable rotation.
+LOG_MAX_BYTES = 0
+LOG_ROTATE_WHEN = ''
+LOG_BACKUP_COUNT = 5
+
+# Write application events (joins, challenges, approvals, bans, etc.) in
+# JSON lines format to this file. Leave empty to disable.
+LOG_EVENTS_FILE = ''
+
 ### Telegram API
 
 # API access. You can get these from
@@ -89,6 +271,25 @@ API_HASH = '123'
 # See https://core.telegram.org/bots#3-how-do-i-create-a-bot
 BOT_TOKEN = '123'
 
+# Run several bots in one process: set this to a JSON file with a list of
+# bot configurations (see runner.py for the format). Leave empty to run
+# a single bot configured by the above settings.
+BOTS_CONFIG = ''
+
+# Supervisor mode: set this to the number of worker processes to run.
+# MODERATION_GROUP_IDS are partitioned across the workers, each running
+# its own bot session (see supervisor.py). 0 runs the bot in this
+# process.
+SHARDS = 0
+
+# Crashed workers are restarted after SHARD_RESTART_DELAY seconds. A
+# worker crashing more than SHARD_MAX_RESTARTS times within
+# SHARD_RESTART_WINDOW seconds is paused for SHARD_RESTART_WINDOW
+# seconds, with its groups moved to the other workers.
+SHARD_RESTART_DELAY = 5.0
+SHARD_MAX_RESTARTS = 5
+SHARD_RESTART_WINDOW = 300.0
+
 ### Challenges
 
 # Characters to use for challenge strings; try to leave out chars which
@@ -100,9 +301,22 @@ CHALLENGE_CHARS = 'abcdefghjklmnpqrstuvwxyz23456789'
 CHALLENGE_LENGTH = 8
 
 # Set of Challenge classes to use for the Bot; see challenge.py for the
-# list of available challenges.
+# list of available challenges. Challenges provided by other packages can
+# be referenced by the name of their "telegram_antispam_bot.challenges"
+# entry point or by dotted path, e.g. "mypackage.challenges:MyChallenge".
+# Append "*<weight>" to a name to change how often it is chosen, e.g.
+# "MathAddChallenge*3, Challenge" (the default weight is 1).
 CHALLENGES = _tools.StrFrozenSet(['Challenge'])
 
+# Challenges to use for specific groups instead of CHALLENGES. Semicolon
+# separated list of "<group id>=<challenges>" entries, e.g.
+# "-100123=MathAddChallenge,ListItemChallenge; -100456=Challenge".
+GROUP_CHALLENGES = _tools.IntKeyDict()
+
+# Number of challenges to generate ahead of time per Challenge class, so
+# that they don't have to be generated when members join. 0 disables this.
+CHALLENGE_POOL_SIZE = 100
+
 # Max. number of failed challenge responses to allow
 MAX_FAILED_CHALLENGES = 3
 
@@ -28,6 +28,12 @@ class StrFrozenSet(set):
     """
     pass
 
+class IntKeyDict(dict):
+
+    """ Dict mapping int keys to frozen sets with str values
+    """
+    pass
+
 ### Parsers
 
 def comma_separated_to_frozenset(text, value_type=str):
@@ -46,6 +52,26 @@ def comma_separated_to_frozenset(text, value_type=str):
             add(value_type(value))
     return frozenset(s)
 
+def semicolon_separated_to_dict(text, key_type=int):
+
+    """ Convert a semicolon separated string text of "<key>=<values>"
+        entries into a dict mapping keys of the given key_type to
+        frozensets of str values, with the values given as comma
+        separated string.
+
+        key_type defaults to int.
+
+    """
+    d = {}
+    for entry in text.split(';'):
+        if not entry.strip():
+            continue
+        key, sep, values = entry.partition('=')
+        if not sep:
+            raise ValueError(f'missing "=" in entry {entry.strip()!r}')
+        d[key_type(key.strip())] = comma_separated_to_frozenset(values)
+    return d
+
 ### Processors
 
 def os_env_override(vars, prefix=''):
@@ -62,6 +88,7 @@ def os_env_override(vars, prefix=''):
         - float
         - IntSet
         - set (a set of strings)
+        - IntKeyDict (a dict mapping ints to sets of strings)
 
         The dict vars is manipulated in place.
 
@@ -89,6 +116,8 @@ def os_env_override(vars, prefix=''):
                 new_value = comma_separated_to_frozenset(new_value, float)
             elif isinstance(value, frozenset):
                 new_value = comma_separated_to_frozenset(new_value)
+            elif isinstance(value, IntKeyDict):
+                new_value = semicolon_separated_to_dict(new_value, int)
             vars[name] = new_value
 
 ### Tests
@@ -123,6 +152,8 @@ def _tests():
     assert comma_separated_to_frozenset('1.3, 2.4, 3.5', float) == set((1.3, 2.4, 3.5))
     assert (comma_separated_to_frozenset('1.3, 2.4, 3.5', float) == 
             FloatFrozenSet((1.3, 2.4, 3.5)))
+    assert (semicolon_separated_to_dict('-1=a, b; 2=c;') ==
+            {-1: set(('a', 'b')), 2: set(('c',))})
 
 if __name__ == '__main__':
     _tests()
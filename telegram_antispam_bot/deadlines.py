@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Deadline Index
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import asyncio
+import heapq
+import itertools
+import time
+
+### Deadline index
+
+class DeadlineIndex:
+
+    """ Index of deadlines per key, ordered by due time.
+
+        Each key can have at most one deadline. Setting a new deadline
+        for a key replaces the old one. Replaced entries are left in
+        the heap and skipped when they reach the top, so updating a
+        deadline is O(log n).
+
+    """
+    # Heap of (deadline, sequence number, key) entries
+    heap = None
+
+    # Dict mapping keys to their current (deadline, sequence number)
+    deadlines = None
+
+    # Event which gets set whenever a deadline earlier than the next one
+    # is set. Created lazily, since it has to be created inside the
+    # running event loop.
+    changed = None
+
+    def __init__(self):
+        self.heap = []
+        self.deadlines = {}
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def set(self, key, deadline):
+
+        """ Set the deadline for key.
+
+            deadline has to be given as time.time() value.
+
+        """
+        wakeup = not self.heap or deadline < self.heap[0][0]
+        entry = (deadline, next(self.counter))
+        self.deadlines[key] = entry
+        heapq.heappush(self.heap, entry + (key,))
+        # Compact the heap, if too many stale entries have accumulated
+        if len(self.heap) > 2 * len(self.deadlines) + 64:
+            self.heap = [
+                entry + (key,)
+                for key, entry in self.deadlines.items()]
+            heapq.heapify(self.heap)
+        if wakeup and self.changed is not None:
+            self.changed.set()
+
+    def remove(self, key):
+
+        """ Remove the deadline for key, if set.
+        """
+        self.deadlines.pop(key, None)
+
+    def next_deadline(self):
+
+        """ Return the next deadline or None, if no deadlines are set.
+        """
+        heap = self.heap
+        deadlines = self.deadlines
+        while heap:
+            deadline, seq, key = heap[0]
+            if deadlines.get(key) == (deadline, seq):
+                return deadline
+            # Stale entry
+            heapq.heappop(heap)
+        return None
+
+    def pop_due(self, now):
+
+        """ Remove and return the list of keys with deadlines at or
+            before now, in deadline order.
+        """
+        heap = self.heap
+        deadlines = self.deadlines
+        keys = []
+        while heap and heap[0][0] <= now:
+            deadline, seq, key = heapq.heappop(heap)
+            if deadlines.get(key) == (deadline, seq):
+                del deadlines[key]
+                keys.append(key)
+        return keys
+
+    async def wait(self, max_timeout):
+
+        """ Wait until the next deadline is due, an earlier deadline was
+            set or max_timeout seconds have passed, whichever comes
+            first.
+        """
+        if self.changed is None:
+            self.changed = asyncio.Event()
+        self.changed.clear()
+        timeout = max_timeout
+        next_deadline = self.next_deadline()
+        if next_deadline is not None:
+            timeout = min(timeout, max(next_deadline - time.time(), 0))
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
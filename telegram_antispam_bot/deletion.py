@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Message Deletion
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import logging
+
+### Globals
+
+# Log object
+LOG = logging.getLogger('antispambot')
+
+# Max. number of message IDs Telegram accepts per delete_messages() call
+MAX_DELETE_MESSAGES = 100
+
+### Deletion coalescer
+
+class DeletionCoalescer:
+
+    """ Collect message IDs to delete per chat and delete them in bulk.
+
+        Message IDs are collected for .window seconds per chat and then
+        deleted using as few API calls as possible.
+
+        Failures are reported via the .report coroutine function, which
+        gets called with (chat_id, message_ids, error).
+
+    """
+    # Coroutine function to call for deleting messages, with the same
+    # signature as pyrogram's Client.delete_messages(chat_id, message_ids)
+    delete = None
+
+    # Coroutine function to call for reporting failures
+    report = None
+
+    # Scheduler to use for the delayed deletions
+    scheduler = None
+
+    # Time window in seconds for collecting message IDs. 0 deletes the
+    # messages right away (in the background).
+    window = 1.0
+
+    # Dict mapping chat IDs to lists of message IDs to delete
+    pending = None
+
+    # Dict mapping chat IDs to their scheduled deletion action
+    scheduled = None
+
+    def __init__(self, delete, report, scheduler, window=None):
+        self.delete = delete
+        self.report = report
+        self.scheduler = scheduler
+        if window is not None:
+            self.window = window
+        self.pending = {}
+        self.scheduled = {}
+
+    def __len__(self):
+
+        """ Return the number of message IDs waiting to be deleted.
+        """
+        return sum(len(message_ids) for message_ids in self.pending.values())
+
+    def add(self, chat_id, message_ids):
+
+        """ Queue the list of message_ids in chat_id for deletion.
+
+            This returns immediately.
+
+        """
+        if not message_ids:
+            return
+        self.pending.setdefault(chat_id, []).extend(message_ids)
+        if chat_id not in self.scheduled:
+            self.scheduled[chat_id] = self.scheduler.schedule(
+                self.window, self.flush_chat, chat_id)
+
+    async def flush_chat(self, chat_id):
+
+        """ Delete all queued messages of chat_id.
+        """
+        self.scheduled.pop(chat_id, None)
+        message_ids = self.pending.pop(chat_id, None)
+        if not message_ids:
+            return
+        # Remove duplicates, but keep the order
+        message_ids = list(dict.fromkeys(message_ids))
+        for i in range(0, len(message_ids), MAX_DELETE_MESSAGES):
+            chunk = message_ids[i:i + MAX_DELETE_MESSAGES]
+            try:
+                await self.delete(chat_id, chunk)
+            except Exception as error:
+                LOG.error(
+                    'Failed to delete %i messages in chat %r: %r',
+                    len(chunk), chat_id, error)
+                await self.report(chat_id, chunk, error)
+
+    async def flush(self):
+
+        """ Delete all queued messages.
+        """
+        for chat_id in list(self.pending):
+            action = self.scheduled.pop(chat_id, None)
+            if action is not None:
+                self.scheduler.cancel(action)
+            await self.flush_chat(chat_id)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Duplicate Message Detection
+
+    Spammers who get past the challenge tend to post the same promotion
+    in many groups. Messages are fingerprinted using MinHash signatures
+    over the character shingles of the normalized text, so that the
+    similarity of two messages (the Jaccard similarity of their
+    shingle sets) can be estimated by comparing their signatures.
+
+    The signatures are computed with one permutation hashing: each
+    shingle is hashed only once and the hashes are distributed over
+    SIGNATURE_BINS bins, keeping the minimum per bin.
+
+    The FingerprintIndex finds similar signatures using locality
+    sensitive hashing: the signatures are split into BANDS bands and
+    only entries which match the signature in at least one band are
+    compared.
+
+    Note: The signatures use the Python hash() of the shingles, so they
+    are only comparable within the same process.
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import array
+import re
+import time
+import collections
+
+from telegram_antispam_bot.names import normalize_name
+
+### Globals
+
+# Number of characters per shingle
+SHINGLE_SIZE = 5
+
+# Words in the normalized text
+WORDS = re.compile(r'\w+')
+
+# Number of LSH bands and of bins per band. Signatures with a
+# similarity of s become candidates with probability
+# 1 - (1 - s**ROWS)**BANDS, e.g. 89% for s = 0.7 and 41% for s = 0.5.
+BANDS = 8
+ROWS = 4
+
+# Number of bins and bits per bin of the signatures; the signatures
+# are stored as ints with the bins packed into BIN_BITS wide lanes
+SIGNATURE_BINS = BANDS * ROWS
+BIN_BITS = 16
+BIN_MASK = (1 << BIN_BITS) - 1
+SIGNATURE_BYTES = SIGNATURE_BINS * BIN_BITS // 8
+BAND_BITS = ROWS * BIN_BITS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Mask for the hashes
+HASH_MASK = (1 << 64) - 1
+
+### Helpers
+
+def shingles(text):
+
+    """ Return the set of character shingles of the text.
+
+        The text is normalized in the same way as user names, with
+        punctuation removed. Texts shorter than SHINGLE_SIZE result in
+        one shingle.
+
+    """
+    text = ' '.join(WORDS.findall(normalize_name(text)))
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {
+        text[i:i + SHINGLE_SIZE]
+        for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def minhash(features):
+
+    """ Return the MinHash signature of the set of features (strings).
+    """
+    bins = [None] * SIGNATURE_BINS
+    for feature in features:
+        value = hash(feature) & HASH_MASK
+        i = value % SIGNATURE_BINS
+        value >>= 8
+        current = bins[i]
+        if current is None or value < current:
+            bins[i] = value
+    # Fill empty bins from the next non-empty bin (densification), so
+    # that short texts get comparable signatures as well. Walking
+    # backwards over the bins twice makes this wrap around.
+    values = bins[:]
+    carry = None
+    offset = 0
+    for i in range(2 * SIGNATURE_BINS - 1, -1, -1):
+        value = bins[i % SIGNATURE_BINS]
+        if value is not None:
+            carry = value
+            offset = 0
+        else:
+            offset += 1
+            if i < SIGNATURE_BINS and carry is not None:
+                values[i] = carry + offset
+    signature = 0
+    for i, value in enumerate(values):
+        signature |= (value & BIN_MASK) << (i * BIN_BITS)
+    return signature
+
+def fingerprint(text):
+
+    """ Return the signature of the message text or None, if the text
+        has no words.
+    """
+    features = shingles(text)
+    if not features:
+        return None
+    return minhash(features)
+
+def similarity(a, b):
+
+    """ Return the estimated similarity of the signatures a and b, as
+        float between 0 and 1.
+    """
+    same = array.array(
+        'H', (a ^ b).to_bytes(SIGNATURE_BYTES, 'little')).count(0)
+    return same / SIGNATURE_BINS
+
+def band_keys(signature):
+
+    """ Return the LSH bucket keys for signature.
+    """
+    return [
+        (((signature >> (band * BAND_BITS)) & BAND_MASK) << 4) | band
+        for band in range(BANDS)]
+
+### Fingerprint index
+
+class Fingerprint:
+
+    """ Entry of the FingerprintIndex.
+    """
+    __slots__ = (
+        # Signature of the message
+        'signature',
+
+        # Time the entry was added
+        'added',
+
+        # Data passed to FingerprintIndex.add()
+        'data',
+
+        # Is the entry still in the index ?
+        'indexed',
+    )
+
+    def __init__(self, signature, added, data):
+        self.signature = signature
+        self.added = added
+        self.data = data
+        self.indexed = True
+
+class FingerprintIndex:
+
+    """ Index of message signatures for finding near-duplicates.
+
+        Entries expire after .ttl seconds. The index holds at most
+        .max_size entries; the oldest ones are dropped first.
+
+    """
+    # Min. estimated similarity for signatures to match
+    min_similarity = 0.6
+
+    # Max. number of entries
+    max_size = 10000
+
+    # Time in seconds after which entries expire
+    ttl = 6 * 3600
+
+    # Dict mapping band keys to an entry or to a list of entries, if
+    # there are several entries with the same key
+    buckets = None
+
+    # Deque of entries in the order they were added
+    entries = None
+
+    # Number of entries in the index
+    size = 0
+
+    def __init__(self, min_similarity=None, max_size=None, ttl=None):
+        if min_similarity is not None:
+            self.min_similarity = min_similarity
+        if max_size is not None:
+            self.max_size = max_size
+        if ttl is not None:
+            self.ttl = ttl
+        self.buckets = {}
+        self.entries = collections.deque()
+
+    def __len__(self):
+        return self.size
+
+    def add(self, signature, data=None, now=None):
+
+        """ Add signature to the index and return the entry.
+
+            data can be used to store the information needed when
+            finding the entry.
+
+        """
+        if now is None:
+            now = time.time()
+        entry = Fingerprint(signature, now, data)
+        buckets = self.buckets
+        for key in band_keys(signature):
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = entry
+            elif type(bucket) is list:
+                bucket.append(entry)
+            else:
+                buckets[key] = [bucket, entry]
+        self.entries.append(entry)
+        self.size += 1
+        self.expire(now)
+        return entry
+
+    def remove(self, entry):
+
+        """ Remove entry from the index.
+
+            Nothing is done, if the entry was already removed.
+
+        """
+        if not entry.indexed:
+            return
+        buckets = self.buckets
+        for key in band_keys(entry.signature):
+            bucket = buckets[key]
+            if bucket is entry:
+                del buckets[key]
+                continue
+            bucket.remove(entry)
+            if len(bucket) == 1:
+                buckets[key] = bucket[0]
+        entry.indexed = False
+        self.size -= 1
+
+    def expire(self, now=None):
+
+        """ Remove the expired entries and the oldest entries beyond
+            .max_size.
+        """
+        if now is None:
+            now = time.time()
+        expired = now - self.ttl
+        entries = self.entries
+        while entries:
+            entry = entries[0]
+            if entry.indexed:
+                if entry.added > expired and self.size <= self.max_size:
+                    break
+                self.remove(entry)
+            entries.popleft()
+
+    def find(self, signature, now=None):
+
+        """ Return the list of entries with a similarity of at least
+            .min_similarity to signature, in the order they were added.
+        """
+        if now is None:
+            now = time.time()
+        expired = now - self.ttl
+        min_similarity = self.min_similarity
+        candidates = {}
+        buckets = self.buckets
+        for key in band_keys(signature):
+            bucket = buckets.get(key)
+            if bucket is None:
+                continue
+            if type(bucket) is not list:
+                candidates[id(bucket)] = bucket
+            else:
+                for entry in bucket:
+                    candidates[id(entry)] = entry
+        matches = [
+            entry
+            for entry in candidates.values()
+            if (entry.added > expired and
+                similarity(entry.signature, signature) >= min_similarity)]
+        matches.sort(key=lambda entry: entry.added)
+        return matches
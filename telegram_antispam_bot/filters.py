@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Update Filters
+
+    pyrogram filters used for registering the bot handlers, so that
+    updates which are not relevant to the bot are dropped by the
+    dispatcher, without calling the handlers.
+
+    All filters are coroutine functions: pyrogram runs filters defined
+    as plain functions in its thread pool executor, which would cost
+    more than the checks themselves.
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+from pyrogram import enums, filters
+
+### Filters
+
+async def check_moderated_chat(flt, client, message):
+    chat = message.chat
+    if chat is None:
+        return False
+    chat_id = chat.id
+    if chat_id == flt.management_group_id:
+        # Don't process messages from the management group
+        return False
+    if flt.moderation_group_ids and chat_id not in flt.moderation_group_ids:
+        return False
+    return True
+
+def moderated_chats(management_group_id=None, moderation_group_ids=()):
+
+    """ Return a filter for messages in the moderated chats.
+
+        Messages in the management_group_id chat are filtered out. If
+        moderation_group_ids is given, only messages in these chats are
+        passed through.
+
+    """
+    return filters.create(
+        check_moderated_chat,
+        'ModeratedChats',
+        management_group_id=management_group_id,
+        moderation_group_ids=frozenset(moderation_group_ids or ()))
+
+async def check_not_from_bot(flt, client, message):
+    from_user = message.from_user
+    return from_user is not None and from_user.id != client.bot_id
+
+# Messages sent by a user, other than the bot itself. client has to be
+# the AntispamBot.
+not_from_bot = filters.create(check_not_from_bot, 'NotFromBot')
+
+async def check_pending_applicant(flt, client, message):
+    from_user = message.from_user
+    return from_user is not None and from_user.id in client.new_members
+
+# Messages sent by members with a pending application. client has to be
+# the AntispamBot.
+pending_applicant = filters.create(check_pending_applicant, 'PendingApplicant')
+
+async def check_member_on_probation(flt, client, message):
+    from_user = message.from_user
+    chat = message.chat
+    return (
+        from_user is not None and
+        chat is not None and
+        (chat.id, from_user.id) in client.probation)
+
+# Messages sent by members on probation in the chat. client has to be
+# the AntispamBot.
+member_on_probation = filters.create(
+    check_member_on_probation, 'MemberOnProbation')
+
+# Messages announcing new chat members
+new_members = filters.new_chat_members
+
+async def check_leaving_applicant(flt, client, message):
+    member = message.left_chat_member
+    return member is not None and member.id in client.new_members
+
+# Messages announcing that a member with a pending application left the
+# chat (or was removed). client has to be the AntispamBot.
+leaving_applicant = filters.create(check_leaving_applicant, 'LeavingApplicant')
+
+# Chat member statuses of members who are no longer in the chat
+DEPARTED = frozenset((enums.ChatMemberStatus.LEFT, enums.ChatMemberStatus.BANNED))
+
+async def check_departed_applicant(flt, client, update):
+    member = update.new_chat_member
+    return (
+        member is not None and
+        member.status in DEPARTED and
+        member.user.id in client.new_members)
+
+# Chat member updates for members with a pending application, who left
+# the chat or were banned. client has to be the AntispamBot.
+departed_applicant = filters.create(check_departed_applicant, 'DepartedApplicant')
+
+# Messages sent in private chats with the bot, e.g. answers to the
+# challenges for join requests
+private_chats = filters.private
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Keyed Locks
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import asyncio
+import contextlib
+
+### Keyed locks
+
+class KeyedLocks:
+
+    """ asyncio locks per key, e.g. per member ID.
+
+        Tasks holding the lock for different keys run in parallel,
+        tasks using the same key are serialized (in FIFO order).
+
+        Locks only exist while they are held or waited for, so the
+        number of locks is bounded by the number of running tasks.
+
+    """
+    # Dict mapping keys to [asyncio.Lock, number of users] lists
+    locks = None
+
+    def __init__(self):
+        self.locks = {}
+
+    def __len__(self):
+        return len(self.locks)
+
+    def locked(self, key):
+
+        """ Return True, if the lock for key is currently held.
+        """
+        entry = self.locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+
+        """ Async context manager holding the lock for key.
+
+            Usage:
+
+                async with locks.hold(member_id):
+                    ...
+
+        """
+        entry = self.locks.get(key)
+        if entry is None:
+            entry = self.locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[key]
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Logging Setup
+
+    All log records are passed through a queue to a listener thread,
+    which formats them and writes them to the log file (or stdout), so
+    that the event loop never waits for disk I/O.
+
+    Application events can additionally be written to a separate file
+    in JSON lines format, with one JSON object per event.
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import pprint
+import queue
+
+### Globals
+
+# Log format
+LOG_FORMAT = '%(asctime)s.%(msecs)03d: %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Name of the logger for application events
+EVENTS_LOGGER = 'antispambot.events'
+
+### Handlers and formatters
+
+class PrettyFormat:
+
+    """ Wrapper for pretty-printing an object when formatting the log
+        record, i.e. in the listener thread.
+    """
+    __slots__ = ('object',)
+
+    def __init__(self, object):
+        self.object = object
+
+    def __str__(self):
+        return pprint.pformat(self.object)
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+
+    """ QueueHandler which leaves the formatting of the records to the
+        listener thread.
+
+        The standard QueueHandler formats the message in the calling
+        thread, so that the record can be pickled. Since our queue is
+        only used within the process, this is not needed.
+
+    """
+    def prepare(self, record):
+        return record
+
+class JSONFormatter(logging.Formatter):
+
+    """ Format records as one JSON object per line.
+
+        If the record message is a dict, its items are added to the JSON
+        object. Otherwise, the message text is stored under "message".
+
+    """
+    def format(self, record):
+        data = {
+            'time': datetime.datetime.fromtimestamp(
+                record.created).isoformat(timespec='milliseconds'),
+            }
+        if isinstance(record.msg, dict):
+            data.update(record.msg)
+        else:
+            data['message'] = record.getMessage()
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+def file_handler(filename, max_bytes=0, backup_count=5, rotate_when=''):
+
+    """ Return a log file handler for filename.
+
+        If max_bytes is set, the file is rotated when reaching this
+        size. If rotate_when is set, it is rotated at these times (see
+        logging.handlers.TimedRotatingFileHandler). backup_count gives
+        the number of rotated files to keep.
+
+    """
+    if rotate_when:
+        return logging.handlers.TimedRotatingFileHandler(
+            filename,
+            when=rotate_when,
+            backupCount=backup_count,
+            encoding='utf-8')
+    if max_bytes:
+        return logging.handlers.RotatingFileHandler(
+            filename,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding='utf-8')
+    return logging.FileHandler(filename, encoding='utf-8')
+
+### Setup
+
+def setup_logging(log_file='stdout', events_file='', max_bytes=0,
+                  backup_count=5, rotate_when=''):
+
+    """ Set up the logging pipeline.
+
+        log_file gives the log file to write to, or "stdout" for writing
+        to the console. events_file can be set to a file to write
+        application events to in JSON lines format.
+
+        Returns the started QueueListener. It is stopped automatically
+        at exit, writing out all queued records.
+
+    """
+    if log_file != 'stdout':
+        handler = file_handler(
+            log_file, max_bytes, backup_count, rotate_when)
+    else:
+        handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+    handlers = [handler]
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.addHandler(DeferredQueueHandler(log_queue))
+    #root.setLevel(logging.INFO) # useful for pyrogram debugging
+
+    # Application events
+    events = logging.getLogger(EVENTS_LOGGER)
+    events.propagate = False
+    events.setLevel(logging.INFO)
+    if events_file:
+        events_handler = file_handler(
+            events_file, max_bytes, backup_count, rotate_when)
+        events_handler.setFormatter(JSONFormatter())
+        events.addHandler(DeferredQueueHandler(log_queue))
+        # Only pass event records to the events file and other records
+        # to the log
+        events_handler.addFilter(
+            lambda record: record.name == EVENTS_LOGGER)
+        handler.addFilter(
+            lambda record: record.name != EVENTS_LOGGER)
+        handlers.append(events_handler)
+
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
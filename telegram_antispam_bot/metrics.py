@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Metrics
+
+    Counters, histograms and gauges for monitoring the bot, served in
+    the Prometheus text format by a small asyncio HTTP server:
+
+    - /metrics returns all metrics
+    - /health returns 200, if the bot is healthy, 503 otherwise
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import asyncio
+import bisect
+import functools
+import logging
+import math
+import time
+
+### Globals
+
+# Log object
+LOG = logging.getLogger('antispambot')
+
+# Default histogram buckets in seconds
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Max. size of HTTP request headers to accept
+MAX_REQUEST_SIZE = 8192
+
+### Helpers
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    labels = ','.join(
+        f'{name}="{escape_label(value)}"'
+        for name, value in zip(names, values))
+    return '{' + labels + '}'
+
+def escape_label(value):
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+### Metrics
+
+class Metric:
+
+    """ Base class for metrics.
+    """
+    # Metric type name
+    type = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def samples(self):
+
+        """ Return a list of (name suffix, label names, label values,
+            value) tuples.
+        """
+        return []
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} {self.type}',
+            ]
+        for suffix, names, values, value in self.samples():
+            lines.append(
+                f'{self.name}{suffix}{format_labels(names, values)} '
+                f'{format_value(value)}')
+        return '\n'.join(lines)
+
+class Counter(Metric):
+
+    """ Monotonically increasing counter, with one value per label
+        combination.
+    """
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self.values.get(label_values, 0)
+
+    def samples(self):
+        return [
+            ('', self.labels, label_values, value)
+            for label_values, value in sorted(self.values.items())]
+
+class Gauge(Metric):
+
+    """ Gauge, which reads its value from a function at collection time.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, help, function):
+        super().__init__(name, help)
+        self.function = function
+
+    def samples(self):
+        return [('', (), (), self.function())]
+
+class Histogram(Metric):
+
+    """ Histogram of observed values, e.g. latencies, with one set of
+        buckets per label combination.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Dict mapping label values to [bucket counts, sum, count]
+        self.values = {}
+
+    def observe(self, value, *label_values):
+        entry = self.values.get(label_values)
+        if entry is None:
+            entry = self.values[label_values] = [
+                [0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def time(self, *label_values):
+
+        """ Return a context manager observing the time spent in the
+            with-block.
+        """
+        return Timer(self, label_values)
+
+    def samples(self):
+        samples = []
+        names = self.labels + ('le',)
+        for label_values, (counts, total, count) in sorted(
+                self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(
+                    self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append(
+                    ('_bucket', names, label_values + (format_value(bound),),
+                     cumulative))
+            samples.append(('_sum', self.labels, label_values, total))
+            samples.append(('_count', self.labels, label_values, count))
+        return samples
+
+class Timer:
+
+    """ Context manager for timing a block of code.
+    """
+    __slots__ = ('histogram', 'label_values', 'start')
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(
+            time.perf_counter() - self.start, *self.label_values)
+
+### Registry
+
+class Registry:
+
+    """ Collection of metrics.
+    """
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, function):
+        return self.register(Gauge(name, help, function))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+
+        """ Return all metrics in the Prometheus text format.
+        """
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+class BotMetrics(Registry):
+
+    """ Metrics of the AntispamBot.
+
+        The gauges are added by the bot.
+
+    """
+    def __init__(self):
+        super().__init__()
+        self.joins = self.counter(
+            'antispambot_joins_total',
+            'Number of new members joining',
+            ('chat',))
+        self.approvals = self.counter(
+            'antispambot_approvals_total',
+            'Number of new members approved',
+            ('chat',))
+        self.bans = self.counter(
+            'antispambot_bans_total',
+            'Number of new members banned',
+            ('chat', 'reason'))
+        self.declines = self.counter(
+            'antispambot_declines_total',
+            'Number of join requests declined',
+            ('chat', 'reason'))
+        self.dropped = self.counter(
+            'antispambot_dropped_applications_total',
+            'Number of applications dropped without a decision',
+            ('chat', 'reason'))
+        self.failed_answers = self.counter(
+            'antispambot_failed_answers_total',
+            'Number of wrong answers to challenges',
+            ('chat',))
+        self.deletion_failures = self.counter(
+            'antispambot_deletion_failures_total',
+            'Number of messages which could not be deleted',
+            ('chat',))
+        self.handler_latency = self.histogram(
+            'antispambot_handler_seconds',
+            'Time spent in the bot handlers',
+            ('handler',))
+        self.api_latency = self.histogram(
+            'antispambot_api_request_seconds',
+            'Time spent in outgoing Telegram API requests',
+            ('method',))
+
+class CombinedRegistry:
+
+    """ Combination of several registries with the same metrics, e.g.
+        the BotMetrics of several bots running in one process.
+
+        The samples of each registry get an extra label, which is set
+        to the name the registry was added with.
+
+    """
+    def __init__(self, label='bot'):
+        self.label = label
+        # Dict mapping names to registries
+        self.registries = {}
+
+    def add(self, name, registry):
+        self.registries[name] = registry
+
+    def remove(self, name):
+        self.registries.pop(name, None)
+
+    def render(self):
+
+        """ Return all metrics in the Prometheus text format.
+
+            Metrics of the same name are combined into one metric
+            family.
+        """
+        # Dict mapping metric names to lists of (registry name, metric)
+        families = {}
+        for name, registry in self.registries.items():
+            for metric in registry.metrics:
+                families.setdefault(metric.name, []).append((name, metric))
+        lines = []
+        for metric_name, metrics in families.items():
+            first = metrics[0][1]
+            lines.append(f'# HELP {metric_name} {first.help}')
+            lines.append(f'# TYPE {metric_name} {first.type}')
+            for name, metric in metrics:
+                for suffix, names, values, value in metric.samples():
+                    labels = format_labels(
+                        (self.label,) + tuple(names),
+                        (name,) + tuple(values))
+                    lines.append(
+                        f'{metric_name}{suffix}{labels} '
+                        f'{format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+def timed(handler):
+
+    """ Decorator for recording the run time of async bot methods in the
+        handler latency histogram, using handler as label.
+
+        The bot needs to have a .metrics attribute pointing to a
+        BotMetrics instance.
+
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kws):
+            with self.metrics.handler_latency.time(handler):
+                return await method(self, *args, **kws)
+        return wrapper
+    return decorator
+
+### HTTP server
+
+class MetricsServer:
+
+    """ Minimal HTTP server for the metrics and health check endpoints.
+    """
+    # Host and port to listen on
+    host = '127.0.0.1'
+    port = 9090
+
+    # asyncio server. Set in .start()
+    server = None
+
+    def __init__(self, registry, health, host=None, port=None):
+
+        """ Create a server for registry.
+
+            health has to be a function returning (healthy, text).
+
+        """
+        self.registry = registry
+        self.health = health
+        if host is not None:
+            self.host = host
+        if port is not None:
+            self.port = port
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle_request, self.host, self.port)
+
+    async def stop(self):
+        if self.server is None:
+            return
+        self.server.close()
+        await self.server.wait_closed()
+        self.server = None
+
+    async def handle_request(self, reader, writer):
+        try:
+            try:
+                header = await asyncio.wait_for(
+                    reader.readuntil(b'\r\n\r\n'), 10)
+            except (asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError,
+                    asyncio.TimeoutError):
+                return
+            if len(header) > MAX_REQUEST_SIZE:
+                return
+            request_line = header.split(b'\r\n', 1)[0].decode(
+                'latin-1', 'replace')
+            parts = request_line.split()
+            if len(parts) < 2 or parts[0] not in ('GET', 'HEAD'):
+                status, body = '405 Method Not Allowed', 'method not allowed\n'
+            else:
+                path = parts[1].split('?', 1)[0]
+                if path == '/metrics':
+                    status, body = '200 OK', self.registry.render()
+                elif path == '/health':
+                    healthy, text = self.health()
+                    status = '200 OK' if healthy else '503 Service Unavailable'
+                    body = text + '\n'
+                else:
+                    status, body = '404 Not Found', 'not found\n'
+            data = body.encode('utf-8')
+            writer.write(
+                f'HTTP/1.0 {status}\r\n'
+                f'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                f'Content-Length: {len(data)}\r\n'
+                f'Connection: close\r\n'
+                f'\r\n'.encode('latin-1'))
+            if parts and parts[0] != 'HEAD':
+                writer.write(data)
+            await writer.drain()
+        except Exception as error:
+            LOG.error('Error in metrics server: %r', error)
+        finally:
+            writer.close()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram User Name Screening
+
+    Names of new members are normalized before checking them, so that
+    spammers cannot get around the checks using lookalike characters
+    from other scripts, styled letters (e.g. mathematical bold),
+    accents or invisible characters.
+
+    The blocklist entries are combined into a single regular
+    expression, with the plain substrings arranged as a trie, so that
+    a name can be checked against all entries using one search.
+
+    Name blocklist files contain one entry per line. Lines starting
+    with "re:" are taken as regular expressions, all other lines as
+    substrings to look for. Empty lines and lines starting with "#"
+    are ignored. Entries are matched against the normalized, lowercase
+    names, the full name and the username on separate lines, so "^"
+    and "$" match at the start and end of each name.
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import re
+import functools
+import unicodedata
+
+import emoji
+
+### Globals
+
+# Lookalike characters from other scripts, which NFKC normalization
+# does not map to their latin counterparts
+CONFUSABLES = str.maketrans({
+    # Cyrillic
+    'а': 'a', 'в': 'b', 'е': 'e', 'ё': 'e', 'к': 'k', 'м': 'm',
+    'н': 'h', 'о': 'o', 'р': 'p', 'с': 'c', 'т': 't', 'у': 'y',
+    'х': 'x', 'ѕ': 's', 'і': 'i', 'ї': 'i', 'ј': 'j', 'һ': 'h',
+    'ԁ': 'd', 'ԛ': 'q', 'ԝ': 'w', 'ӏ': 'l',
+    # Greek
+    'α': 'a', 'β': 'b', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k',
+    'ν': 'v', 'ο': 'o', 'ρ': 'p', 'τ': 't', 'υ': 'u', 'χ': 'x',
+    'ω': 'w',
+    # Latin lookalikes
+    'ı': 'i', 'ȷ': 'j', 'ɑ': 'a', 'ɡ': 'g', 'ʀ': 'r', 'ꜱ': 's',
+    'ᴀ': 'a', 'ʙ': 'b', 'ᴄ': 'c', 'ᴅ': 'd', 'ᴇ': 'e', 'ɢ': 'g',
+    'ʜ': 'h', 'ɪ': 'i', 'ᴊ': 'j', 'ᴋ': 'k', 'ʟ': 'l', 'ᴍ': 'm',
+    'ɴ': 'n', 'ᴏ': 'o', 'ᴘ': 'p', 'ᴛ': 't', 'ᴜ': 'u', 'ᴠ': 'v',
+    'ᴡ': 'w', 'ʏ': 'y', 'ᴢ': 'z',
+    # Invisible characters which are not format characters
+    'ᅟ': None, 'ᅠ': None, 'ㅤ': None, 'ﾠ': None,
+    '⠀': None,
+    })
+
+# Unicode categories of characters to remove: combining marks (accents)
+# and format characters (e.g. zero width spaces and joiners, bidi marks)
+REMOVED_CATEGORIES = frozenset(('Mn', 'Me', 'Cf'))
+
+# Runs of whitespace and of non-alphanumeric characters
+WHITESPACE = re.compile(r'\s+')
+NON_ALPHANUMERIC = re.compile(r'[\W_]+')
+
+# Entries consisting only of words separated by spaces
+WORDS = re.compile(r'^[^\W_]+( [^\W_]+)*$')
+
+### Helpers
+
+def normalize_name(text):
+
+    """ Return the normalized version of the name text.
+
+        The name is NFKD normalized, accents, invisible characters and
+        emojis are removed, lookalike characters mapped to latin ones,
+        whitespace collapsed and the result casefolded.
+
+    """
+    if not text:
+        return ''
+    if text.isascii():
+        # Fast path: nothing to map or remove
+        return WHITESPACE.sub(' ', text.lower()).strip()
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(
+        char
+        for char in text
+        if unicodedata.category(char) not in REMOVED_CATEGORIES)
+    text = emoji.replace_emoji(text, ' ')
+    text = text.casefold().translate(CONFUSABLES)
+    return WHITESPACE.sub(' ', text).strip()
+
+def trie_pattern(words):
+
+    """ Return a regular expression pattern matching any of the words.
+
+        The words are arranged in a trie, so that the regular
+        expression engine only has to follow the matching branches.
+        Since the pattern is used for searching substrings, words which
+        start with another word are left out.
+
+    """
+    trie = {}
+    for word in words:
+        if not word:
+            continue
+        node = trie
+        for char in word:
+            if '' in node:
+                # A prefix of the word is already in the trie
+                break
+            node = node.setdefault(char, {})
+        else:
+            node.clear()
+            node[''] = True
+    return node_pattern(trie)
+
+def node_pattern(node):
+
+    """ Return the pattern for the trie node.
+    """
+    if '' in node:
+        return ''
+    alternatives = [
+        re.escape(char) + node_pattern(child)
+        for char, child in sorted(node.items())]
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return '(?:' + '|'.join(alternatives) + ')'
+
+def read_name_blocklist(filename):
+
+    """ Read the name blocklist file filename and return the list of
+        entries.
+    """
+    entries = []
+    with open(filename, encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            entries.append(line)
+    return entries
+
+### Name screener
+
+class NameScreener:
+
+    """ Check the names of new members for obvious spam signups.
+
+        .check(first_name, last_name, username) returns the reason for
+        rejecting the member as string or None, if the name is fine.
+        Results are cached, since spammers tend to reuse names.
+
+    """
+    # Max. number of emojis allowed in the name
+    max_emojis = 2
+
+    # Combined regular expression for the blocklist entries or None,
+    # if there are no entries
+    pattern = None
+
+    # Number of blocklist entries
+    entries = 0
+
+    # Max. number of names to cache the results for
+    cache_size = 10000
+
+    def __init__(self, entries=(), max_emojis=None, cache_size=None):
+
+        """ Create a name screener for the blocklist entries: substrings
+            to look for or regular expressions, when prefixed with "re:".
+
+            Raises a ValueError for invalid regular expressions.
+
+        """
+        if max_emojis is not None:
+            self.max_emojis = max_emojis
+        if cache_size is not None:
+            self.cache_size = cache_size
+        entries = list(entries)
+        substrings = set()
+        regexes = []
+        for entry in entries:
+            if entry.startswith('re:'):
+                regex = entry[3:]
+                try:
+                    re.compile(regex)
+                except re.error as error:
+                    raise ValueError(
+                        f'invalid name blocklist entry {entry!r}: '
+                        f'{error}') from None
+                regexes.append(regex)
+            else:
+                substring = normalize_name(entry)
+                substrings.add(substring)
+                if WORDS.match(substring):
+                    # Also look for the words without spaces, to catch
+                    # names written without separators
+                    substrings.add(substring.replace(' ', ''))
+        substrings.discard('')
+        alternatives = regexes
+        if substrings:
+            alternatives = [trie_pattern(substrings)] + regexes
+        if alternatives:
+            self.pattern = re.compile(
+                '|'.join(
+                    f'(?:{alternative})' for alternative in alternatives),
+                re.MULTILINE)
+        self.entries = len(entries)
+        self.check = functools.lru_cache(maxsize=self.cache_size)(
+            self.screen)
+
+    def screen(self, first_name, last_name, username):
+
+        """ Return the reason for rejecting a member with the given names
+            or None, if the names are fine.
+
+            This is the uncached version of .check().
+
+        """
+        name = ' '.join(filter(None, (first_name, last_name)))
+        if not name.isascii() and emoji.emoji_count(name) > self.max_emojis:
+            return 'too many emojis in the name'
+        if self.pattern is None:
+            return None
+        name = normalize_name(name)
+        username = normalize_name(username)
+        # Check the names and their versions without separators, to
+        # also catch e.g. "s.p.a.m" or "s p a m"
+        text = '\n'.join((
+            name,
+            username,
+            NON_ALPHANUMERIC.sub('', name),
+            NON_ALPHANUMERIC.sub('', username)))
+        match = self.pattern.search(text)
+        if match is None:
+            return None
+        return f'name matches the blocklist ({match.group()!r})'
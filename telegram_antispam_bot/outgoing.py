@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Outgoing Request Queue
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import asyncio
+import enum
+import heapq
+import itertools
+import logging
+import time
+from pyrogram import errors
+
+### Globals
+
+# Log object
+LOG = logging.getLogger('antispambot')
+
+# Request priorities; lower values are sent first
+class Priority(enum.IntEnum):
+    BAN = 0
+    CHALLENGE = 1
+    NOTICE = 2
+    CLEANUP = 3
+    ADMIN_LOG = 4
+
+### Token bucket
+
+class TokenBucket:
+
+    """ Token bucket rate limiter.
+
+        rate gives the number of tokens added per second, capacity the
+        max. number of tokens which can be used in a burst. A rate of 0
+        disables the limit.
+
+    """
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        if now > self.updated:
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+
+        """ Return the time in seconds until a token is available.
+        """
+        if not self.rate:
+            return 0
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def fill_time(self, now):
+
+        """ Return the time in seconds until the bucket is full again.
+        """
+        if not self.rate:
+            return 0
+        self.refill(now)
+        return (self.capacity - self.tokens) / self.rate
+
+    def consume(self, now):
+
+        """ Use up one token.
+        """
+        if not self.rate:
+            return
+        self.refill(now)
+        self.tokens -= 1
+
+### Outgoing request queue
+
+class OutgoingRequest:
+
+    """ Request waiting in the OutgoingQueue.
+    """
+    __slots__ = ('priority', 'seq', 'chat_id', 'method', 'args', 'kws',
+                 'future', 'retries')
+
+    def __init__(self, priority, seq, chat_id, method, args, kws, future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.method = method
+        self.args = args
+        self.kws = kws
+        self.future = future
+        self.retries = 0
+
+    def sort_key(self):
+        return (self.priority, self.seq)
+
+class OutgoingQueue:
+
+    """ Central queue for all outgoing Telegram API requests.
+
+        Requests are sent in priority order, subject to a global token
+        bucket and one token bucket per chat. Requests for a chat which
+        has used up its tokens don't hold back requests for other chats.
+
+        FloodWait errors pause the queue for the time requested by
+        Telegram, after which the request is retried.
+
+    """
+    # Global rate limit in requests per second and burst size
+    rate = 25.0
+    burst = 30
+
+    # Per chat rate limit in requests per second and burst size
+    chat_rate = 0.5
+    chat_burst = 20
+
+    # Max. number of requests to run concurrently
+    concurrency = 8
+
+    # Max. number of retries after FloodWait errors
+    max_retries = 5
+
+    # Global TokenBucket
+    bucket = None
+
+    # Dict mapping chat IDs to their TokenBucket. Buckets of chats
+    # without waiting requests are dropped once they are full again,
+    # since a new bucket would be the same.
+    chat_buckets = None
+
+    # Dict mapping chat IDs to a heap of waiting requests
+    chat_queues = None
+
+    # Heap of (priority, seq, chat_id) entries for chats which have
+    # requests waiting and tokens available
+    ready = None
+
+    # Heap of (time, chat_id) entries for chats which have requests
+    # waiting, but no tokens available
+    throttled = None
+
+    # Heap of (time, chat_id) entries for chats without waiting requests,
+    # giving the time their bucket is full again
+    idle = None
+
+    # Number of queued requests and requests currently running
+    queued = 0
+    running = 0
+
+    # Time until which the queue is paused due to a FloodWait error
+    paused_until = 0
+
+    # Histogram for recording the request latencies per method name or
+    # None
+    latency = None
+
+    # Dispatcher task, wakeup event and semaphore for limiting the
+    # number of concurrent requests. Set in .start()
+    dispatcher = None
+    wakeup = None
+    slots = None
+
+    # Was the queue stopped ? New requests are refused then, since
+    # nobody would send them.
+    stopped = False
+
+    def __init__(self, rate=None, burst=None, chat_rate=None, chat_burst=None,
+                 concurrency=None, max_retries=None):
+        if rate is not None:
+            self.rate = rate
+        if burst is not None:
+            self.burst = burst
+        if chat_rate is not None:
+            self.chat_rate = chat_rate
+        if chat_burst is not None:
+            self.chat_burst = chat_burst
+        if concurrency is not None:
+            self.concurrency = concurrency
+        if max_retries is not None:
+            self.max_retries = max_retries
+        self.bucket = TokenBucket(self.rate, self.burst)
+        self.chat_buckets = {}
+        self.chat_queues = {}
+        self.ready = []
+        self.throttled = []
+        self.idle = []
+        self.counter = itertools.count()
+        self.tasks = set()
+
+    def __len__(self):
+
+        """ Return the queue depth, i.e. the number of requests waiting
+            to be sent.
+        """
+        return self.queued
+
+    def start(self):
+
+        """ Start the dispatcher task.
+        """
+        self.wakeup = asyncio.Event()
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.dispatcher = asyncio.create_task(self.dispatch())
+        self.stopped = False
+
+    async def stop(self):
+
+        """ Send all queued requests and stop the dispatcher task.
+
+            Requests submitted afterwards raise a RuntimeError.
+
+        """
+        await self.drain()
+        self.stopped = True
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            try:
+                await self.dispatcher
+            except asyncio.CancelledError:
+                pass
+            self.dispatcher = None
+
+    async def drain(self):
+
+        """ Wait for all queued and running requests to finish.
+        """
+        while self.queued or self.tasks:
+            if self.tasks:
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+            else:
+                await asyncio.sleep(0.1)
+
+    def submit(self, priority, chat_id, method, *args, **kws):
+
+        """ Queue a call of the coroutine function method with args and
+            kws for sending to chat_id with the given priority.
+
+            Returns a future for the result of the call. Use .request()
+            to wait for the result.
+
+            Raises a RuntimeError, if the queue was stopped.
+
+        """
+        if self.stopped:
+            raise RuntimeError('outgoing queue is stopped')
+        future = asyncio.get_running_loop().create_future()
+        request = OutgoingRequest(
+            priority, next(self.counter), chat_id, method, args, kws, future)
+        self.enqueue(request)
+        return future
+
+    async def request(self, priority, chat_id, method, *args, **kws):
+
+        """ Send the request and return the result.
+
+            Errors are passed on to the caller, except for FloodWait
+            errors, which are retried up to .max_retries times.
+
+        """
+        return await self.submit(priority, chat_id, method, *args, **kws)
+
+    def enqueue(self, request):
+        chat_id = request.chat_id
+        queue = self.chat_queues.get(chat_id)
+        if queue is None:
+            queue = self.chat_queues[chat_id] = []
+        heapq.heappush(queue, (request.sort_key(), request))
+        self.queued += 1
+        if len(queue) == 1 or queue[0][1] is request:
+            # New head of the chat queue; (re)schedule the chat
+            self.schedule_chat(chat_id)
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(
+                self.chat_rate, self.chat_burst)
+        return bucket
+
+    def schedule_chat(self, chat_id):
+
+        """ Put chat_id on the .ready or .throttled heap, depending on
+            whether it has tokens available.
+        """
+        queue = self.chat_queues[chat_id]
+        now = time.monotonic()
+        wait_time = self.chat_bucket(chat_id).wait_time(now)
+        if wait_time:
+            heapq.heappush(self.throttled, (now + wait_time, chat_id))
+        else:
+            heapq.heappush(self.ready, queue[0][0] + (chat_id,))
+
+    def next_request(self):
+
+        """ Return the next request to send or None, if no request is
+            ready.
+        """
+        now = time.monotonic()
+        # Drop the buckets of idle chats, which are full again
+        while self.idle and self.idle[0][0] <= now:
+            when, chat_id = heapq.heappop(self.idle)
+            bucket = self.chat_buckets.get(chat_id)
+            if (bucket is not None and
+                chat_id not in self.chat_queues and
+                bucket.fill_time(now) <= 0):
+                del self.chat_buckets[chat_id]
+        # Move chats which have tokens again to the ready heap
+        while self.throttled and self.throttled[0][0] <= now:
+            when, chat_id = heapq.heappop(self.throttled)
+            if self.chat_queues.get(chat_id):
+                self.schedule_chat(chat_id)
+        while self.ready:
+            priority, seq, chat_id = heapq.heappop(self.ready)
+            queue = self.chat_queues.get(chat_id)
+            if not queue or queue[0][0] != (priority, seq):
+                # Stale entry
+                continue
+            sort_key, request = heapq.heappop(queue)
+            self.queued -= 1
+            bucket = self.chat_bucket(chat_id)
+            bucket.consume(now)
+            if queue:
+                self.schedule_chat(chat_id)
+            else:
+                del self.chat_queues[chat_id]
+                heapq.heappush(
+                    self.idle, (now + bucket.fill_time(now), chat_id))
+            return request
+        return None
+
+    async def wait_for_request(self):
+
+        """ Wait for the next request which can be sent, honoring
+            FloodWait pauses and the rate limits, and return it.
+        """
+        while True:
+            now = time.monotonic()
+            wait_time = max(self.paused_until - now,
+                            self.bucket.wait_time(now))
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+                continue
+            request = self.next_request()
+            if request is not None:
+                self.bucket.consume(now)
+                return request
+            # Wait for new requests or throttled chats to become ready
+            self.wakeup.clear()
+            timeout = None
+            if self.throttled:
+                timeout = max(self.throttled[0][0] - now, 0)
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def dispatch(self):
+
+        """ Dispatcher task sending the queued requests.
+        """
+        while True:
+            # Wait for a free slot first, so that FloodWait errors of
+            # running requests are taken into account when picking the
+            # next request
+            await self.slots.acquire()
+            try:
+                request = await self.wait_for_request()
+            except BaseException:
+                self.slots.release()
+                raise
+            task = asyncio.create_task(self.send(request))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def send(self, request):
+
+        """ Send the request and pass the result to its future.
+
+            The caller may have given up on the request in the meantime
+            (e.g. cancelled by a timeout), so the future is only set, if
+            it is not done yet.
+
+        """
+        self.running += 1
+        start = time.perf_counter()
+        future = request.future
+        try:
+            result = await request.method(*request.args, **request.kws)
+        except errors.FloodWait as error:
+            wait_time = error.value if isinstance(error.value, int) else 1
+            self.paused_until = max(self.paused_until,
+                                    time.monotonic() + wait_time)
+            request.retries += 1
+            if future.done():
+                # The caller gave up on the request: no need to retry
+                pass
+            elif request.retries > self.max_retries:
+                future.set_exception(error)
+            else:
+                LOG.warning(
+                    'FloodWait from Telegram: pausing outgoing requests '
+                    'for %i seconds (%i requests queued)',
+                    wait_time, self.queued)
+                self.enqueue(request)
+        except Exception as error:
+            if not future.done():
+                future.set_exception(error)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            if self.latency is not None:
+                self.latency.observe(
+                    time.perf_counter() - start,
+                    getattr(request.method, '__name__', 'unknown'))
+            self.running -= 1
+            self.slots.release()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Raid Detection
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import collections
+import time
+
+### Raid detector
+
+class RaidDetector:
+
+    """ Track the join rate per chat and detect join raids.
+
+        A chat is considered to be under attack, if at least .threshold
+        members joined within the last .window seconds.
+
+    """
+    # Number of joins within .window seconds which trigger raid mode. 0
+    # disables raid detection.
+    threshold = 10
+
+    # Time window in seconds
+    window = 60
+
+    # Dict mapping chat IDs to deques of join times
+    joins = None
+
+    def __init__(self, threshold=None, window=None):
+        if threshold is not None:
+            self.threshold = threshold
+        if window is not None:
+            self.window = window
+        self.joins = {}
+
+    def expire(self, chat_id, now):
+
+        """ Remove expired join times of chat_id and return the number of
+            remaining joins.
+        """
+        joins = self.joins.get(chat_id)
+        if joins is None:
+            return 0
+        limit = now - self.window
+        while joins and joins[0] <= limit:
+            joins.popleft()
+        if not joins:
+            del self.joins[chat_id]
+            return 0
+        return len(joins)
+
+    def add_joins(self, chat_id, count=1, now=None):
+
+        """ Register count new joins for chat_id and return True, if the
+            chat is under attack.
+        """
+        if not self.threshold:
+            return False
+        if now is None:
+            now = time.time()
+        joins = self.joins.get(chat_id)
+        if joins is None:
+            # Only the last .threshold joins are needed for detecting
+            # raids
+            joins = self.joins[chat_id] = collections.deque(
+                maxlen=self.threshold)
+        joins.extend([now] * min(count, self.threshold))
+        return self.expire(chat_id, now) >= self.threshold
+
+    def under_attack(self, chat_id, now=None):
+
+        """ Return True, if chat_id is currently under attack.
+        """
+        if not self.threshold:
+            return False
+        if now is None:
+            now = time.time()
+        return self.expire(chat_id, now) >= self.threshold
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Update Recorder
+
+    Records the updates processed by the bot to an append-only JSONL
+    file, for replaying them later on (see benchmarks/replay.py).
+
+    Each line holds one record. Update records look like this:
+
+    {"t": 1700000000.123, "chat": -100123, "title": "Group", "id": 42,
+     "user": [123, "First", "Last", "username", false],
+     "text": "Hello", "join": [[124, "First", null, null, false]]}
+
+    "text" and "join" are only present, if set in the message. Results
+    of challenge checks are recorded as:
+
+    {"t": 1700000000.456, "chat": -100123, "check": 43, "ok": true}
+
+    where "check" gives the ID of the answer message.
+
+    If PII hashing is enabled, user IDs, names and texts are replaced
+    with salted hashes. Emojis in names are kept, since these are used
+    for screening new members. If no salt is given, a random one is
+    generated and kept in the file <recording>.salt, so that the hashes
+    stay the same across restarts, but cannot be reversed by trying
+    out known IDs or names.
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import os
+import hashlib
+import json
+import secrets
+import time
+import emoji
+
+### Update recorder
+
+class UpdateRecorder:
+
+    """ Append-only recorder for incoming updates.
+
+        Records are written to the file buffer right away and flushed to
+        disk after .flush_delay seconds, using the scheduler.
+
+    """
+    # Filename of the recording
+    filename = ''
+
+    # Replace PII with hashes ?
+    hash_pii = True
+
+    # Salt to use for the PII hashes
+    salt = b''
+
+    # File for keeping the generated salt, if no salt is given
+    salt_filename = ''
+
+    # Open file. Set in .open()
+    file = None
+
+    # Scheduler used for the delayed flushes and the flush delay in
+    # seconds
+    scheduler = None
+    flush_delay = 1.0
+
+    # Scheduled flush action or None
+    scheduled_flush = None
+
+    def __init__(self, filename, scheduler, hash_pii=None, salt=None,
+                 flush_delay=None):
+        self.filename = filename
+        self.salt_filename = filename + '.salt'
+        self.scheduler = scheduler
+        if hash_pii is not None:
+            self.hash_pii = hash_pii
+        if salt is not None:
+            self.salt = salt.encode('utf-8')
+        if flush_delay is not None:
+            self.flush_delay = flush_delay
+
+    def open(self):
+        if self.hash_pii and not self.salt:
+            self.salt = self.load_salt()
+        self.file = open(self.filename, 'a', encoding='utf-8')
+
+    def load_salt(self):
+
+        """ Return the salt stored in .salt_filename.
+
+            A random salt is generated and written to the file first,
+            if needed. The file is only readable by the owner.
+
+        """
+        try:
+            with open(self.salt_filename, 'rb') as f:
+                salt = f.read().strip()
+        except FileNotFoundError:
+            salt = b''
+        if salt:
+            return salt
+        salt = secrets.token_hex(32).encode('ascii')
+        fd = os.open(
+            self.salt_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, 'wb') as f:
+            f.write(salt)
+        return salt
+
+    def close(self):
+        if self.file is None:
+            return
+        if self.scheduled_flush is not None:
+            self.scheduler.cancel(self.scheduled_flush)
+            self.scheduled_flush = None
+        self.file.close()
+        self.file = None
+
+    async def flush(self):
+        self.scheduled_flush = None
+        if self.file is not None:
+            self.file.flush()
+
+    def write(self, record):
+        self.file.write(
+            json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        self.file.write('\n')
+        if self.scheduled_flush is None:
+            self.scheduled_flush = self.scheduler.schedule(
+                self.flush_delay, self.flush)
+
+    ### PII hashing
+
+    def hash_digest(self, value, size):
+        return hashlib.blake2b(
+            str(value).encode('utf-8'),
+            digest_size=size,
+            key=self.salt[:64]).digest()
+
+    def hash_id(self, id):
+
+        """ Return a stable hash for the ID id.
+
+            The hash is a positive 48-bit int.
+
+        """
+        if not self.hash_pii or id is None:
+            return id
+        return int.from_bytes(self.hash_digest(id, 6), 'big')
+
+    def hash_text(self, text, keep_emojis=False):
+
+        """ Return a stable hash for text.
+
+            If keep_emojis is true, the emojis found in text are
+            appended to the hash.
+
+        """
+        if not self.hash_pii or text is None:
+            return text
+        hashed = self.hash_digest(text, 8).hex()
+        if keep_emojis:
+            hashed += ''.join(
+                match['emoji'] for match in emoji.emoji_list(text))
+        return hashed
+
+    ### Records
+
+    def user_record(self, user):
+        return [
+            self.hash_id(user.id),
+            self.hash_text(user.first_name, keep_emojis=True),
+            self.hash_text(user.last_name, keep_emojis=True),
+            self.hash_text(user.username),
+            bool(user.is_bot),
+            ]
+
+    def record(self, message):
+
+        """ Record the pyrogram message.
+        """
+        if self.file is None:
+            return
+        record = {
+            't': round(time.time(), 3),
+            'chat': message.chat.id,
+            'title': message.chat.title,
+            'id': message.id,
+            'user': (
+                self.user_record(message.from_user)
+                if message.from_user else None),
+            }
+        if message.text:
+            record['text'] = self.hash_text(message.text)
+        if message.new_chat_members:
+            record['join'] = [
+                self.user_record(user)
+                for user in message.new_chat_members]
+        self.write(record)
+
+    def record_check(self, message, ok):
+
+        """ Record the result ok of checking the answer message.
+        """
+        if self.file is None:
+            return
+        self.write({
+            't': round(time.time(), 3),
+            'chat': message.chat.id,
+            'check': message.id,
+            'ok': bool(ok),
+            })
+
+### Helpers
+
+def read_recording(filename):
+
+    """ Iterate over the records in the recording filename.
+
+        Incomplete lines (e.g. from a crash while writing) are skipped.
+
+    """
+    with open(filename, encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
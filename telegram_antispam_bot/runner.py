@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Multi-Bot Runner
+
+    Runs several bots, e.g. for different communities, on one event
+    loop in a single process. The bots share the scheduler (each using
+    a child scheduler, so that its actions can be cancelled when it
+    fails), the watchdog, the logging, the blocklist, the name screening and one
+    metrics server, while their application state is kept per bot.
+
+    The bots are configured in a JSON file (BOTS_CONFIG setting), which
+    has to contain a list of objects, one per bot:
+
+        [
+            {
+                "session_name": "community-a",
+                "bot_token": "...",
+                "management_group_id": -1001234,
+                "moderation_group_ids": [-1005678],
+                "challenges": ["Challenge", "MathAddChallenge*2"],
+                "group_challenges": {"-1005678": ["ListItemChallenge"]}
+            },
+            ...
+        ]
+
+    "session_name" and "bot_token" are required. "api_id" and
+    "api_hash" default to the API_ID and API_HASH settings, the other
+    entries to the respective settings.
+
+    A bot which fails is stopped, while the other bots keep running.
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+
+from telegram_antispam_bot.antispam_bot import (
+    AntispamBot,
+    create_name_screener,
+    create_watchdog,
+    start_watchdog,
+    )
+from telegram_antispam_bot.scheduler import Scheduler
+from telegram_antispam_bot.blocklist import Blocklist
+from telegram_antispam_bot.metrics import CombinedRegistry, MetricsServer
+from telegram_antispam_bot.config import (
+    BOTS_CONFIG,
+    BLOCKLIST_FILE,
+    METRICS_HOST,
+    METRICS_PORT,
+    )
+
+### Globals
+
+# Log object
+LOG = logging.getLogger('antispambot')
+
+# Bot configuration entries and their types. The values are passed to
+# the AntispamBot constructor.
+CONFIG_ENTRIES = {
+    'session_name': str,
+    'bot_token': str,
+    'api_id': str,
+    'api_hash': str,
+    'management_group_id': int,
+    'moderation_group_ids': list,
+    'challenges': list,
+    'group_challenges': dict,
+    'join_requests': bool,
+    }
+
+# Required configuration entries
+REQUIRED_ENTRIES = ('session_name', 'bot_token')
+
+### Configuration
+
+def parse_bot_config(entry):
+
+    """ Check and convert the bot configuration entry (a dict) and
+        return it as dict of keyword arguments for the AntispamBot
+        constructor.
+
+        Raises a ValueError for invalid entries.
+
+    """
+    if not isinstance(entry, dict):
+        raise ValueError(f'bot configuration has to be an object: {entry!r}')
+    for name in REQUIRED_ENTRIES:
+        if not entry.get(name):
+            raise ValueError(f'missing {name!r} in bot configuration')
+    config = {}
+    for name, value in entry.items():
+        value_type = CONFIG_ENTRIES.get(name)
+        if value_type is None:
+            raise ValueError(
+                f'unknown entry {name!r} in bot configuration '
+                f'{entry["session_name"]!r}')
+        if value_type in (list, dict):
+            if not isinstance(value, value_type):
+                kind = 'a list' if value_type is list else 'an object'
+                raise ValueError(
+                    f'{name!r} has to be {kind} in bot configuration '
+                    f'{entry["session_name"]!r}')
+        else:
+            value = value_type(value)
+        config[name] = value
+    if 'moderation_group_ids' in config:
+        config['moderation_group_ids'] = frozenset(
+            int(id) for id in config['moderation_group_ids'])
+    if 'challenges' in config:
+        config['challenges'] = frozenset(config['challenges'])
+    if 'group_challenges' in config:
+        config['group_challenges'] = {
+            int(id): frozenset(challenges)
+            for id, challenges in config['group_challenges'].items()}
+    return config
+
+def load_bots_config(filename):
+
+    """ Load the list of bot configurations from the JSON file filename.
+
+        Returns a list of dicts with keyword arguments for the
+        AntispamBot constructor.
+
+    """
+    with open(filename, encoding='utf-8') as file:
+        entries = json.load(file)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(
+            f'{filename} has to contain a non-empty list of bot '
+            f'configurations')
+    configs = [parse_bot_config(entry) for entry in entries]
+    names = [config['session_name'] for config in configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f'session names in {filename} are not unique')
+    return configs
+
+### Runner
+
+class BotRunner:
+
+    """ Run several AntispamBots on one event loop.
+    """
+    # AntispamBot class to use
+    bot_class = AntispamBot
+
+    # Host and port for the shared metrics server. A port of 0 disables
+    # the server.
+    metrics_host = METRICS_HOST
+    metrics_port = METRICS_PORT
+
+    # List of bot configurations (keyword arguments for .bot_class)
+    configs = None
+
+    # Running bots, shared Scheduler and Watchdog. Set in .run()
+    bots = None
+    scheduler = None
+    watchdog = None
+
+    # CombinedRegistry with the metrics of all bots and the
+    # MetricsServer serving them. Set in .run()
+    metrics = None
+    metrics_server = None
+
+    # Event signaling the shutdown. Set in .run()
+    shutdown = None
+
+    def __init__(self, configs, bot_class=None):
+        self.configs = configs
+        if bot_class is not None:
+            self.bot_class = bot_class
+
+    def create_bots(self):
+
+        """ Create the bots, sharing the .scheduler and .watchdog.
+
+            Each bot gets a child scheduler of .scheduler.
+
+            This has to be called from within the event loop, since
+            pyrogram binds the clients to the current event loop.
+
+        """
+        bots = []
+        for config in self.configs:
+            bot = self.bot_class(
+                scheduler=self.scheduler.child(),
+                watchdog=self.watchdog,
+                **config)
+            bot.log_prefix = f'[{bot.name}] '
+            # Metrics are served by the runner
+            bot.metrics_port = 0
+            if bot.record_updates_file:
+                # Record the updates of each bot to a separate file
+                base, ext = os.path.splitext(bot.record_updates_file)
+                bot.record_updates_file = f'{base}-{bot.name}{ext}'
+            bots.append(bot)
+        return bots
+
+    async def load_blocklist(self):
+
+        """ Load the blocklist, if enabled, and share it with all bots.
+        """
+        if not BLOCKLIST_FILE:
+            return
+        blocklist = Blocklist(BLOCKLIST_FILE)
+        blocklist.apply(await asyncio.to_thread(blocklist.read, True))
+        LOG.info('Loaded blocklist with %i entries', len(blocklist))
+        for bot in self.bots:
+            bot.blocklist = blocklist
+
+    async def load_name_screener(self):
+
+        """ Set up the name screening and share it with all bots, so
+            that they also share the cached results.
+        """
+        name_screener = await asyncio.to_thread(create_name_screener)
+        if name_screener.entries:
+            LOG.info('Loaded name blocklist with %i entries',
+                     name_screener.entries)
+        for bot in self.bots:
+            bot.name_screener = name_screener
+
+    def health(self):
+
+        """ Return (healthy, text) for the health check, combining the
+            health of all bots.
+
+            The runner is healthy as long as at least one bot is
+            healthy. Failed bots are reported in the text.
+
+        """
+        healthy = False
+        lines = []
+        for bot in self.bots:
+            bot_healthy, text = bot.health()
+            healthy = healthy or bot_healthy
+            lines.append(f'{bot.name}: {text}')
+        return healthy, '\n'.join(lines)
+
+    async def run_bot(self, bot):
+
+        """ Run bot until shutdown.
+
+            Errors are logged and stop the bot, without affecting the
+            other bots. The deferred actions of the bot are cancelled,
+            since they could not be run anymore.
+
+        """
+        try:
+            await bot.main_loop()
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            LOG.exception('Bot %s failed: %r', bot.name, error)
+            bot.keep_running = False
+            bot.scheduler.close()
+            if bot.is_connected:
+                try:
+                    await bot.stop()
+                except Exception as error:
+                    LOG.error('Could not stop bot %s: %r', bot.name, error)
+
+    async def run(self):
+
+        """ Run all bots until receiving SIGINT or SIGTERM, or until all
+            bots have stopped.
+        """
+        loop = asyncio.get_running_loop()
+        self.shutdown = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.shutdown.set)
+            except (NotImplementedError, RuntimeError):
+                # Not available on this platform
+                pass
+
+        self.scheduler = Scheduler()
+        self.watchdog = create_watchdog()
+        self.bots = self.create_bots()
+        await self.load_blocklist()
+        await self.load_name_screener()
+        start_watchdog(self.watchdog)
+
+        self.metrics = CombinedRegistry()
+        for bot in self.bots:
+            self.metrics.add(bot.name, bot.metrics)
+        if self.metrics_port:
+            self.metrics_server = MetricsServer(
+                self.metrics,
+                self.health,
+                host=self.metrics_host,
+                port=self.metrics_port)
+            await self.metrics_server.start()
+            LOG.info(
+                'Serving metrics on http://%s:%i/',
+                self.metrics_host, self.metrics_port)
+
+        LOG.info('Running %i bots', len(self.bots))
+        tasks = [
+            asyncio.create_task(self.run_bot(bot), name=f'bot-{bot.name}')
+            for bot in self.bots]
+        shutdown_task = asyncio.create_task(self.shutdown.wait())
+        bots_stopped = asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            # Wait for the shutdown signal or all bots to stop
+            await asyncio.wait(
+                [shutdown_task, bots_stopped],
+                return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            shutdown_task.cancel()
+            await self.stop(tasks)
+            await bots_stopped
+
+    async def stop(self, tasks):
+
+        """ Stop all bots running in tasks and the shared services.
+        """
+        LOG.info('Stopping %i bots', len(self.bots))
+        for bot in self.bots:
+            bot.keep_running = False
+        # Run the deferred actions of all bots, while they are still
+        # connected
+        await self.scheduler.drain()
+        # Stopping the idle loops makes the bots disconnect
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+            self.metrics_server = None
+        await self.watchdog.stop()
+
+def main():
+
+    """ Run the bots configured in the BOTS_CONFIG file.
+    """
+    configs = load_bots_config(BOTS_CONFIG)
+    asyncio.run(BotRunner(configs).run())
+
+if __name__ == '__main__':
+    main()
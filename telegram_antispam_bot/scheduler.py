@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Scheduler
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import asyncio
+import logging
+
+### Globals
+
+# Log object
+LOG = logging.getLogger('antispambot')
+
+### Scheduler
+
+class ScheduledAction:
+
+    """ Action waiting to be run by the Scheduler.
+    """
+    __slots__ = ('action', 'args', 'kws', 'handle')
+
+    def __init__(self, action, args, kws):
+        self.action = action
+        self.args = args
+        self.kws = kws
+        self.handle = None
+
+    def cancel(self):
+
+        """ Cancel the action, if it has not been started yet.
+        """
+        if self.handle is not None:
+            self.handle.cancel()
+
+class Scheduler:
+
+    """ Run deferred actions without blocking the caller.
+
+        Actions are coroutine functions, which are scheduled to run
+        after a given delay. .schedule() returns immediately and the
+        actions are run as separate tasks when they become due, so
+        actions coming due at the same time run concurrently.
+
+        Child schedulers (see .child()) keep track of their own actions,
+        so that these can be cancelled separately, e.g. when one of
+        several bots sharing a scheduler fails, while .drain() runs the
+        actions of the scheduler and all its children.
+
+    """
+    # Set of ScheduledAction instances waiting for their due time
+    pending = None
+
+    # Set of running action tasks
+    running = None
+
+    # Parent Scheduler of a child scheduler or None
+    parent = None
+
+    # Set of child schedulers
+    children = None
+
+    # Was the scheduler closed ? No new actions are accepted then.
+    closed = False
+
+    def __init__(self, parent=None):
+        self.pending = set()
+        self.running = set()
+        self.children = set()
+        if parent is not None:
+            self.parent = parent
+            parent.children.add(self)
+
+    def __len__(self):
+
+        """ Return the number of pending and running actions, including
+            those of the children.
+        """
+        return (
+            len(self.pending) + len(self.running) +
+            sum(len(child) for child in self.children))
+
+    def child(self):
+
+        """ Return a new child scheduler.
+        """
+        return Scheduler(parent=self)
+
+    def schedule(self, delay, action, *args, **kws):
+
+        """ Schedule the coroutine function action to be called with
+            args and kws after delay seconds.
+
+            Returns a ScheduledAction instance, which can be used to
+            cancel the action.
+
+        """
+        if self.closed:
+            raise RuntimeError('scheduler is closed')
+        loop = asyncio.get_running_loop()
+        entry = ScheduledAction(action, args, kws)
+        entry.handle = loop.call_later(max(delay, 0), self.run, entry)
+        self.pending.add(entry)
+        return entry
+
+    def cancel(self, entry):
+
+        """ Cancel the scheduled action entry.
+        """
+        entry.cancel()
+        self.pending.discard(entry)
+
+    def run(self, entry):
+
+        """ Start the action entry as new task.
+        """
+        self.pending.discard(entry)
+        task = asyncio.create_task(entry.action(*entry.args, **entry.kws))
+        self.running.add(task)
+        task.add_done_callback(self.action_done)
+        return task
+
+    def action_done(self, task):
+
+        """ Clean up after a finished action task.
+        """
+        self.running.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            LOG.error('Scheduled action failed: %r', error, exc_info=error)
+
+    async def drain(self):
+
+        """ Run all pending actions immediately and wait for all
+            actions to finish.
+
+            This is used when shutting down, to make sure that
+            e.g. pending message deletions are not lost.
+
+        """
+        # Actions may schedule new actions, so repeat until done
+        while len(self):
+            running = []
+            for scheduler in self.schedulers():
+                for entry in list(scheduler.pending):
+                    entry.cancel()
+                    scheduler.run(entry)
+                running.extend(scheduler.running)
+            await asyncio.gather(*running, return_exceptions=True)
+
+    def schedulers(self):
+
+        """ Return a list with the scheduler and all its descendants.
+        """
+        schedulers = [self]
+        for child in self.children:
+            schedulers.extend(child.schedulers())
+        return schedulers
+
+    def close(self):
+
+        """ Cancel all pending and running actions of the scheduler and
+            its children and stop accepting new ones.
+
+            A child scheduler is removed from its parent.
+
+        """
+        for scheduler in self.schedulers():
+            scheduler.closed = True
+            for entry in scheduler.pending:
+                entry.cancel()
+            scheduler.pending.clear()
+            for task in scheduler.running:
+                task.cancel()
+        if self.parent is not None:
+            self.parent.children.discard(self)
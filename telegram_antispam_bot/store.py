@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Application Store
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import asyncio
+import json
+import sqlite3
+
+### Application store
+
+class ApplicationStore:
+
+    """ Persistent store for pending applications.
+
+        The applications are kept in a SQLite database in WAL mode.
+        Changes are collected and written in batches by .flush(), which
+        runs the database writes in a separate thread, so that the
+        event loop does not block on disk I/O.
+
+    """
+    # Filename of the SQLite database
+    filename = ''
+
+    # SQLite connection. Set in .open()
+    db = None
+
+    # Dict mapping member IDs to Application records which need to be
+    # written (or None, for records which need to be deleted)
+    pending = None
+
+    # Scheduler used for the delayed flushes and the flush delay in
+    # seconds
+    scheduler = None
+    flush_delay = 1.0
+
+    # Scheduled flush action or None
+    scheduled_flush = None
+
+    # Lock to serialize the flushes. Set in .open()
+    flush_lock = None
+
+    def __init__(self, filename, scheduler, flush_delay=None):
+        self.filename = filename
+        self.scheduler = scheduler
+        if flush_delay is not None:
+            self.flush_delay = flush_delay
+        self.pending = {}
+
+    def open(self):
+
+        """ Open the database and create the table, if needed.
+        """
+        # The connection is used by the flush thread as well, but
+        # .flush() makes sure that only one thread uses it at a time
+        self.db = sqlite3.connect(self.filename, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS applications ('
+            ' member_id INTEGER PRIMARY KEY,'
+            ' data TEXT NOT NULL)')
+        self.db.commit()
+        self.flush_lock = asyncio.Lock()
+
+    def close(self):
+
+        """ Write all pending changes and close the database.
+        """
+        if self.db is None:
+            return
+        if self.scheduled_flush is not None:
+            self.scheduler.cancel(self.scheduled_flush)
+            self.scheduled_flush = None
+        self.write(self.collect())
+        self.db.close()
+        self.db = None
+
+    def load(self):
+
+        """ Return a list of all stored application dicts.
+
+            This reads all records in one go.
+
+        """
+        return [
+            json.loads(data)
+            for (data,) in self.db.execute(
+                'SELECT data FROM applications')]
+
+    def save(self, application):
+
+        """ Queue the Application record for writing.
+        """
+        self.pending[application.member_id] = application
+        self.schedule_flush()
+
+    def delete(self, member_id):
+
+        """ Queue the application of member_id for removal.
+        """
+        self.pending[member_id] = None
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        if self.scheduled_flush is None:
+            self.scheduled_flush = self.scheduler.schedule(
+                self.flush_delay, self.flush)
+
+    def collect(self):
+
+        """ Return the pending changes as (updates, deletes) and reset
+            the pending changes.
+
+            updates is a list of (member_id, data) tuples, deletes a list
+            of (member_id,) tuples.
+
+        """
+        updates = []
+        deletes = []
+        for member_id, application in self.pending.items():
+            if application is None:
+                deletes.append((member_id,))
+            else:
+                updates.append(
+                    (member_id, json.dumps(application.to_dict())))
+        self.pending = {}
+        return updates, deletes
+
+    def write(self, changes):
+
+        """ Write the changes returned by .collect() in one transaction.
+        """
+        updates, deletes = changes
+        if not updates and not deletes:
+            return
+        with self.db:
+            if deletes:
+                self.db.executemany(
+                    'DELETE FROM applications WHERE member_id = ?',
+                    deletes)
+            if updates:
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO applications (member_id, data) '
+                    'VALUES (?, ?)',
+                    updates)
+
+    async def flush(self):
+
+        """ Write all pending changes to the database.
+        """
+        self.scheduled_flush = None
+        if self.db is None:
+            return
+        async with self.flush_lock:
+            await asyncio.to_thread(self.write, self.collect())
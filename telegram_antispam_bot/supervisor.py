@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Supervisor
+
+    Runs the bot in several worker processes (SHARDS setting), with the
+    groups in MODERATION_GROUP_IDS partitioned across the workers. Each
+    worker runs its own bot session (named after SESSION_NAME and the
+    shard number) and only processes the updates of its groups.
+
+    The workers share the blocklist and the verified members database
+    via their files and pick up each other's changes every
+    SHARED_STATE_REFRESH seconds (10 seconds, if not set).
+
+    Crashed workers are restarted. Workers which keep crashing are
+    paused for a while, and their groups are moved to the other
+    workers in the meantime.
+
+    All workers use the same bot token, so the OUTGOING_RATE and
+    OUTGOING_BURST limits are split evenly across the running workers.
+
+    If METRICS_PORT is set, worker N serves its metrics on port
+    METRICS_PORT + N. Log files get the shard number added to their
+    name as well.
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+
+from telegram_antispam_bot.logsetup import setup_logging
+from telegram_antispam_bot.config import (
+    LOG_FILE,
+    LOG_EVENTS_FILE,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_ROTATE_WHEN,
+    SHARDS,
+    SHARD_RESTART_DELAY,
+    SHARD_MAX_RESTARTS,
+    SHARD_RESTART_WINDOW,
+    SHARED_STATE_REFRESH,
+    SESSION_NAME,
+    MODERATION_GROUP_IDS,
+    METRICS_PORT,
+    OUTGOING_RATE,
+    OUTGOING_BURST,
+    VERIFIED_USERS_FILE,
+    )
+
+### Globals
+
+# Log object
+LOG = logging.getLogger('antispambot')
+
+# Default refresh interval for the shared state in the workers
+DEFAULT_SHARED_STATE_REFRESH = 10
+
+# Time in seconds to wait for workers to stop, before killing them
+STOP_TIMEOUT = 30
+
+# Interval in seconds for checking paused workers
+CHECK_INTERVAL = 5
+
+### Helpers
+
+def shard_filename(filename, shard):
+
+    """ Return filename with the shard number added to the name.
+    """
+    base, ext = os.path.splitext(filename)
+    return f'{base}-{shard}{ext}'
+
+def partition(group_ids, shards):
+
+    """ Partition the group_ids into the list of shards numbers.
+
+        Returns a dict mapping shard numbers to sorted lists of group
+        IDs. The groups are dealt out round-robin in sorted order, so
+        that the result only depends on the group IDs and the shards.
+
+    """
+    assignment = {shard: [] for shard in shards}
+    if not shards:
+        return assignment
+    shards = sorted(shards)
+    for i, group_id in enumerate(sorted(group_ids)):
+        assignment[shards[i % len(shards)]].append(group_id)
+    return assignment
+
+### Worker
+
+class Worker:
+
+    """ Bot worker process for one shard.
+    """
+    # Shard number
+    shard = 0
+
+    # Sorted list of group IDs assigned to the worker
+    group_ids = None
+
+    # asyncio.subprocess.Process or None, if not running
+    process = None
+
+    # Task waiting for the process to end
+    task = None
+
+    # List of times the worker crashed
+    crashes = None
+
+    # Time until which the worker is paused because of too many crashes
+    # (time.monotonic()), 0 if not paused
+    paused_until = 0
+
+    # Number of workers sharing the outgoing rate limits of the bot
+    # token. Set by Supervisor.rebalance().
+    shares = 1
+
+    def __init__(self, shard):
+        self.shard = shard
+        self.group_ids = []
+        self.crashes = []
+
+    @property
+    def name(self):
+        return f'{SESSION_NAME}-{self.shard}'
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.returncode is None
+
+    def paused(self, now):
+        return self.paused_until > now
+
+    def environment(self):
+
+        """ Return the OS environment for the worker process.
+        """
+        env = dict(os.environ)
+        env.update(
+            TG_SHARDS='0',
+            TG_BOTS_CONFIG='',
+            TG_SESSION_NAME=self.name,
+            TG_MODERATION_GROUP_IDS=','.join(
+                str(group_id) for group_id in self.group_ids),
+            TG_PERSIST_VERIFIED_USERS='1',
+            TG_VERIFIED_USERS_FILE=(
+                VERIFIED_USERS_FILE or f'{SESSION_NAME}-verified.db'),
+            TG_SHARED_STATE_REFRESH=str(
+                SHARED_STATE_REFRESH or DEFAULT_SHARED_STATE_REFRESH),
+            )
+        # The workers share the rate limits of the bot token
+        if OUTGOING_RATE:
+            env['TG_OUTGOING_RATE'] = str(OUTGOING_RATE / self.shares)
+        env['TG_OUTGOING_BURST'] = str(
+            max(1, OUTGOING_BURST // self.shares))
+        if METRICS_PORT:
+            env['TG_METRICS_PORT'] = str(METRICS_PORT + self.shard)
+        # Each worker writes its own log files, to avoid conflicts when
+        # rotating them
+        if LOG_FILE != 'stdout':
+            env['TG_LOG_FILE'] = shard_filename(LOG_FILE, self.shard)
+        if LOG_EVENTS_FILE:
+            env['TG_LOG_EVENTS_FILE'] = shard_filename(
+                LOG_EVENTS_FILE, self.shard)
+        return env
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'telegram_antispam_bot',
+            env=self.environment())
+        LOG.info(
+            'Started worker %s (PID %i) for groups %s',
+            self.name, self.process.pid,
+            ', '.join(str(group_id) for group_id in self.group_ids))
+
+    async def stop(self):
+
+        """ Stop the worker process, killing it after STOP_TIMEOUT
+            seconds.
+
+            The process is detached from the worker first, so that
+            stopping it does not count as crash.
+
+        """
+        process = self.process
+        self.process = None
+        if process is None or process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            LOG.warning('Killing worker %s', self.name)
+            process.kill()
+            await process.wait()
+
+    def record_crash(self, now):
+
+        """ Record a crash at time now and return the number of crashes
+            within the last SHARD_RESTART_WINDOW seconds.
+        """
+        self.crashes = [
+            crash_time
+            for crash_time in self.crashes
+            if crash_time > now - SHARD_RESTART_WINDOW]
+        self.crashes.append(now)
+        return len(self.crashes)
+
+### Supervisor
+
+class Supervisor:
+
+    """ Run and supervise the bot worker processes.
+    """
+    # Dict mapping shard numbers to Worker instances
+    workers = None
+
+    # Set of group IDs to moderate
+    group_ids = None
+
+    # Flag to keep the supervisor running
+    keep_running = False
+
+    # Event signaling the shutdown. Set in .run()
+    shutdown = None
+
+    def __init__(self, shards=SHARDS, group_ids=MODERATION_GROUP_IDS):
+        if not group_ids:
+            raise ValueError(
+                'Supervisor mode needs a list of MODERATION_GROUP_IDS to '
+                'partition across the workers')
+        # More workers than groups would not have anything to do
+        shards = min(shards, len(group_ids))
+        self.group_ids = frozenset(group_ids)
+        self.workers = {shard: Worker(shard) for shard in range(shards)}
+
+    async def rebalance(self):
+
+        """ Partition the groups across the active workers and (re)start
+            the workers with changed groups or a changed share of the
+            outgoing rate limits.
+        """
+        now = time.monotonic()
+        active = [
+            shard
+            for shard, worker in self.workers.items()
+            if not worker.paused(now)]
+        assignment = partition(self.group_ids, active)
+        shares = max(1, sum(
+            1 for group_ids in assignment.values() if group_ids))
+        for shard, worker in self.workers.items():
+            group_ids = assignment.get(shard, [])
+            if (group_ids == worker.group_ids and
+                shares == worker.shares and
+                (worker.running or not group_ids)):
+                continue
+            worker.group_ids = group_ids
+            worker.shares = shares
+            if worker.running:
+                # Restart the worker with the new groups; the exit is
+                # not counted as crash
+                await worker.stop()
+            if group_ids and self.keep_running:
+                await self.start_worker(worker)
+
+    async def start_worker(self, worker):
+        await worker.start()
+        worker.task = asyncio.create_task(
+            self.watch_worker(worker, worker.process))
+
+    async def watch_worker(self, worker, process):
+
+        """ Wait for the worker process to end and restart it, if it
+            crashed.
+        """
+        returncode = await process.wait()
+        if not self.keep_running or worker.process is not process:
+            # Shutting down or replaced by .rebalance()
+            return
+        worker.process = None
+        now = time.monotonic()
+        crashes = worker.record_crash(now)
+        LOG.error(
+            'Worker %s exited with code %r (%i crashes within %i seconds)',
+            worker.name, returncode, crashes, SHARD_RESTART_WINDOW)
+        if crashes > SHARD_MAX_RESTARTS:
+            # Pause the worker and move its groups to the other workers
+            LOG.error(
+                'Pausing worker %s for %i seconds',
+                worker.name, SHARD_RESTART_WINDOW)
+            worker.paused_until = now + SHARD_RESTART_WINDOW
+            worker.crashes = []
+            await self.rebalance()
+            return
+        await asyncio.sleep(SHARD_RESTART_DELAY)
+        if self.keep_running and worker.process is None:
+            await self.start_worker(worker)
+
+    async def check_paused_workers(self):
+
+        """ Return paused workers to service, once their pause is over.
+        """
+        while self.keep_running:
+            await asyncio.sleep(CHECK_INTERVAL)
+            now = time.monotonic()
+            resumed = [
+                worker
+                for worker in self.workers.values()
+                if worker.paused_until and not worker.paused(now)]
+            if resumed:
+                for worker in resumed:
+                    worker.paused_until = 0
+                    LOG.info('Resuming worker %s', worker.name)
+                await self.rebalance()
+
+    async def run(self):
+
+        """ Run the workers until receiving SIGINT or SIGTERM.
+        """
+        loop = asyncio.get_running_loop()
+        self.shutdown = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.shutdown.set)
+            except (NotImplementedError, RuntimeError):
+                # Not available on this platform
+                pass
+        self.keep_running = True
+        LOG.info(
+            'Supervising %i workers for %i groups',
+            len(self.workers), len(self.group_ids))
+        await self.rebalance()
+        check_task = asyncio.create_task(self.check_paused_workers())
+        try:
+            await self.shutdown.wait()
+        finally:
+            self.keep_running = False
+            check_task.cancel()
+            await self.stop()
+
+    async def stop(self):
+        LOG.info('Stopping %i workers', len(self.workers))
+        workers = list(self.workers.values())
+        await asyncio.gather(*[worker.stop() for worker in workers])
+        tasks = [worker.task for worker in workers if worker.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def main():
+
+    """ Run the supervisor, configured by the SHARDS and
+        MODERATION_GROUP_IDS settings.
+    """
+    setup_logging(
+        log_file=LOG_FILE,
+        max_bytes=LOG_MAX_BYTES,
+        backup_count=LOG_BACKUP_COUNT,
+        rotate_when=LOG_ROTATE_WHEN)
+    asyncio.run(Supervisor().run())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Verified User Cache
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import asyncio
+import collections
+import sqlite3
+import time
+
+### Globals
+
+# Extra time in seconds to look back when reading the entries written by
+# other processes in .refresh()
+REFRESH_MARGIN = 5.0
+
+### Verified user cache
+
+class VerifiedUserCache:
+
+    """ Cache of user IDs which recently passed a challenge.
+
+        Entries expire after .ttl seconds. The cache holds at most
+        .max_size entries; the least recently used ones are dropped
+        first. Expired and dropped entries are only removed from the
+        cache, not from the database.
+
+        If a filename is given, the cache is persisted in a SQLite
+        database. Changes are written in batches by .flush() in a
+        separate thread, just like for the ApplicationStore.
+
+        Several processes can share the database. .refresh() applies
+        the changes written by other processes to the cache. Since the
+        rows are read by their change time, removals are not deleted,
+        but written as tombstones with a verification time of 0.
+
+    """
+    # Max. number of entries. 0 disables the cache.
+    max_size = 100000
+
+    # Time in seconds after which entries expire
+    ttl = 30 * 24 * 3600
+
+    # OrderedDict mapping user IDs to the time they were verified, in
+    # LRU order (least recently used first)
+    entries = None
+
+    # Filename of the SQLite database or None, for not persisting the
+    # cache
+    filename = None
+
+    # SQLite connection. Set in .open()
+    db = None
+
+    # Dict mapping user IDs to (verified, changed) tuples which need to
+    # be written (verified is 0 for removed entries)
+    pending = None
+
+    # Scheduler used for the delayed flushes and the flush delay in
+    # seconds
+    scheduler = None
+    flush_delay = 1.0
+
+    # Scheduled flush action or None
+    scheduled_flush = None
+
+    # Lock to serialize the flushes. Set in .open()
+    flush_lock = None
+
+    # Time of the last .refresh() (or of loading the entries)
+    refreshed = 0.0
+
+    def __init__(self, scheduler, max_size=None, ttl=None, filename=None,
+                 flush_delay=None):
+        self.scheduler = scheduler
+        if max_size is not None:
+            self.max_size = max_size
+        if ttl is not None:
+            self.ttl = ttl
+        self.filename = filename
+        if flush_delay is not None:
+            self.flush_delay = flush_delay
+        self.entries = collections.OrderedDict()
+        self.pending = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, user_id):
+
+        """ Return True, if user_id was verified within the last .ttl
+            seconds.
+
+            Expired entries are removed.
+
+        """
+        verified = self.entries.get(user_id)
+        if verified is None:
+            return False
+        if verified + self.ttl <= time.time():
+            # The other processes expire the entry as well
+            del self.entries[user_id]
+            return False
+        self.entries.move_to_end(user_id)
+        return True
+
+    def add(self, user_id, now=None):
+
+        """ Mark user_id as verified.
+        """
+        if not self.max_size:
+            return
+        if now is None:
+            now = time.time()
+        self.entries[user_id] = now
+        self.entries.move_to_end(user_id)
+        self.mark_changed(user_id, now, now)
+        self.limit_size()
+
+    def remove(self, user_id):
+
+        """ Remove user_id from the cache.
+
+            The removal is written to the database, so that the other
+            processes remove the entry as well.
+
+        """
+        if self.entries.pop(user_id, None) is not None:
+            self.mark_changed(user_id, 0, time.time())
+
+    def limit_size(self):
+
+        """ Drop the least recently used entries exceeding .max_size.
+
+            The entries are only dropped from the cache. They remain
+            valid in the database for the other processes.
+
+        """
+        entries = self.entries
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+
+    ### Persistence
+
+    def open(self):
+
+        """ Open the database, create the table, if needed, and load the
+            entries which have not yet expired.
+        """
+        # The connection is used by the flush thread as well, but
+        # .flush() makes sure that only one thread uses it at a time
+        self.db = sqlite3.connect(self.filename, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS verified_users ('
+            ' user_id INTEGER PRIMARY KEY,'
+            ' verified REAL NOT NULL,'
+            ' changed REAL NOT NULL DEFAULT 0)')
+        columns = [
+            row[1]
+            for row in self.db.execute('PRAGMA table_info(verified_users)')]
+        if 'changed' not in columns:
+            # Database written by an earlier version without removals
+            with self.db:
+                self.db.execute(
+                    'ALTER TABLE verified_users ADD COLUMN '
+                    'changed REAL NOT NULL DEFAULT 0')
+                self.db.execute(
+                    'UPDATE verified_users SET changed = verified')
+        self.db.execute(
+            'CREATE INDEX IF NOT EXISTS verified_users_changed '
+            'ON verified_users (changed)')
+        # Tombstones are kept for .ttl seconds as well, since the entries
+        # they remove expire by then
+        with self.db:
+            self.db.execute(
+                'DELETE FROM verified_users WHERE changed <= ?',
+                (time.time() - self.ttl,))
+        self.flush_lock = asyncio.Lock()
+        # Load the most recent entries, oldest first
+        self.refreshed = time.time()
+        rows = self.db.execute(
+            'SELECT user_id, verified FROM verified_users '
+            'WHERE verified > 0 '
+            'ORDER BY verified DESC LIMIT ?',
+            (self.max_size,)).fetchall()
+        rows.reverse()
+        self.entries = collections.OrderedDict(rows)
+
+    def close(self):
+
+        """ Write all pending changes and close the database.
+        """
+        if self.db is None:
+            return
+        if self.scheduled_flush is not None:
+            self.scheduler.cancel(self.scheduled_flush)
+            self.scheduled_flush = None
+        self.write(self.collect())
+        self.db.close()
+        self.db = None
+
+    def mark_changed(self, user_id, verified, changed):
+        if self.db is None:
+            return
+        self.pending[user_id] = (verified, changed)
+        if self.scheduled_flush is None:
+            self.scheduled_flush = self.scheduler.schedule(
+                self.flush_delay, self.flush)
+
+    def collect(self):
+
+        """ Return the pending changes as list of (user_id, verified,
+            changed) tuples and reset the pending changes.
+        """
+        changes = [
+            (user_id, verified, changed)
+            for user_id, (verified, changed) in self.pending.items()]
+        self.pending = {}
+        return changes
+
+    def write(self, changes):
+
+        """ Write the changes returned by .collect() in one transaction.
+        """
+        if not changes:
+            return
+        with self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO verified_users '
+                '(user_id, verified, changed) VALUES (?, ?, ?)',
+                changes)
+
+    def read_changes(self, since):
+
+        """ Return a list of (user_id, verified, changed) tuples of the
+            entries changed after the time since, oldest first.
+        """
+        return self.db.execute(
+            'SELECT user_id, verified, changed FROM verified_users '
+            'WHERE changed > ? ORDER BY changed',
+            (since,)).fetchall()
+
+    async def refresh(self):
+
+        """ Apply the changes written to the database by other
+            processes since the last refresh to the cache.
+
+            Entries removed by other processes are removed, unless they
+            were verified again afterwards.
+
+        """
+        if self.db is None or not self.max_size:
+            return
+        now = time.time()
+        # Other processes write their entries with a delay, so look
+        # back a little further
+        since = self.refreshed - self.flush_delay - REFRESH_MARGIN
+        self.refreshed = now
+        async with self.flush_lock:
+            rows = await asyncio.to_thread(self.read_changes, since)
+        entries = self.entries
+        for user_id, verified, changed in rows:
+            current = entries.get(user_id)
+            if not verified:
+                if current is not None and current <= changed:
+                    del entries[user_id]
+            elif current is None or verified > current:
+                entries[user_id] = verified
+                entries.move_to_end(user_id)
+        self.limit_size()
+
+    async def flush(self):
+
+        """ Write all pending changes to the database.
+        """
+        self.scheduled_flush = None
+        if self.db is None:
+            return
+        async with self.flush_lock:
+            await asyncio.to_thread(self.write, self.collect())
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+""" eGenix Antispam Bot for Telegram Event Loop Watchdog
+
+    The watchdog measures the event loop lag using a heartbeat task. A
+    separate thread checks the heartbeat and logs the stack of the code
+    blocking the event loop, when the heartbeat stops for more than
+    .threshold seconds.
+
+    For finding slow code, the watchdog can also run the cProfile
+    profiler or the asyncio debug mode (which reports slow callbacks)
+    for a time window. On POSIX systems, these can be switched on and
+    off by sending SIGUSR1 (cProfile) or SIGUSR2 (asyncio debug mode)
+    to the bot process.
+
+    Written by Marc-Andre Lemburg.
+    Copyright (c) 2022-2025, eGenix.com Software GmbH; mailto:info@egenix.com
+    License: MIT
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import signal
+import sys
+import threading
+import time
+import traceback
+
+### Globals
+
+# Log object
+LOG = logging.getLogger('antispambot')
+
+# Number of functions to list in the profile report
+PROFILE_FUNCTIONS = 30
+
+### Watchdog
+
+class Watchdog:
+
+    """ Event loop watchdog and profiler.
+    """
+    # Time in seconds the event loop may be blocked before the stack of
+    # the blocking code gets logged. 0 disables the watchdog thread.
+    threshold = 1.0
+
+    # Heartbeat interval in seconds
+    interval = 0.25
+
+    # Duration of callbacks in seconds above which asyncio debug mode
+    # reports them as slow
+    slow_callback_duration = 0.1
+
+    # Time window in seconds for profiling and debug mode
+    profile_window = 60
+
+    # Filename to write the cProfile stats to, in addition to logging
+    # them. Empty to only log the stats.
+    profile_file = ''
+
+    # Event loop lag in seconds, as measured by the last heartbeat
+    lag = 0.0
+
+    # Max. event loop lag seen so far
+    max_lag = 0.0
+
+    # Event loop, its thread ID and the heartbeat task. Set in .start()
+    loop = None
+    loop_thread_id = None
+    heartbeat_task = None
+
+    # Time of the last heartbeat (time.monotonic())
+    last_heartbeat = 0.0
+
+    # Watchdog thread and event for stopping it
+    thread = None
+    stopped = None
+
+    # Active cProfile.Profile instance or None
+    profiler = None
+
+    # Scheduled end of the profiling/debug window (asyncio.TimerHandle)
+    profile_timer = None
+    debug_timer = None
+
+    def __init__(self, threshold=None, interval=None,
+                 slow_callback_duration=None, profile_window=None,
+                 profile_file=None):
+        if threshold is not None:
+            self.threshold = threshold
+        if interval is not None:
+            self.interval = interval
+        if slow_callback_duration is not None:
+            self.slow_callback_duration = slow_callback_duration
+        if profile_window is not None:
+            self.profile_window = profile_window
+        if profile_file is not None:
+            self.profile_file = profile_file
+
+    def start(self):
+
+        """ Start the heartbeat task, the watchdog thread and install the
+            signal handlers.
+
+            This has to be called from the event loop thread.
+
+        """
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.last_heartbeat = time.monotonic()
+        self.heartbeat_task = asyncio.create_task(self.heartbeat())
+        if self.threshold:
+            self.stopped = threading.Event()
+            self.thread = threading.Thread(
+                target=self.watch, name='Watchdog', daemon=True)
+            self.thread.start()
+        self.install_signal_handlers()
+
+    async def stop(self):
+        if self.profiler is not None:
+            self.stop_profiling()
+        if self.debug_timer is not None:
+            self.stop_debug()
+        self.remove_signal_handlers()
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            try:
+                await self.heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self.heartbeat_task = None
+
+    async def heartbeat(self):
+
+        """ Heartbeat task, measuring the event loop lag.
+        """
+        loop = self.loop
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(loop.time() - start - self.interval, 0.0)
+            if self.lag > self.max_lag:
+                self.max_lag = self.lag
+            self.last_heartbeat = time.monotonic()
+
+    ### Watchdog thread
+
+    def watch(self):
+
+        """ Watchdog thread, checking the heartbeat.
+        """
+        blocked_since = None
+        while not self.stopped.wait(self.interval):
+            last_heartbeat = self.last_heartbeat
+            blocked = time.monotonic() - last_heartbeat - self.interval
+            if blocked > self.threshold:
+                if blocked_since != last_heartbeat:
+                    # Report each stall only once
+                    blocked_since = last_heartbeat
+                    self.report_stall(blocked)
+            elif blocked_since is not None:
+                LOG.warning('Event loop is running again')
+                blocked_since = None
+
+    def report_stall(self, blocked):
+
+        """ Log the stack of the code blocking the event loop.
+        """
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is None:
+            return
+        stack = ''.join(traceback.format_stack(frame))
+        try:
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            task = None
+        LOG.warning(
+            'Event loop blocked for more than %.1f seconds '
+            '(task %s), at:\n%s',
+            blocked,
+            task.get_name() if task is not None else 'none',
+            stack)
+
+    ### Profiling
+
+    def start_profiling(self, window=None):
+
+        """ Run cProfile on the event loop thread for window seconds
+            (defaults to .profile_window).
+
+            This has to be called from the event loop thread.
+
+        """
+        if self.profiler is not None:
+            return
+        if window is None:
+            window = self.profile_window
+        LOG.warning('Starting profiler for %i seconds', window)
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+        self.profile_timer = self.loop.call_later(
+            window, self.stop_profiling)
+
+    def stop_profiling(self):
+
+        """ Stop the profiler and log the stats.
+        """
+        profiler = self.profiler
+        if profiler is None:
+            return
+        profiler.disable()
+        self.profiler = None
+        if self.profile_timer is not None:
+            self.profile_timer.cancel()
+            self.profile_timer = None
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats('cumulative').print_stats(PROFILE_FUNCTIONS)
+        LOG.warning('Profile:\n%s', output.getvalue())
+        if self.profile_file:
+            stats.dump_stats(self.profile_file)
+            LOG.warning('Profile stats written to %s', self.profile_file)
+
+    def toggle_profiling(self):
+        if self.profiler is None:
+            self.start_profiling()
+        else:
+            self.stop_profiling()
+
+    def start_debug(self, window=None):
+
+        """ Enable the asyncio debug mode for window seconds (defaults to
+            .profile_window), which reports slow callbacks.
+
+            This has to be called from the event loop thread.
+
+        """
+        if self.debug_timer is not None:
+            return
+        if window is None:
+            window = self.profile_window
+        LOG.warning(
+            'Enabling asyncio debug mode for %i seconds '
+            '(reporting callbacks taking more than %.3f seconds)',
+            window, self.slow_callback_duration)
+        self.saved_slow_callback_duration = self.loop.slow_callback_duration
+        self.loop.slow_callback_duration = self.slow_callback_duration
+        self.loop.set_debug(True)
+        self.debug_timer = self.loop.call_later(window, self.stop_debug)
+
+    def stop_debug(self):
+
+        """ Disable the asyncio debug mode.
+        """
+        if self.debug_timer is None:
+            return
+        self.debug_timer.cancel()
+        self.debug_timer = None
+        self.loop.set_debug(False)
+        self.loop.slow_callback_duration = self.saved_slow_callback_duration
+        LOG.warning('Disabled asyncio debug mode')
+
+    def toggle_debug(self):
+        if self.debug_timer is None:
+            self.start_debug()
+        else:
+            self.stop_debug()
+
+    ### Signals
+
+    def install_signal_handlers(self):
+        try:
+            self.loop.add_signal_handler(
+                signal.SIGUSR1, self.toggle_profiling)
+            self.loop.add_signal_handler(
+                signal.SIGUSR2, self.toggle_debug)
+        except (AttributeError, NotImplementedError, RuntimeError):
+            # Not available on this platform or not in the main thread
+            pass
+
+    def remove_signal_handlers(self):
+        try:
+            self.loop.remove_signal_handler(signal.SIGUSR1)
+            self.loop.remove_signal_handler(signal.SIGUSR2)
+        except (AttributeError, NotImplementedError, RuntimeError):
+            pass